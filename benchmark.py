@@ -0,0 +1,23 @@
+import sys
+
+from benchmarks import comm, kocom, lgac, logs, mqtt
+from classes.utils import ColorLog
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="micro benchmarks for hacollector hot paths")
+    subparsers = parser.add_subparsers(dest='target', required=True)
+    for area in (comm, kocom, logs, lgac, mqtt):
+        area.add_parsers(subparsers)
+
+    args = parser.parse_args(argv[1:])
+
+    # results go to stdout. keep the handlers' own logging out of the way.
+    color_log = ColorLog('CONSOLE')
+    color_log.set_level('error')
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,129 @@
+'''
+TCPComm and Kocom framing benchmarks. the old byte by byte reader is in tests/helpers.py.
+'''
+import asyncio
+import time
+
+import config as cfg
+from classes.comm import RingBuffer, TCPComm
+from consts import CommStatus
+from tests.helpers import read_legacy_frames, read_scanner_frames
+
+from .common import load_kocom_stream
+
+
+def bench_ring(args) -> None:
+    '''
+    compare reads through the old bytes buffer and the ring buffer.
+    socket reads are MAX_SOCKET_BUFFER sized, consumed args.size bytes at a time.
+    '''
+    chunk = bytes(range(256)) * (cfg.MAX_SOCKET_BUFFER // 256)
+    chunks = max(1, args.bytes // len(chunk))
+    size = args.size
+
+    def legacy() -> int:
+        read_buffer = b''
+        consumed = 0
+        for _ in range(chunks):
+            read_buffer += chunk
+            while len(read_buffer) >= size:
+                _ = read_buffer[0:size]
+                read_buffer = read_buffer[size:]
+                consumed += size
+        return consumed
+
+    def ring() -> int:
+        read_buffer = RingBuffer(len(chunk) * 2)
+        consumed = 0
+        for _ in range(chunks):
+            read_buffer.write(chunk)
+            while len(read_buffer) >= size:
+                _ = read_buffer.consume(size)
+                consumed += size
+        return consumed
+
+    for name, fn in (('bytes', legacy), ('ring', ring)):
+        start = time.perf_counter()
+        consumed = fn()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>8}: {consumed / elapsed:,.0f} bytes/sec (read size {size}, {elapsed:.3f} sec)")
+
+
+def bench_kocom_scanner(args) -> None:
+    '''
+    run a recorded stream through the old byte reader and KocomFrameScanner.
+    tests/test_comm.py checks that both return the same frames.
+    '''
+    chunks = load_kocom_stream(args)
+
+    for name, read in (('legacy', read_legacy_frames), ('scanner', read_scanner_frames)):
+        start = time.perf_counter()
+        frames = asyncio.run(read(chunks))
+        elapsed = time.perf_counter() - start
+        good = sum(1 for x in frames if x[0] == CommStatus.WAIT_TAIL)
+        print(
+            f"{name:>8}: {len(frames) / elapsed:,.0f} frames/sec "
+            f"({len(frames)} frames, {good} complete, {elapsed:.3f} sec)"
+        )
+
+
+def bench_kocom_transport(args) -> None:
+    '''
+    serve a recorded stream over loopback and read it with StreamReader and with FrameProtocol.
+    '''
+    from classes.kocom import KocomFrameScanner, KocomHandler
+
+    chunks = load_kocom_stream(args)
+
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        for chunk in chunks:
+            writer.write(chunk)
+        await writer.drain()
+        writer.close()
+
+    async def read_stream(comm: TCPComm, scan: KocomFrameScanner) -> int:
+        await comm.async_make_connection()
+        count = 0
+        while (data := await comm.async_read_chunk()) != b'':
+            count += scan.feed(data)
+            scan.frames.clear()
+        return count
+
+    async def read_protocol(comm: TCPComm, scan: KocomFrameScanner) -> int:
+        await comm.async_make_protocol_connection(scan)
+        count = 0
+        while await comm.async_read_frame() is not None:
+            count += 1
+        return count
+
+    async def run(reader) -> tuple[int, float]:
+        server = await asyncio.start_server(serve, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        comm = TCPComm('127.0.0.1', port, cfg.MAX_SOCKET_BUFFER)
+        scan = KocomFrameScanner(KocomHandler.HEADER_LIST, KocomHandler.KOCOM_PACKET_LENGTH)
+        start = time.perf_counter()
+        count = await reader(comm, scan)
+        elapsed = time.perf_counter() - start
+        server.close()
+        return count, elapsed
+
+    for name, reader in (('stream', read_stream), ('protocol', read_protocol)):
+        count, elapsed = asyncio.run(run(reader))
+        print(f"{name:>8}: {count / elapsed:,.0f} frames/sec ({count} frames, {elapsed:.3f} sec)")
+
+
+def add_parsers(subparsers) -> None:
+    ring_parser = subparsers.add_parser('ring', help="TCPComm read buffer: bytes slicing vs ring buffer")
+    ring_parser.add_argument('--bytes', '-b', type=int, default=1 << 20, help="bytes to consume")
+    ring_parser.add_argument('--size', '-s', type=int, default=1, help="bytes per read request")
+    ring_parser.set_defaults(func=bench_ring)
+
+    kocom_parser = subparsers.add_parser('kocom', help="Kocom framing: byte reader vs KocomFrameScanner")
+    kocom_parser.add_argument('--frames', '-n', type=int, default=2000, help="frames in generated stream")
+    kocom_parser.add_argument('--file', '-f', help="raw capture of the wallpad bus instead of generated stream")
+    kocom_parser.set_defaults(func=bench_kocom_scanner)
+
+    transport_parser = subparsers.add_parser('transport', help="Kocom link: StreamReader vs FrameProtocol")
+    transport_parser.add_argument('--frames', '-n', type=int, default=20000, help="frames in generated stream")
+    transport_parser.add_argument('--file', '-f', help="raw capture of the wallpad bus instead of generated stream")
+    transport_parser.set_defaults(func=bench_kocom_transport)
@@ -0,0 +1,179 @@
+'''
+recorded streams and the loopback EW11 servers of the benchmarks.
+frame builders, the MQTT fakes and the legacy references are in tests/helpers.py.
+'''
+import asyncio
+import random
+import time
+
+import config as cfg
+from tests.helpers import make_kocom_ack, make_kocom_stream, make_lgac_response
+
+
+def load_kocom_stream(args) -> list[bytes]:
+    if args.file:
+        with open(args.file, 'rb') as f:
+            data = f.read()
+        return [data[i:i + cfg.MAX_SOCKET_BUFFER] for i in range(0, len(data), cfg.MAX_SOCKET_BUFFER)]
+    return make_kocom_stream(args.frames)
+
+
+class FakeLGACServer:
+    '''
+    loopback EW11 with LG aircons behind it. answers every 8 byte request with a
+    16 byte status after response_delay, like the indoor units do.
+    '''
+    REQUEST_SIZE = 8
+
+    def __init__(self, response_delay: float) -> None:
+        self.response_delay = response_delay
+        self.connections    = 0
+        self.requests       = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request = await reader.readexactly(FakeLGACServer.REQUEST_SIZE)
+                self.requests += 1
+                await asyncio.sleep(self.response_delay)
+                writer.write(make_lgac_response(request))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+
+class FakeKocomBus:
+    '''
+    loopback EW11 on a Kocom bus. every command (type 0x30bX) is ACKed by its device
+    after ack_delay, like lights and thermostats do. loss is the chance that an ACK is lost.
+    '''
+    def __init__(self, ack_delay: float, loss: float = 0., seed: int = 485) -> None:
+        self.ack_delay      = ack_delay
+        self.loss           = loss
+        self.rand           = random.Random(seed)
+        self.commands       = 0
+        self.answered       = 0     # ACKed or lost
+        self.acks           = 0
+        self.last_ack_time  = 0.
+        self.command_times: list[float] = []
+
+    def is_idle(self) -> bool:
+        return self.answered == self.commands
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                frame = await reader.readexactly(21)
+                if frame[3] & 0xf0 != 0xb0:
+                    continue
+                self.command_times.append(time.perf_counter())
+                self.command_event.set()
+                self.commands += 1
+                await asyncio.sleep(self.ack_delay)
+                self.answered += 1
+                self.last_ack_time = time.perf_counter()
+                if self.rand.random() < self.loss:
+                    continue
+                writer.write(make_kocom_ack(frame))
+                await writer.drain()
+                self.acks += 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            self.closed.set()
+
+    async def start(self) -> int:
+        self.closed = asyncio.Event()
+        self.command_event = asyncio.Event()
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        '''
+        call after the client closed its connection.
+        '''
+        await self.closed.wait()
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class FakeBusyKocomBus(FakeKocomBus):
+    '''
+    FakeKocomBus with wallpad traffic: a query and its answer about every period seconds.
+    a command that overlaps a frame on the wire is garbled, so it is not ACKed.
+    '''
+    FRAME_TIME = 21 * 10 / 9600
+    QUERY = bytes.fromhex('aa5530bc000e0701003a0000000000000000') + b'\x00\x0d\x0d'
+
+    def __init__(self, ack_delay: float, period: float, seed: int = 485) -> None:
+        super().__init__(ack_delay, 0., seed)
+        self.period             = period
+        self.busy_until         = 0.
+        self.command_end        = 0.
+        self.garbled            = False
+        self.collisions         = 0
+        self.writer: asyncio.StreamWriter | None = None
+        query = bytearray(self.QUERY)
+        query[18] = sum(query[2:18]) & 0xff
+        self.burst = (bytes(query), make_kocom_ack(bytes(query)))
+
+    def occupy(self, now: float) -> bool:
+        '''
+        put a frame on the wire at now. True if it overlaps another one.
+        '''
+        collided = now < self.busy_until
+        self.busy_until = max(self.busy_until, now + self.FRAME_TIME)
+        return collided
+
+    async def traffic(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.rand.uniform(0.5, 1.5) * self.period)
+            for frame in self.burst:
+                now = loop.time()
+                self.occupy(now)
+                if now < self.command_end:
+                    self.garbled = True
+                # the EW11 hands a frame over when its last byte is in.
+                await asyncio.sleep(self.FRAME_TIME)
+                if self.writer is not None:
+                    self.writer.write(frame)
+                await asyncio.sleep(0.02)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        self.writer = writer
+        try:
+            while True:
+                frame = await reader.readexactly(21)
+                if frame[3] & 0xf0 != 0xb0:
+                    continue
+                now = loop.time()
+                self.commands += 1
+                self.garbled = self.occupy(now)
+                self.command_end = now + self.FRAME_TIME
+                await asyncio.sleep(self.ack_delay)
+                self.answered += 1
+                self.last_ack_time = time.perf_counter()
+                if self.garbled:
+                    self.collisions += 1
+                    continue
+                self.occupy(loop.time())
+                await asyncio.sleep(self.FRAME_TIME)
+                writer.write(make_kocom_ack(frame))
+                await writer.drain()
+                self.acks += 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writer = None
+            writer.close()
+            self.closed.set()
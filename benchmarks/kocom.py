@@ -0,0 +1,383 @@
+'''
+Kocom wallpad benchmarks: command queue, frame encoding and decoding, the writer and CHECK scheduling.
+'''
+import asyncio
+import time
+
+import config as cfg
+from classes.comm import TCPComm
+from consts import CommStatus
+from tests.helpers import (KocomPacket, legacy_make_frame, make_encode_jobs, make_kocom_bodies, make_kocom_handler,
+                           make_kocom_stream, make_lgac_response, measure_allocations)
+
+from .common import FakeBusyKocomBus, FakeKocomBus, load_kocom_stream
+
+
+def bench_command_queue(args) -> None:
+    '''
+    latency from a command put by another thread (paho MQTT) to the kocom writer:
+    10 msec polling of queue.PriorityQueue (old) vs WallPad.enqueue_command.
+    also checks that commands of a priority come out in FIFO order.
+    '''
+    import queue
+    import statistics
+    import threading
+
+    from classes.wallpad import WallPad
+    from consts import PRIORITY_HIGH, Command
+
+    count = args.commands
+
+    def producer(put) -> None:
+        for i in range(count):
+            put(i, time.perf_counter())
+            time.sleep(args.gap)
+
+    async def legacy() -> tuple[list[float], list[int]]:
+        command_queue: queue.PriorityQueue = queue.PriorityQueue()
+        thread = threading.Thread(target=producer, args=(lambda i, t: command_queue.put((PRIORITY_HIGH, i, t)),))
+        thread.start()
+        latency, order = [], []
+        while len(order) < count:
+            await asyncio.sleep(0.01)
+            if not command_queue.empty():
+                (_, i, sent) = command_queue.get()
+                latency.append(time.perf_counter() - sent)
+                order.append(i)
+        thread.join()
+        return latency, order
+
+    async def wallpad() -> tuple[list[float], list[int]]:
+        wall = WallPad()
+        wall.set_event_loop(asyncio.get_running_loop())
+        command_queue = wall.command_queue
+        assert command_queue is not None
+        thread = threading.Thread(
+            target=producer, args=(lambda i, t: wall.enqueue_command(PRIORITY_HIGH, (i, t), Command.STATUS),)
+        )
+        thread.start()
+        latency, order = [], []
+        while len(order) < count:
+            (_, _, (i, sent), _) = await command_queue.get()
+            latency.append(time.perf_counter() - sent)
+            order.append(i)
+        thread.join()
+        return latency, order
+
+    for name, fn in (('polling', legacy), ('event', wallpad)):
+        latency, order = asyncio.run(fn())
+        latency.sort()
+        print(
+            f"{name:>8}: mean {statistics.mean(latency) * 1e3:.3f} msec, "
+            f"p99 {latency[int(len(latency) * 0.99) - 1] * 1e3:.3f} msec, FIFO {order == sorted(order)}"
+        )
+
+
+def bench_kocom_encode(args) -> None:
+    '''
+    make_rs485_packet of every wallpad device and command: PacketStruct per call (old) vs
+    frame templates. tests/test_kocom.py checks that both make the same frames.
+    '''
+    from classes.basicdevice import Device
+
+    jobs = make_encode_jobs(make_kocom_handler())
+
+    # results go to stdout, but the DEBUG log calls in make_rs485_packet are still made.
+    template_make_frame = Device.make_frame
+    for name, make_frame in (('struct', legacy_make_frame), ('template', template_make_frame)):
+        Device.make_frame = make_frame
+        try:
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                for obj, cmd in jobs:
+                    obj.make_rs485_packet(cmd)
+            elapsed = time.perf_counter() - start
+        finally:
+            Device.make_frame = template_make_frame
+        count = args.rounds * len(jobs)
+        print(f"{name:>8}: {count / elapsed:,.0f} frames/sec ({count} frames, {elapsed:.3f} sec)")
+
+
+def bench_kocom_decoder(args) -> None:
+    '''
+    KocomPacket (old) vs table driven KocomDecoder on a recorded or generated stream plus every
+    type x device x command combination. tests/test_kocom.py checks that both decode the same.
+    '''
+    from classes.kocom import KocomDecoder, KocomFrameScanner, KocomHandler
+
+    scanner = KocomFrameScanner(KocomHandler.HEADER_LIST, KocomHandler.KOCOM_PACKET_LENGTH)
+    for chunk in load_kocom_stream(args):
+        scanner.feed(chunk)
+    corpus = [frame.body for frame in scanner.frames if frame.status == CommStatus.WAIT_TAIL]
+    bodies = corpus + make_kocom_bodies()
+
+    decoder = KocomDecoder()
+    for name, decode in (
+        ('packet', lambda body: KocomPacket(body).parse_data_from_packet()),
+        ('table', decoder.decode),
+    ):
+        start = time.perf_counter()
+        for body in bodies:
+            decode(body)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>8}: {len(bodies) / elapsed:,.0f} frames/sec ({len(bodies)} frames, {elapsed:.3f} sec)")
+    print(f"{len(corpus)} stream + {len(bodies) - len(corpus)} generated bodies")
+
+
+def bench_decode_alloc(args) -> None:
+    '''
+    memory allocated per decoded frame: new packet objects per frame vs the reused decoders
+    of KocomHandler and LGACPacketHandler. tests/test_kocom.py holds the reused ones to a budget.
+    '''
+    from classes.aircon import Aircon
+    from classes.kocom import KocomFrameScanner, KocomHandler
+    from classes.lgac485 import LGACPacket, LGACPacketHandler
+
+    handler = make_kocom_handler()
+    scanner = KocomFrameScanner(KocomHandler.HEADER_LIST, KocomHandler.KOCOM_PACKET_LENGTH)
+    for chunk in make_kocom_stream(args.frames):
+        scanner.feed(chunk)
+    bodies = [
+        frame.body for frame in scanner.frames
+        if frame.status == CommStatus.WAIT_TAIL and handler.is_checksum_ok(frame.body)
+    ]
+
+    lgac = LGACPacketHandler()
+    responses = [
+        make_lgac_response(bytes((0x80, 0x00, 0xa3, unit, 0x01, 0x00, 0x00, 0x00)))
+        for unit in range(len(cfg.SYSTEM_ROOM_AIRCON))
+    ] * (args.frames // len(cfg.SYSTEM_ROOM_AIRCON))
+
+    def new_lgac_packet(response: bytes) -> Aircon.Info:
+        packet = LGACPacket(response)
+        return Aircon.Info(
+            packet.str_action, packet.str_opmode, packet.str_fanmove, packet.str_fanmode,
+            packet.current_temp, packet.set_temp
+        )
+
+    for path, items, fresh, reused in (
+        ('kocom', bodies, lambda body: KocomPacket(body).parse_data_from_packet(), handler.decode_chunk),
+        ('lgac', responses, new_lgac_packet, lgac.decode_response),
+    ):
+        for name, decode in (('new', fresh), ('reused', reused)):
+            peak, usec = measure_allocations(decode, items)
+            print(f"{path:>5} {name:>6}: {peak:,.0f} bytes/frame at peak, {usec:.2f} usec/frame ({len(items)} frames)")
+
+
+async def legacy_kocom_write_loop(handler) -> None:
+    '''
+    the writer before ACK correlation: fixed wait after every command.
+    '''
+    command_queue = handler.wallpad.command_queue
+    while True:
+        (_, _, device, command) = await command_queue.get()
+        await handler.comm.async_write_one_chunk(device.make_rs485_packet(command))
+        await asyncio.sleep(cfg.PACKET_RESEND_INTERVAL_SEC)
+
+
+def bench_kocom_ack(args) -> None:
+    '''
+    time to get N commands ACKed by a fake Kocom bus: fixed PACKET_RESEND_INTERVAL_SEC
+    wait per command (old) vs release on ACK.
+    '''
+    from classes.elevator import Elevator
+    from consts import PRIORITY_HIGH, Command
+
+    async def run(legacy: bool) -> None:
+        fake = FakeKocomBus(args.delay, args.loss)
+        port = await fake.start()
+        handler = make_kocom_handler()
+        handler.comm = TCPComm('127.0.0.1', port, cfg.MAX_SOCKET_BUFFER, cfg.PACKET_RESEND_INTERVAL_SEC)
+        handler.wallpad.set_event_loop(asyncio.get_running_loop())
+        handler.wallpad.set_notify_function(lambda device, room, value: None)
+        await handler.async_prepare_communication()
+        devices = [
+            obj for _, device_list in handler.wallpad.enabled_device_list for obj in device_list
+            if not isinstance(obj, Elevator)
+        ]
+        writer = legacy_kocom_write_loop(handler) if legacy else handler.kocom_main_write_loop()
+        tasks = [asyncio.create_task(handler.kocom_main_read_loop()), asyncio.create_task(writer)]
+
+        start = time.perf_counter()
+        for i in range(args.commands):
+            handler.wallpad.enqueue_command(PRIORITY_HIGH, devices[i % len(devices)], Command.STATUS)
+        command_queue = handler.wallpad.command_queue
+        while (
+            fake.commands < args.commands or command_queue.qsize() or not fake.is_idle()
+            or handler.ack_waiter is not None
+        ):
+            await asyncio.sleep(0.005)
+        elapsed = fake.last_ack_time - start
+        for task in tasks:
+            task.cancel()
+        await handler.comm.close_async_socket()
+        await fake.stop()
+
+        name = 'fixed' if legacy else 'ack'
+        extra = '' if legacy else f", {handler.get_stats()}"
+        print(
+            f"{name:>6}: {args.commands} commands ACKed in {elapsed:.3f} sec "
+            f"({fake.commands} sent, {fake.acks} ACKs{extra})"
+        )
+
+    for legacy in (True, False):
+        asyncio.run(run(legacy))
+
+
+def bench_kocom_bus(args) -> None:
+    '''
+    Kocom commands on a bus with wallpad traffic: written at once (old) vs written into idle gaps.
+    '''
+    from classes.elevator import Elevator
+    from consts import PRIORITY_HIGH, Command
+
+    async def run(idle_gap: bool) -> None:
+        cfg.KOCOM_BUS_IDLE_GAP_SEC = args.gap if idle_gap else 0.
+        fake = FakeBusyKocomBus(args.delay, args.period)
+        port = await fake.start()
+        handler = make_kocom_handler()
+        handler.comm = TCPComm('127.0.0.1', port, cfg.MAX_SOCKET_BUFFER, cfg.PACKET_RESEND_INTERVAL_SEC)
+        handler.comm.set_wire_speed(cfg.KOCOM_BUS_BPS)
+        handler.wallpad.set_event_loop(asyncio.get_running_loop())
+        handler.wallpad.set_notify_function(lambda device, room, value: False)
+        await handler.async_prepare_communication()
+        devices = [
+            obj for _, device_list in handler.wallpad.enabled_device_list for obj in device_list
+            if not isinstance(obj, Elevator)
+        ]
+        tasks = [
+            asyncio.create_task(handler.kocom_main_read_loop()),
+            asyncio.create_task(handler.kocom_main_write_loop()),
+            asyncio.create_task(fake.traffic()),
+        ]
+
+        start = time.perf_counter()
+        for i in range(args.commands):
+            handler.wallpad.enqueue_command(PRIORITY_HIGH, devices[i % len(devices)], Command.STATUS)
+        command_queue = handler.wallpad.command_queue
+        while command_queue.qsize() or handler.ack_waiter is not None or not fake.is_idle():
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - start
+        for task in tasks:
+            task.cancel()
+        await handler.comm.close_async_socket()
+        await fake.stop()
+
+        stats = handler.get_stats()
+        name = 'idle gap' if idle_gap else 'at once'
+        print(
+            f"{name:>8}: {args.commands} commands in {elapsed:.3f} sec, {fake.collisions} collisions, "
+            f"{stats['retries']} retries, {stats['no_acks']} without ACK, bus {stats['bus']}"
+        )
+
+    for idle_gap in (False, True):
+        asyncio.run(run(idle_gap))
+
+
+def bench_wallpad_scan(args) -> None:
+    '''
+    a simulated day of wallpad devices: CHECK every WALLPAD_SCAN_INTERVAL_TIME (old) vs
+    ScanScheduler. counts CHECKs and how long a state change stays unseen.
+    '''
+    import random
+    import statistics
+
+    from classes.scanscheduler import ScanScheduler
+
+    # mean seconds between state changes. the CO2 sensor changes all the time, lights rarely.
+    periods = {'fan/wallpad': args.sensor_period, 'gas/wallpad': 86400.}
+    for room in cfg.KOCOM_ROOM_THERMOSTAT.values():
+        periods[f'thermostat/{room}'] = 900.
+    for room in cfg.KOCOM_ROOM.values():
+        if room in cfg.KOCOM_LIGHT_SIZE:
+            periods[f'light/{room}'] = 3600.
+        if room in cfg.KOCOM_PLUG_SIZE:
+            periods[f'plug/{room}'] = 7200.
+
+    def run(adaptive: bool) -> None:
+        rand = random.Random(485)
+        scheduler = ScanScheduler(
+            cfg.WALLPAD_SCAN_INTERVAL_TIME, cfg.KOCOM_SCAN_MIN_INTERVAL_SEC, cfg.KOCOM_SCAN_MAX_INTERVAL_SEC
+        )
+        next_change = {key: rand.expovariate(1 / period) for key, period in periods.items()}
+        unseen: dict[str, list[float]] = {key: [] for key in periods}
+        delays: dict[str, list[float]] = {key: [] for key in periods}
+        last_check = {key: 0. for key in periods}
+        for key in periods:
+            scheduler.add(key)
+        checks = 0
+        tick = cfg.RS485_WRITE_INTERVAL_SEC * 2
+        now = 0.
+        while now < args.hours * 3600:
+            for key, when in next_change.items():
+                if when <= now:
+                    next_change[key] = now + rand.expovariate(1 / periods[key])
+                    if rand.random() < args.announced:
+                        # the device reports it by itself, e.g. a wall switch was pressed.
+                        delays[key].append(0.)
+                        scheduler.observe(key, True, now)
+                    else:
+                        unseen[key].append(now)
+            if adaptive:
+                due = scheduler.pop_due(now)
+            else:
+                due = [key for key in periods if now - last_check[key] > cfg.WALLPAD_SCAN_INTERVAL_TIME]
+            for key in due:
+                checks += 1
+                last_check[key] = now
+                delays[key].extend(now - changed for changed in unseen[key])
+                scheduler.observe(key, bool(unseen[key]), now)
+                unseen[key].clear()
+            now += tick
+
+        name = 'adaptive' if adaptive else 'fixed'
+        every = [delay for key in periods for delay in delays[key]]
+        sensor = delays['fan/wallpad']
+        print(
+            f"{name:>8}: {checks / args.hours:.1f} CHECKs/hour, change seen after mean "
+            f"{statistics.mean(every):.1f} sec, CO2 sensor mean {statistics.mean(sensor):.1f} sec"
+        )
+        if adaptive:
+            print(f"{'':>8}  intervals {scheduler.get_stats()['intervals']}")
+
+    for adaptive in (False, True):
+        run(adaptive)
+
+
+def add_parsers(subparsers) -> None:
+    encode_parser = subparsers.add_parser('encode', help="Kocom command frames: PacketStruct vs frame templates")
+    encode_parser.add_argument('--rounds', '-n', type=int, default=2000, help="rounds over all devices and commands")
+    encode_parser.set_defaults(func=bench_kocom_encode)
+
+    decoder_parser = subparsers.add_parser('decoder', help="Kocom decoding: KocomPacket vs KocomDecoder")
+    decoder_parser.add_argument('--frames', '-n', type=int, default=5000, help="frames in generated stream")
+    decoder_parser.add_argument('--file', '-f', help="raw capture of the wallpad bus instead of generated stream")
+    decoder_parser.set_defaults(func=bench_kocom_decoder)
+
+    alloc_parser = subparsers.add_parser('alloc', help="memory per decoded frame: new objects vs reused decoders")
+    alloc_parser.add_argument('--frames', '-n', type=int, default=3000, help="frames in generated stream")
+    alloc_parser.set_defaults(func=bench_decode_alloc)
+
+    command_parser = subparsers.add_parser('command', help="kocom command queue: 10 msec polling vs asyncio queue")
+    command_parser.add_argument('--commands', '-n', type=int, default=300, help="commands put from the thread")
+    command_parser.add_argument('--gap', type=float, default=0.02, help="seconds between commands")
+    command_parser.set_defaults(func=bench_command_queue)
+
+    kocom_ack_parser = subparsers.add_parser('kocomack', help="Kocom commands: fixed wait vs release on ACK")
+    kocom_ack_parser.add_argument('--commands', '-n', type=int, default=10, help="commands to send")
+    kocom_ack_parser.add_argument('--delay', type=float, default=0.03, help="ACK delay of the fake devices")
+    kocom_ack_parser.add_argument('--loss', type=float, default=0., help="chance that an ACK is lost")
+    kocom_ack_parser.set_defaults(func=bench_kocom_ack)
+
+    kocom_bus_parser = subparsers.add_parser('kocombus', help="Kocom commands: written at once vs into idle gaps")
+    kocom_bus_parser.add_argument('--commands', '-n', type=int, default=50, help="commands to send")
+    kocom_bus_parser.add_argument('--period', type=float, default=0.15, help="mean seconds between wallpad bursts")
+    kocom_bus_parser.add_argument('--delay', type=float, default=0.03, help="ACK delay of the fake devices")
+    kocom_bus_parser.add_argument('--gap', type=float, default=cfg.KOCOM_BUS_IDLE_GAP_SEC, help="idle gap seconds")
+    kocom_bus_parser.set_defaults(func=bench_kocom_bus)
+
+    scan_parser = subparsers.add_parser('scan', help="wallpad CHECKs: fixed interval vs adaptive scheduler")
+    scan_parser.add_argument('--hours', type=float, default=24., help="simulated hours")
+    scan_parser.add_argument('--sensor-period', type=float, default=60., help="mean seconds between CO2 changes")
+    scan_parser.add_argument('--announced', type=float, default=0.3, help="share of changes the devices report")
+    scan_parser.set_defaults(func=bench_wallpad_scan)
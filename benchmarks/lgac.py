@@ -0,0 +1,154 @@
+'''
+LG aircon link benchmarks against a fake EW11.
+'''
+import asyncio
+import time
+
+import config as cfg
+from classes.comm import TCPComm
+
+from .common import FakeLGACServer
+
+
+def bench_lgac_connection(args) -> None:
+    '''
+    LG aircon status transactions against a fake EW11: connect per request (old)
+    vs one persistent connection.
+    '''
+    import statistics
+
+    from classes.aircon import Aircon
+    from classes.lgac485 import LGACPacketHandler
+    from consts import PAYLOAD_STATUS
+
+    if args.no_wait:
+        cfg.RS485_WRITE_INTERVAL_SEC = 0.
+        cfg.PACKET_RESEND_INTERVAL_SEC = 0.
+
+    async def run(persistent: bool) -> tuple[list[float], FakeLGACServer]:
+        fake = FakeLGACServer(args.delay)
+        port = await fake.start()
+        handler = LGACPacketHandler(None)
+        handler.comm = TCPComm('127.0.0.1', port, cfg.MAX_SOCKET_BUFFER)
+        handler.persistent = persistent
+        status = Aircon.Info(PAYLOAD_STATUS, '', '', '', 25, 25)
+        latency = []
+        for i in range(args.requests):
+            start = time.perf_counter()
+            info = await handler.async_send_and_get_result(0, i % 6, status)
+            latency.append(time.perf_counter() - start)
+            assert info is not None
+        await handler.async_disconnect()
+        fake.server.close()
+        await fake.server.wait_closed()
+        return latency, fake
+
+    for name, persistent in (('per-request', False), ('persistent', True)):
+        latency, fake = asyncio.run(run(persistent))
+        print(
+            f"{name:>12}: mean {statistics.mean(latency) * 1e3:.2f} msec, max {max(latency) * 1e3:.2f} msec "
+            f"({fake.requests} requests, {fake.connections} connections)"
+        )
+
+
+def bench_lgac_sweep(args) -> None:
+    '''
+    status sweeps of all configured LG aircons against a fake EW11:
+    connect per request with fixed pacing vs persistent connection with measured pacing.
+    '''
+    from classes.lgac485 import LGACPacketHandler
+
+    async def run(persistent: bool) -> tuple[LGACPacketHandler, list[float]]:
+        fake = FakeLGACServer(args.delay)
+        port = await fake.start()
+        handler = LGACPacketHandler(None)
+        handler.comm = TCPComm('127.0.0.1', port, cfg.MAX_SOCKET_BUFFER)
+        handler.persistent = persistent
+        handler.set_notify_function(lambda device, room, info: None)
+        sweeps = []
+        for i in range(args.sweeps):
+            await handler.async_scan_aircons(time.monotonic() + (i + 1) * 2 * cfg.WALLPAD_SCAN_INTERVAL_TIME)
+            sweeps.append(handler.last_sweep_sec)
+        await handler.async_disconnect()
+        fake.server.close()
+        await fake.server.wait_closed()
+        return handler, sweeps
+
+    for name, persistent in (('fixed', False), ('measured', True)):
+        handler, sweeps = asyncio.run(run(persistent))
+        stats = handler.get_stats()
+        print(
+            f"{name:>8}: sweep of {len(handler.aircon)} units "
+            f"{', '.join(f'{x:.3f}' for x in sweeps)} sec, guard gap {stats['guard_gap_msec']} msec"
+        )
+        for no, unit in stats['units'].items():
+            print(f"{'':>10}unit {no}: {unit}")
+
+
+def bench_lgac_commands(args) -> None:
+    '''
+    HA sets mode, fan_mode, swing_mode and target_temp of an aircon as four MQTT messages.
+    send them from a thread (paho) and count the transactions that reach a fake EW11.
+    before coalescing every message was one transaction.
+    '''
+    import threading
+
+    from classes.lgac485 import LGACPacketHandler
+    from consts import (MQTT_FAN_MODE, MQTT_MODE, MQTT_SWING_MODE,
+                        MQTT_TARGET_TEMP, PAYLOAD_COOL, PAYLOAD_HIGH, PAYLOAD_ON)
+
+    settings = ((MQTT_MODE, PAYLOAD_COOL), (MQTT_FAN_MODE, PAYLOAD_HIGH), (MQTT_SWING_MODE, PAYLOAD_ON),
+                (MQTT_TARGET_TEMP, '24'))
+
+    async def run() -> None:
+        fake = FakeLGACServer(args.delay)
+        port = await fake.start()
+        handler = LGACPacketHandler(None)
+        handler.comm = TCPComm('127.0.0.1', port, cfg.MAX_SOCKET_BUFFER)
+        handler.set_event_loop(asyncio.get_running_loop())
+        handler.set_notify_function(lambda device, room, info: None)
+        rooms = list(cfg.SYSTEM_ROOM_AIRCON.values())[:args.units]
+
+        def home_assistant() -> None:
+            for room in rooms:
+                for command, payload in settings:
+                    handler.handle_aircon_mqtt_message(['', '', room, command], payload)
+                    time.sleep(args.gap)
+
+        writer = asyncio.create_task(handler.async_lgac_main_write_loop())
+        start = time.perf_counter()
+        thread = threading.Thread(target=home_assistant)
+        thread.start()
+        while thread.is_alive() or handler.command_event.is_set() or handler.transaction_lock.locked():
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        writer.cancel()
+        await handler.async_disconnect()
+        fake.server.close()
+        await fake.server.wait_closed()
+        stats = handler.get_stats()
+        print(
+            f"{stats['commands']} HA messages -> {fake.requests} transactions "
+            f"(saved {stats['transactions_saved']}), done in {elapsed:.3f} sec"
+        )
+
+    asyncio.run(run())
+
+
+def add_parsers(subparsers) -> None:
+    lgac_parser = subparsers.add_parser('lgac', help="LG aircon link: connect per request vs persistent connection")
+    lgac_parser.add_argument('--requests', '-n', type=int, default=30, help="status transactions")
+    lgac_parser.add_argument('--delay', type=float, default=0.005, help="response delay of fake EW11 in seconds")
+    lgac_parser.add_argument('--no-wait', action='store_true', help="zero the configured write/resend waits")
+    lgac_parser.set_defaults(func=bench_lgac_connection)
+
+    sweep_parser = subparsers.add_parser('lgacscan', help="LG aircon status sweep: fixed vs measured pacing")
+    sweep_parser.add_argument('--sweeps', '-n', type=int, default=3, help="sweeps of all units")
+    sweep_parser.add_argument('--delay', type=float, default=0.03, help="response delay of fake EW11 in seconds")
+    sweep_parser.set_defaults(func=bench_lgac_sweep)
+
+    lgac_command_parser = subparsers.add_parser('lgaccmd', help="LG aircon: HA setting messages vs transactions")
+    lgac_command_parser.add_argument('--units', '-u', type=int, default=3, help="aircons set by HA")
+    lgac_command_parser.add_argument('--gap', type=float, default=0.003, help="seconds between HA messages")
+    lgac_command_parser.add_argument('--delay', type=float, default=0.03, help="response delay of fake EW11")
+    lgac_command_parser.set_defaults(func=bench_lgac_commands)
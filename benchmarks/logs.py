@@ -0,0 +1,147 @@
+'''
+ColorLog benchmarks, with the old log call.
+'''
+import inspect
+import logging
+import time
+
+import config as cfg
+from classes.utils import (Color, ColorFormatter, ColorLog, DroppingQueueHandler,
+                           LazyHex, LogListener)
+
+
+def legacy_color_log(self, string: str, color: Color = Color.White, level: ColorLog.Level = ColorLog.Level.INFO):
+    '''
+    ColorLog.log before the level gate, kept verbatim as reference. self is the ColorLog.
+    '''
+    if isinstance(color, Color):
+        if color in set(item.value for item in Color) or color in Color:
+            color_str = Color(color).value
+        else:
+            color_str = Color.White.value
+    else:
+        color_str = Color.White.value
+
+    if level not in set(item.value for item in ColorLog.Level) and level not in ColorLog.Level:
+        fn = self.logger.info
+    else:
+        fn_str = f"self.logger.{ColorLog.Level(level).value}"
+        fn = eval(fn_str)
+
+    debug_info = f"{inspect.stack()[1].function}:{inspect.stack()[1].lineno}"
+    debug_info = '[' + self.adjust_info_length(debug_info) + '] '
+
+    fn(f'{debug_info}{color_str}{string}{Color.EoC.value}')
+
+
+class FormatOnlyHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.setFormatter(ColorFormatter(ColorLog.LOG_FORMAT))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.format(record)
+
+
+def bench_log(args) -> None:
+    '''
+    per call cost of a hot path DEBUG log: the old ColorLog.log with an f-string,
+    and the gated one with lazy arguments. measured with DEBUG off (normal running)
+    and on (records formatted, but not written).
+    '''
+    color_log = ColorLog()
+    logger = color_log.get_logger()
+    body = bytes(range(17))
+    calls = args.calls
+
+    def legacy() -> None:
+        for _ in range(calls):
+            legacy_color_log(color_log, f"Valid input body=[{body.hex()}]", Color.Green, ColorLog.Level.DEBUG)
+
+    def lazy() -> None:
+        for _ in range(calls):
+            color_log.log("Valid input body=[%s]", Color.Green, ColorLog.Level.DEBUG, LazyHex(body))
+
+    saved_handlers = logger.handlers[:]
+    saved_level = logger.level
+    logger.handlers = [FormatOnlyHandler()]
+    try:
+        for debug in (False, True):
+            logger.setLevel(logging.DEBUG if debug else logging.INFO)
+            for name, fn in (('legacy', legacy), ('lazy', lazy)):
+                start = time.perf_counter()
+                fn()
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{name:>8} (debug {'on' if debug else 'off'}): "
+                    f"{elapsed / calls * 1e6:.2f} usec/call ({calls} calls, {elapsed:.3f} sec)"
+                )
+    finally:
+        logger.handlers = saved_handlers
+        logger.setLevel(saved_level)
+
+
+def bench_log_file(args) -> None:
+    '''
+    time spent in the caller for INFO logs going to a rotating log file:
+    file handler on the logger (old) vs DroppingQueueHandler + listener thread.
+    the queue holds all calls unless --queue-size is given, so both runs write every
+    record. the time until all is written is shown next to the caller time.
+    '''
+    import tempfile
+    from logging.handlers import RotatingFileHandler
+
+    color_log = ColorLog()
+    logger = color_log.get_logger()
+    calls = args.calls
+
+    saved_handlers = logger.handlers[:]
+    saved_level = logger.level
+    logger.setLevel(logging.INFO)
+    try:
+        with tempfile.TemporaryDirectory() as log_dir:
+            for name in ('direct', 'queue'):
+                file_handler = RotatingFileHandler(
+                    f'{log_dir}/{name}.log', maxBytes=args.file_size, backupCount=3, encoding='utf-8'
+                )
+                file_handler.setFormatter(ColorFormatter(ColorLog.LOG_FORMAT))
+                listener = None
+                if name == 'direct':
+                    logger.handlers = [file_handler]
+                else:
+                    queue_handler = DroppingQueueHandler(args.queue_size or calls, args.policy)
+                    listener = LogListener(queue_handler.queue, file_handler)
+                    logger.handlers = [queue_handler]
+                    listener.start()
+
+                start = time.perf_counter()
+                for i in range(calls):
+                    color_log.log("Valid input body=[%s] no=%d", Color.Green, ColorLog.Level.INFO, LazyHex(b'0123'), i)
+                elapsed = time.perf_counter() - start
+                dropped = 0
+                if listener is not None:
+                    listener.stop()
+                    dropped = queue_handler.dropped
+                written = time.perf_counter() - start
+                file_handler.close()
+                print(
+                    f"{name:>8}: {elapsed / calls * 1e6:.2f} usec/call in caller, "
+                    f"{written / calls * 1e6:.2f} usec/call until written ({calls} calls, dropped {dropped})"
+                )
+    finally:
+        logger.handlers = saved_handlers
+        logger.setLevel(saved_level)
+
+
+def add_parsers(subparsers) -> None:
+    log_parser = subparsers.add_parser('log', help="ColorLog: old log call vs level gated, lazy formatted one")
+    log_parser.add_argument('--calls', '-n', type=int, default=2000, help="log calls per run")
+    log_parser.set_defaults(func=bench_log)
+
+    log_file_parser = subparsers.add_parser('logfile', help="log file output: in caller vs queue + listener thread")
+    log_file_parser.add_argument('--calls', '-n', type=int, default=50000, help="log calls per run")
+    log_file_parser.add_argument('--file-size', type=int, default=1024 * 1000, help="bytes before rotation")
+    log_file_parser.add_argument('--queue-size', type=int, default=0,
+                                 help=f"log queue size, 0: as many as calls (hacollector: {cfg.LOG_QUEUE_SIZE})")
+    log_file_parser.add_argument('--policy', default=cfg.LOG_DROP_POLICY, help="drop policy: oldest or newest")
+    log_file_parser.set_defaults(func=bench_log_file)
@@ -0,0 +1,624 @@
+'''
+MQTT side benchmarks: HA command routing, discovery, state publishes, broker outages and reconnects.
+'''
+import asyncio
+import random
+import time
+
+import config as cfg
+from classes.comm import TCPComm
+from classes.utils import Color, ColorLog
+from consts import CommStatus
+from tests.helpers import FakeMqttBroker, FakeMqttServer, SimLoop, load_app_config
+
+from .common import FakeKocomBus, FakeLGACServer, load_kocom_stream
+
+
+def legacy_route_light(wallpad, topic: str, payload: str) -> None:
+    '''
+    inbound light command before TopicRouter: topic split, sub device matched by substring
+    and the room found by a linear scan of the lights.
+    '''
+    from consts import DEVICE_LIGHT, MQTT_CONFIG, PRIORITY_HIGH, Command
+
+    parts = topic.split('/')
+    if MQTT_CONFIG in parts:
+        return
+    if wallpad.is_multi_info_topic(parts[1]):
+        room_str, sub_device_str = parts[2].split('_')
+        if wallpad.get_real_device_from_subdevice(sub_device_str) == DEVICE_LIGHT:
+            for light in wallpad.light:
+                if light.room_name == room_str:
+                    light.handle_mqtt(payload, sub_device_str, room_str)
+                    wallpad.enqueue_command(PRIORITY_HIGH, light, Command.STATUS)
+                    color_log = ColorLog()
+                    color_log.log(f"[From HA]{DEVICE_LIGHT}/{room_str}/{sub_device_str}/{parts[3]} = {payload}")
+                    break
+
+
+def bench_mqtt_route(args) -> None:
+    '''
+    HA light commands to a house of args.rooms rooms: topic parsing + linear scan (old) vs
+    TopicRouter built by discovery. checks that both leave the lights in the same states.
+    '''
+    from classes.light import Light
+    from classes.mqtt import Discovery
+    from classes.topicrouter import TopicRouter
+    from classes.wallpad import WallPad
+    from consts import DEVICE_LIGHT, PAYLOAD_OFF, PAYLOAD_ON
+
+    def make_wallpad() -> WallPad:
+        wallpad = WallPad()
+        wallpad.enqueue_command = lambda priority, device, command: None
+        for i in range(args.rooms):
+            light = Light(f'room{i}')
+            light.set_initial_state(args.lights)
+            wallpad.light.append(light)
+            wallpad.room_devices[(DEVICE_LIGHT, light.room_name)] = light
+        return wallpad
+
+    wallpad = make_wallpad()
+    router = TopicRouter()
+    router.set_handlers(wallpad.get_command_handlers())
+    Discovery([], [], router).discovery_light(False, wallpad.light)
+    rand = random.Random(485)
+    topics = list(router.routes)
+    messages = [(rand.choice(topics), rand.choice((PAYLOAD_ON, PAYLOAD_OFF))) for _ in range(args.messages)]
+
+    legacy_wallpad = make_wallpad()
+    states = {}
+    for name, route in (
+        ('parse', lambda topic, payload: legacy_route_light(legacy_wallpad, topic, payload)),
+        ('router', router.dispatch),
+    ):
+        start = time.perf_counter()
+        for topic, payload in messages:
+            route(topic, payload)
+        elapsed = time.perf_counter() - start
+        used = legacy_wallpad if name == 'parse' else wallpad
+        states[name] = [[state.statelist[0] for state in light.light_list] for light in used.light]
+        print(f"{name:>8}: {len(messages) / elapsed:,.0f} commands/sec ({len(messages)} commands, {elapsed:.3f} sec)")
+    print(
+        f"{len(topics)} command topics in {args.rooms} rooms, "
+        f"states identical: {states['parse'] == states['router']}"
+    )
+
+
+def legacy_discovery(mqtt, initial: bool) -> None:
+    '''
+    homeassistant_device_discovery before DiscoveryCache: every config made, serialized and
+    published (not retained) on every call.
+    '''
+    from classes.mqtt import Discovery
+    from consts import DeviceType
+
+    mqtt.subscribe_list = [(cfg.HA_CALLBACK_MAIN + '/' + cfg.HA_CALLBACK_BRIDGE + '/#', 0)]
+    mqtt.publish_list = []
+    discovery = Discovery(mqtt.publish_list, mqtt.subscribe_list)
+    for dev_name, enabled_device in mqtt.enabled_list:
+        discovery.make_discovery_list(DeviceType(dev_name), enabled_device, False)
+    if initial:
+        mqtt.mqtt_client.subscribe(mqtt.subscribe_list)
+    for ha in mqtt.publish_list:
+        for topic, payload in ha.items():
+            mqtt.mqtt_client.publish(topic, payload)
+
+
+def bench_discovery(args) -> None:
+    '''
+    HA discovery over a start, args.restarts HA restarts and a reconnect after each, then
+    a broker that lost its retained messages: publish all every time (old) vs DiscoveryCache.
+    '''
+    from classes.kocom import KocomHandler
+    from classes.lgac485 import LGACPacketHandler
+    from classes.mqtt import MqttHandler
+
+    app_config = load_app_config()
+    kocom = KocomHandler(app_config)
+    aircon = LGACPacketHandler(None)
+    events = ['start'] + ['restart', 'reconnect'] * args.restarts + ['wipe']
+
+    for name in ('legacy', 'cached'):
+        mqtt = MqttHandler(app_config)
+        mqtt.set_command_handlers(kocom.wallpad.get_command_handlers())
+        mqtt.set_command_handlers(aircon.get_command_handlers())
+        mqtt.set_enabled_list(kocom.wallpad.enabled_device_list + aircon.enabled_device_list)
+        broker = FakeMqttBroker()
+        broker.handler = mqtt
+        mqtt.mqtt_client = broker
+        elapsed = 0.
+        for event in events:
+            if event == 'wipe':
+                broker.retained.clear()
+            initial = event != 'restart'
+            start = time.perf_counter()
+            if name == 'legacy':
+                legacy_discovery(mqtt, initial)
+            else:
+                mqtt.homeassistant_device_discovery(initial=initial)
+                # the echo wait is skipped. the fake broker answers the subscribe at once.
+                mqtt.sync_discovery(time.monotonic() + cfg.HA_DISCOVERY_ECHO_WAIT_SEC)
+            elapsed += time.perf_counter() - start
+        print(
+            f"{name:>8}: {broker.publishes} publishes, {elapsed * 1000 / len(events):.3f} msec per discovery "
+            f"({len(events)} discoveries)"
+        )
+        if name == 'cached':
+            documents = {topic: payload for topic, (payload, _) in mqtt.discovery_cache.documents.items()}
+            print(f"{'':>8}  broker holds every config: {broker.retained == documents}, "
+                  f"{mqtt.discovery_cache.get_stats()}")
+
+
+def bench_publish_coalesce(args) -> None:
+    '''
+    Kocom frames at wire speed through the decoder, StateStore and MqttHandler: every state
+    published at once (old) vs PublishCoalescer. counts what reaches the paho client.
+    '''
+    from classes.kocom import KocomFrameScanner, KocomHandler
+    from classes.mqtt import MqttHandler
+    from classes.statestore import StateStore
+    from consts import DEVICE_FAN, HeaderType
+
+    scanner = KocomFrameScanner(KocomHandler.HEADER_LIST, KocomHandler.KOCOM_PACKET_LENGTH)
+    for chunk in load_kocom_stream(args):
+        scanner.feed(chunk)
+    bodies = [frame.body for frame in scanner.frames if frame.status == CommStatus.WAIT_TAIL]
+    frame_time = KocomHandler.KOCOM_PACKET_LENGTH * 10 / cfg.KOCOM_BUS_BPS
+    app_config = load_app_config()
+
+    last = {}
+    for window in (0., args.window):
+        handler = KocomHandler(app_config)
+        mqtt = MqttHandler(app_config)
+        mqtt.mqtt_client = FakeMqttBroker()
+        mqtt.online = True
+        mqtt.publish_coalescer.window = window
+        loop = SimLoop()
+        mqtt.set_event_loop(loop)
+        state_store = StateStore(mqtt.send_state_to_homeassistant, 0)
+        handler.wallpad.set_notify_function(state_store.update)
+        for index, body in enumerate(bodies):
+            loop.advance(index * frame_time)
+            if handler.handle_chunk(HeaderType.Normal, body) == DEVICE_FAN:
+                handler.handle_chunk(HeaderType.Normal, handler.make_sensor_chunk(body))
+        loop.advance(len(bodies) * frame_time + 1.)
+        stats = mqtt.publish_coalescer.get_stats()
+        name = f'{window * 1000:.0f} msec'
+        print(
+            f"{name:>8}: {stats['submitted']} states -> {mqtt.mqtt_client.publishes} publishes "
+            f"in {stats['batches']} batches ({len(bodies)} frames, {len(bodies) * frame_time:.1f} sec of bus)"
+        )
+        last[window] = mqtt.mqtt_client.last
+    print(f"last state of every topic identical: {last[0.] == last[args.window]}")
+
+
+def bench_offline(args) -> None:
+    '''
+    Kocom states on a simulated clock, broker lost for the last args.outage part of the stream
+    and back a second after its end. the hub loop runs every 0.2 sec. old: publishes while down
+    are lost and the reconnect discovery sends every state again. new: OfflineBuffer replay.
+    reports how long after the reconnect HA is right again and what that took.
+    '''
+    import json
+
+    from classes.kocom import KocomFrameScanner, KocomHandler
+    from classes.lgac485 import LGACPacketHandler
+    from classes.mqtt import MqttHandler
+    from classes.statestore import StateStore
+    from consts import DEVICE_FAN, HeaderType
+
+    scanner = KocomFrameScanner(KocomHandler.HEADER_LIST, KocomHandler.KOCOM_PACKET_LENGTH)
+    for chunk in load_kocom_stream(args):
+        scanner.feed(chunk)
+    bodies = [frame.body for frame in scanner.frames if frame.status == CommStatus.WAIT_TAIL]
+    frame_time = KocomHandler.KOCOM_PACKET_LENGTH * 10 / cfg.KOCOM_BUS_BPS
+    down_at = int(len(bodies) * (1 - args.outage)) * frame_time
+    up_at = len(bodies) * frame_time + 1.013
+    tick = cfg.RS485_WRITE_INTERVAL_SEC * 2
+    app_config = load_app_config()
+    aircon = LGACPacketHandler(None)
+
+    for name, limit in (('refresh', 0), ('buffer', cfg.MQTT_OFFLINE_BUFFER_TOPICS)):
+        handler = KocomHandler(app_config)
+        mqtt = MqttHandler(app_config)
+        mqtt.offline_buffer.limit = limit
+        mqtt.set_enabled_list(handler.wallpad.enabled_device_list + aircon.enabled_device_list)
+        broker = FakeMqttBroker()
+        broker.handler = mqtt
+        mqtt.mqtt_client = broker
+        loop = SimLoop()
+        mqtt.set_event_loop(loop)
+        state_store = StateStore(mqtt.send_state_to_homeassistant, 0)
+        mqtt.set_state_store(state_store)
+        handler.wallpad.set_notify_function(state_store.update)
+
+        def hub_tick(mqtt=mqtt, state_store=state_store, loop=loop) -> None:
+            if mqtt.start_discovery:
+                mqtt.homeassistant_device_discovery(initial=True)
+            state_store.refresh_if_due(loop.now)
+            loop.call_later(tick, hub_tick)
+
+        def stale_topics(mqtt=mqtt, state_store=state_store, broker=broker) -> int:
+            stale = 0
+            for (device, room), value in state_store.states.items():
+                for topic in mqtt.get_state_topics(device, room):
+                    if topic not in broker.last or json.loads(broker.last[topic]) != value:
+                        stale += 1
+            return stale
+
+        mqtt.on_connect(broker, None, None, 0)
+        hub_tick()
+        for index, body in enumerate(bodies):
+            now = index * frame_time
+            if broker.connected and now >= down_at:
+                loop.advance(down_at)
+                broker.connected = False
+                mqtt.on_disconnect(broker, None, 1)
+            loop.advance(now)
+            if handler.handle_chunk(HeaderType.Normal, body) == DEVICE_FAN:
+                handler.handle_chunk(HeaderType.Normal, handler.make_sensor_chunk(body))
+        loop.advance(up_at)
+        stale_at_up = stale_topics()
+        lost = broker.lost
+        before = broker.publishes
+        broker.connected = True
+        mqtt.on_connect(broker, None, None, 0)
+        loop.advance(up_at)
+        waited = 0.
+        while stale_topics() and waited < 2.:
+            waited += 0.001
+            loop.advance(up_at + waited)
+        print(
+            f"{name:>8}: HA right {waited * 1000:.0f} msec after reconnect with {broker.publishes - before} "
+            f"publishes ({stale_at_up} stale topics, {lost} publishes lost while down)"
+        )
+    print(
+        f"{len(state_store.states)} states, broker down {up_at - down_at:.1f} of {up_at:.1f} sec, "
+        f"offline buffer {mqtt.offline_buffer.get_stats()}"
+    )
+
+
+def legacy_send_state(mqtt, device: str, room: str, value: dict) -> None:
+    '''
+    MqttHandler.send_state_to_homeassistant before the topic table and StateEncoder.
+    '''
+    import json
+
+    from consts import (DEVICE_AIRCON, DEVICE_ELEVATOR, DEVICE_FAN, DEVICE_GAS,
+                        DEVICE_LIGHT, DEVICE_PLUG, DEVICE_SENSOR, DEVICE_THERMOSTAT,
+                        DEVICE_WALLPAD, PAYLOAD_STATE)
+
+    color_log = ColorLog()
+
+    def get_ha_device_string(device: str):
+        if device in [DEVICE_ELEVATOR, DEVICE_PLUG]:
+            return cfg.HA_SWITCH
+        elif device in [DEVICE_THERMOSTAT, DEVICE_AIRCON]:
+            return cfg.HA_CLIMATE
+        elif device == DEVICE_LIGHT:
+            return cfg.HA_LIGHT
+        elif device == DEVICE_FAN:
+            return cfg.HA_FAN
+        elif device == DEVICE_GAS:
+            return cfg.HA_GAS
+        elif device == DEVICE_SENSOR:
+            return cfg.HA_SENSOR
+        else:
+            color_log.log(f"Wrong device matching to HA = [{device}]", Color.Red, ColorLog.Level.DEBUG)
+            return
+
+    color_log.log(f"Trying to send states to HA : d=[{device}], v=[{value}]", Color.Magenta, ColorLog.Level.DEBUG)
+
+    v_value = json.dumps(value)
+    if device == DEVICE_GAS:
+        topic = mqtt.make_topic_string(cfg.HA_PREFIX, cfg.HA_SENSOR, room, PAYLOAD_STATE, DEVICE_GAS)
+        mqtt.publish_coalescer.submit(topic, v_value)
+        topic = mqtt.make_topic_string(cfg.HA_PREFIX, cfg.HA_SWITCH, room, PAYLOAD_STATE, DEVICE_GAS)
+    else:
+        ha_device = get_ha_device_string(device)
+        if ha_device is not None:
+            if device == DEVICE_AIRCON:
+                prefix = cfg.CONF_AIRCON_DEVICE_NAME
+            else:
+                prefix = cfg.HA_PREFIX
+            if ha_device == cfg.HA_SENSOR:
+                topic = mqtt.make_topic_string(prefix, ha_device, DEVICE_WALLPAD, PAYLOAD_STATE, DEVICE_SENSOR)
+            else:
+                topic = mqtt.make_topic_string(prefix, ha_device, room, PAYLOAD_STATE)
+        else:
+            topic = None
+    if topic is not None:
+        mqtt.publish_coalescer.submit(topic, v_value)
+        color_log.log(f"[To HA]{topic} = {v_value}", Color.White, ColorLog.Level.DEBUG)
+
+
+def bench_state_publish(args) -> None:
+    '''
+    the states of decoded Kocom frames (and of LG aircons) to the paho client: topic made by
+    f-strings + json.dumps per publish (old) vs topic table + StateEncoder, with and without orjson.
+    '''
+    import json
+
+    from classes.kocom import KocomFrameScanner, KocomHandler
+    from classes.mqtt import MqttHandler
+    from classes.stateencoder import orjson
+    from consts import (DEVICE_AIRCON, DEVICE_FAN, MQTT_CURRENT_TEMP, MQTT_FAN_MODE,
+                        MQTT_MODE, MQTT_SWING_MODE, MQTT_TARGET_TEMP, HeaderType)
+
+    scanner = KocomFrameScanner(KocomHandler.HEADER_LIST, KocomHandler.KOCOM_PACKET_LENGTH)
+    for chunk in load_kocom_stream(args):
+        scanner.feed(chunk)
+    app_config = load_app_config()
+    handler = KocomHandler(app_config)
+    states: list[tuple[str, str, dict]] = []
+    # empty states (wallpad frames) have no HA topic, only published ones are measured.
+    handler.wallpad.set_notify_function(lambda device, room, value: value and states.append((device, room, value)))
+    for frame in scanner.frames:
+        if frame.status == CommStatus.WAIT_TAIL:
+            if handler.handle_chunk(HeaderType.Normal, frame.body) == DEVICE_FAN:
+                handler.handle_chunk(HeaderType.Normal, handler.make_sensor_chunk(frame.body))
+    rand = random.Random(485)
+    for index in range(len(states) // 10):
+        states.append((DEVICE_AIRCON, f'room{index % 8}', {
+            MQTT_MODE: rand.choice(['off', 'cool', 'dry', 'fan_only']),
+            MQTT_SWING_MODE: rand.choice(['on', 'off']),
+            MQTT_FAN_MODE: rand.choice(['low', 'medium', 'high', 'auto']),
+            MQTT_CURRENT_TEMP: f'{rand.uniform(18, 32):.2f}',
+            MQTT_TARGET_TEMP: f'{rand.randrange(18, 30)}',
+        }))
+    rand.shuffle(states)
+
+    variants = [('json', False), ('template', False)]
+    if orjson is not None:
+        variants.append(('orjson', True))
+    last = {}
+    for name, use_orjson in variants:
+        mqtt = MqttHandler(app_config)
+        mqtt.mqtt_client = FakeMqttBroker()
+        mqtt.online = True
+        mqtt.state_encoder.use_orjson = use_orjson
+        send = (lambda d, r, v, mqtt=mqtt: legacy_send_state(mqtt, d, r, v)) if name == 'json' \
+            else mqtt.send_state_to_homeassistant
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for device, room, value in states:
+                send(device, room, value)
+        elapsed = time.perf_counter() - start
+        publishes = mqtt.mqtt_client.publishes
+        print(
+            f"{name:>8}: {publishes / elapsed:,.0f} publishes/sec "
+            f"({publishes} publishes, {elapsed * 1e6 / publishes:.2f} usec each)"
+        )
+        last[name] = mqtt.mqtt_client.last
+    print(
+        f"{len(states)} states, {len(last['json'])} topics, "
+        f"template text identical to json.dumps: {last['template'] == last['json']}"
+    )
+    if 'orjson' in last:
+        same = {topic: json.loads(payload) for topic, payload in last['orjson'].items()} == \
+            {topic: json.loads(payload) for topic, payload in last['json'].items()}
+        print(f"orjson payloads decode to the same values: {same}")
+
+
+def bench_mqtt_latency(args) -> None:
+    '''
+    HA light command -> first Kocom frame on a fake bus, through a fake broker, MqttHandler,
+    the command queue and the Kocom writer: paho network thread (old) vs client in the loop.
+    '''
+    import statistics
+
+    from classes.mqtt import MqttHandler
+    from consts import PAYLOAD_OFF, PAYLOAD_ON, DeviceType
+
+    async def run(in_loop: bool) -> list[float]:
+        loop = asyncio.get_running_loop()
+        broker = FakeMqttServer()
+        broker_port = await broker.start()
+        bus = FakeKocomBus(args.delay)
+        bus_port = await bus.start()
+
+        app_config = load_app_config()
+        app_config.mqtt_server, app_config.mqtt_port, app_config.mqtt_anonymous = '127.0.0.1', broker_port, 'True'
+        handler = KocomHandler(app_config)
+        handler.comm = TCPComm('127.0.0.1', bus_port, cfg.MAX_SOCKET_BUFFER, cfg.PACKET_RESEND_INTERVAL_SEC)
+        handler.wallpad.set_event_loop(loop)
+        handler.wallpad.set_notify_function(lambda device, room, value: None)
+        await handler.async_prepare_communication()
+        tasks = [
+            asyncio.create_task(handler.kocom_main_read_loop()), asyncio.create_task(handler.kocom_main_write_loop())
+        ]
+
+        cfg.MQTT_ASYNCIO_LOOP = in_loop
+        mqtt = MqttHandler(app_config)
+        mqtt.set_event_loop(loop)
+        mqtt.set_kocom_mqtt_handler(handler.wallpad.handle_wallpad_mqtt_message)
+        mqtt.set_command_handlers(handler.wallpad.get_command_handlers())
+        mqtt.set_enabled_list(handler.wallpad.enabled_device_list)
+        mqtt.connect_mqtt()
+        while not mqtt.start_discovery:
+            await asyncio.sleep(0.001)
+        mqtt.homeassistant_device_discovery(initial=True)
+        assert broker.subscribed is not None
+        await broker.subscribed.wait()
+        topic = next(
+            topic for topic, route in mqtt.topic_router.routes.items() if route.device.device == DeviceType.LIGHT
+        )
+
+        latencies = []
+        for i in range(args.commands):
+            sent = len(bus.command_times)
+            bus.command_event.clear()
+            start = time.perf_counter()
+            broker.inject(topic, PAYLOAD_ON if i % 2 else PAYLOAD_OFF)
+            await bus.command_event.wait()
+            latencies.append(bus.command_times[sent] - start)
+            while not bus.is_idle() or handler.ack_waiter is not None:
+                await asyncio.sleep(0.005)
+            # let the bus go idle, so the writer does not wait for a gap.
+            await asyncio.sleep(args.gap)
+
+        mqtt.cleanup()
+        for task in tasks:
+            task.cancel()
+        await handler.comm.close_async_socket()
+        await bus.stop()
+        broker.server.close()
+        return latencies
+
+    from classes.kocom import KocomHandler
+
+    for in_loop in (False, True):
+        latencies = sorted(asyncio.run(run(in_loop)))
+        name = 'loop' if in_loop else 'thread'
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(
+            f"{name:>8}: MQTT command -> first RS485 frame median {statistics.median(latencies) * 1000:.2f} msec, "
+            f"p95 {p95 * 1000:.2f} msec ({len(latencies)} commands)"
+        )
+
+
+def bench_reconnect(args) -> None:
+    '''
+    the reconnect command from HA against a fake broker and fake EW11s: everything made again,
+    like hacollector.py after prepare_reconnect() (old), vs Hub.async_reconnect_links().
+    time from the command until the EW11 links are up and MQTT is online and subscribed.
+    '''
+    import statistics
+    import warnings
+    from types import SimpleNamespace
+
+    from classes.hub import Hub
+    from classes.kocom import KocomHandler
+    from classes.lgac485 import LGACPacketHandler
+    from classes.mqtt import MqttHandler
+    from classes.statestore import StateStore
+
+    # paho warns about its callback API version on every client.
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    async def start_app(ports: SimpleNamespace, broker: FakeMqttServer) -> SimpleNamespace:
+        '''
+        startup of hacollector.py main(), with the fake servers.
+        '''
+        loop = asyncio.get_running_loop()
+        app_config = load_app_config()
+        app_config.mqtt_server, app_config.mqtt_port, app_config.mqtt_anonymous = '127.0.0.1', ports.mqtt, 'True'
+        app_config.kocom_server, app_config.kocom_port = '127.0.0.1', ports.kocom
+        app_config.aircon_server, app_config.aircon_port = '127.0.0.1', ports.aircon
+        kocom = KocomHandler(app_config)
+        aircon = LGACPacketHandler(app_config)
+        mqtt = MqttHandler(app_config)
+        state_store = StateStore(mqtt.send_state_to_homeassistant, cfg.STATE_REFRESH_INTERVAL_SEC)
+        kocom.wallpad.set_event_loop(loop)
+        aircon.set_event_loop(loop)
+        mqtt.set_event_loop(loop)
+        kocom.wallpad.set_notify_function(state_store.update)
+        aircon.set_notify_function(mqtt.change_aircon_status)
+        mqtt.set_state_store(state_store)
+        mqtt.set_command_handlers(kocom.wallpad.get_command_handlers())
+        mqtt.set_command_handlers(aircon.get_command_handlers())
+        mqtt.set_enabled_list(kocom.wallpad.enabled_device_list + aircon.enabled_device_list)
+        hub = Hub(kocom, aircon, mqtt, kocom.wallpad, state_store)
+        broker.subscribed = asyncio.Event()
+        mqtt.connect_mqtt()
+        await kocom.async_prepare_communication()
+        coroutines = (
+            kocom.kocom_main_read_loop(), kocom.kocom_main_write_loop(),
+            aircon.async_lgac_main_write_loop(), hub.async_scan_thread()
+        )
+        return SimpleNamespace(hub=hub, tasks=[loop.create_task(coroutine) for coroutine in coroutines])
+
+    async def stop_app(app: SimpleNamespace) -> None:
+        for task in app.tasks:
+            task.cancel()
+        await asyncio.gather(*app.tasks, return_exceptions=True)
+        await app.hub.kocom_handler.comm.close_async_socket()
+        await app.hub.aircon_handler.async_disconnect()
+        app.hub.mqtt_handler.cleanup()
+
+    async def wait_ready(app: SimpleNamespace, broker: FakeMqttServer) -> None:
+        hub = app.hub
+        assert broker.subscribed is not None
+        while not (
+            hub.mqtt_handler.online and broker.subscribed.is_set() and hub.kocom_handler.link_ready.is_set()
+            and hub.aircon_handler.comm.is_connected()
+        ):
+            await asyncio.sleep(0.001)
+
+    async def run() -> dict[str, list[tuple[float, int]]]:
+        broker = FakeMqttServer()
+        bus = FakeKocomBus(args.delay)
+        lgac = FakeLGACServer(args.delay)
+        ports = SimpleNamespace(mqtt=await broker.start(), kocom=await bus.start(), aircon=await lgac.start())
+        app = await start_app(ports, broker)
+        await wait_ready(app, broker)
+        fallbacks = []
+        results: dict[str, list[tuple[float, int]]] = {'cold': [], 'warm': []}
+        for name in results:
+            for _ in range(args.cycles):
+                await asyncio.sleep(args.settle)
+                if name == 'cold':
+                    # old tasks, sockets and client stopped, as at the end of hacollector.py main().
+                    await stop_app(app)
+                    start = time.perf_counter()
+                    app = await start_app(ports, broker)
+                else:
+                    start = time.perf_counter()
+                    await app.hub.async_reconnect_links(lambda: fallbacks.append(True))
+                await wait_ready(app, broker)
+                results[name].append((time.perf_counter() - start, len(app.hub.state_store.states)))
+        await stop_app(app)
+        broker.server.close()
+        await asyncio.sleep(0.1)
+        assert not fallbacks
+        return results
+
+    results = asyncio.run(run())
+    for name, cycles in results.items():
+        times = sorted(elapsed for elapsed, _ in cycles)
+        print(
+            f"{name:>5}: reconnect -> ready median {statistics.median(times) * 1000:.1f} msec, "
+            f"max {times[-1] * 1000:.1f} msec, device states kept at ready {cycles[-1][1]} ({len(cycles)} cycles)"
+        )
+
+
+def add_parsers(subparsers) -> None:
+    route_parser = subparsers.add_parser('route', help="HA commands: topic parsing + list scan vs TopicRouter")
+    route_parser.add_argument('--rooms', type=int, default=200, help="rooms with lights")
+    route_parser.add_argument('--lights', type=int, default=3, help="lights per room")
+    route_parser.add_argument('--messages', '-n', type=int, default=100000, help="commands to route")
+    route_parser.set_defaults(func=bench_mqtt_route)
+
+    discovery_parser = subparsers.add_parser('discovery', help="HA discovery: publish all vs DiscoveryCache")
+    discovery_parser.add_argument('--restarts', type=int, default=10, help="HA restarts (each with a reconnect)")
+    discovery_parser.set_defaults(func=bench_discovery)
+
+    publish_parser = subparsers.add_parser('publish', help="state publishes: at once vs coalesced per topic")
+    publish_parser.add_argument('--frames', '-n', type=int, default=2000, help="frames in generated stream")
+    publish_parser.add_argument('--file', '-f', help="raw Kocom capture instead of a generated stream")
+    publish_parser.add_argument('--window', type=float, default=cfg.STATE_COALESCE_WINDOW_SEC, help="seconds")
+    publish_parser.set_defaults(func=bench_publish_coalesce)
+
+    offline_parser = subparsers.add_parser('offline', help="broker outage: lost publishes + refresh vs replay")
+    offline_parser.add_argument('--frames', '-n', type=int, default=2000, help="frames in generated stream")
+    offline_parser.add_argument('--file', '-f', help="raw Kocom capture instead of a generated stream")
+    offline_parser.add_argument('--outage', type=float, default=0.4, help="part of the stream with broker down")
+    offline_parser.set_defaults(func=bench_offline)
+
+    state_parser = subparsers.add_parser('statepublish', help="state publishes: f-strings + json.dumps vs encoders")
+    state_parser.add_argument('--frames', '-n', type=int, default=2000, help="frames in generated stream")
+    state_parser.add_argument('--file', '-f', help="raw Kocom capture instead of a generated stream")
+    state_parser.add_argument('--rounds', type=int, default=20, help="times every state is published")
+    state_parser.set_defaults(func=bench_state_publish)
+
+    mqtt_latency_parser = subparsers.add_parser('mqttloop', help="HA command latency: paho thread vs asyncio loop")
+    mqtt_latency_parser.add_argument('--commands', '-n', type=int, default=200, help="commands to send")
+    mqtt_latency_parser.add_argument('--delay', type=float, default=0.01, help="seconds until a device ACKs")
+    mqtt_latency_parser.add_argument('--gap', type=float, default=0.06, help="seconds between commands")
+    mqtt_latency_parser.set_defaults(func=bench_mqtt_latency)
+
+    reconnect_parser = subparsers.add_parser('reconnect', help="EW11 reconnect: restart everything vs warm relink")
+    reconnect_parser.add_argument('--cycles', '-n', type=int, default=5, help="reconnects of each kind")
+    reconnect_parser.add_argument('--delay', type=float, default=0.01, help="seconds until a device answers")
+    reconnect_parser.add_argument('--settle', type=float, default=0.5, help="seconds of running between reconnects")
+    reconnect_parser.set_defaults(func=bench_reconnect)
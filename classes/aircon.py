@@ -20,6 +20,8 @@ class Aircon(Device):
         self.scan.reset()
 
     class Info:
+        __slots__ = ('action', 'opmode', 'fanmove', 'fanmode', 'cur_temp', 'target_temp')
+
         def __init__(self, action, opmode, fanmode, fanspeed, cur_temp, target_temp) -> None:
             self.action: str        = action
             self.opmode: str        = opmode
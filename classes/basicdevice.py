@@ -1,12 +1,11 @@
 from __future__ import annotations
 
 from enum import Enum
-from struct import calcsize, pack, unpack
-from typing import Union
+from struct import Struct, pack
+from typing import NamedTuple, Union
 
+import config as cfg
 from classes.utils import Color, ColorLog
-from config import (KOCOM_LIGHT_SIZE, KOCOM_PLUG_SIZE, KOCOM_ROOM,
-                    KOCOM_ROOM_THERMOSTAT)
 from consts import (DEVICE_ELEVATOR, DEVICE_FAN, DEVICE_GAS, DEVICE_LIGHT,
                     DEVICE_PLUG, DEVICE_THERMOSTAT, DEVICE_WALLPAD,
                     PAYLOAD_OFF, PAYLOAD_ON, Command, DeviceType, State)
@@ -18,6 +17,8 @@ class Device:
         DEFAULT_TYPESEQ = b'\x30\xbc\x00'
         PREFIX          = HEADER_MAGIC + DEFAULT_TYPESEQ
         POSTFIX         = b'\x0d\x0d'
+        VALUE_OFFSET    = 10        # magic, type/seq, dest, dest room, src, src room, command
+        CHECKSUM_BYTES  = tuple(bytes((x,)) for x in range(0x100))
         # FMT_type__seq   = 'H'
         # FMT_dummy       = 'B'
         # FMT_dst_device  = 'B'
@@ -37,8 +38,17 @@ class Device:
         #                     + FMT_parameter      \
         #                     + FMT_checksum
         FMT_one_packet  = '>HBBBBBBQB'
+        ONE_PACKET      = Struct(FMT_one_packet)
+
+        __slots__ = (
+            'type_and_sequence', 'dummy', 'dest_device_id', 'dest_room_no', 'src_device_id', 'src_room_no',
+            'command', 'value_array', 'checksum'
+        )
 
         def __init__(self) -> None:
+            self.reset()
+
+        def reset(self) -> None:
             self.type_and_sequence: int = 0
             self.dummy: int             = 0
             self.dest_device_id: int    = 0
@@ -51,7 +61,7 @@ class Device:
 
         @property
         def _body_size(self) -> int:
-            return calcsize(Device.PacketStruct.FMT_one_packet)
+            return Device.PacketStruct.ONE_PACKET.size
 
         def calc_checksum(self, body: Union[bytes, bytes]):
             checksum = sum(body)
@@ -67,7 +77,7 @@ class Device:
                         ColorLog.Level.DEBUG
                     )
                     return False
-                res = unpack(Device.PacketStruct.FMT_one_packet, data)
+                res = Device.PacketStruct.ONE_PACKET.unpack(data)
                 (
                     self.type_and_sequence,
                     self.dummy,
@@ -145,8 +155,6 @@ class Device:
     }
     KOCOM_DEVICE_REV           = {v: k for k, v in KOCOM_DEVICE.items()}
     KOCOM_COMMAND_REV          = {v: k for k, v in KOCOM_COMMAND.items()}
-    KOCOM_ROOM_REV             = {v: k for k, v in KOCOM_ROOM.items()}
-    KOCOM_ROOM_THERMOSTAT_REV  = {v: k for k, v in KOCOM_ROOM_THERMOSTAT.items()}
 
     @classmethod
     def match_kocom_device(cls, id: DeviceType) -> str:
@@ -165,12 +173,12 @@ class Device:
 
     @classmethod
     def parse_kocom_room(cls, strnum: str) -> str:
-        ret_str = KOCOM_ROOM.get(strnum)
+        ret_str = cfg.KOCOM_ROOM.get(strnum)
         return ret_str if ret_str is not None else ''
 
     @classmethod
     def parse_kocom_room_thermo(cls, strnum: str) -> str:
-        ret_str = KOCOM_ROOM_THERMOSTAT.get(strnum)
+        ret_str = cfg.KOCOM_ROOM_THERMOSTAT.get(strnum)
         return ret_str if ret_str is not None else ''
 
     def get_kocom_device_data(self, id: DeviceType) -> int | None:
@@ -180,21 +188,60 @@ class Device:
         return self.KOCOM_COMMAND_REV.get(id)
 
     def parse_kocom_light_size(self, strnum: str) -> int:
-        ret_num = KOCOM_LIGHT_SIZE.get(strnum)
+        ret_num = cfg.KOCOM_LIGHT_SIZE.get(strnum)
         return ret_num if ret_num is not None else 0
 
     def parse_kocom_plug_size(self, strnum: str) -> int:
-        ret_num = KOCOM_PLUG_SIZE.get(strnum)
+        ret_num = cfg.KOCOM_PLUG_SIZE.get(strnum)
         return ret_num if ret_num is not None else 0
 
+    # room maps are read from config on every call, env values replace them after import.
+    # only a frame template miss comes here.
     def get_kocom_room_data(self, instr: str) -> str:
-        ret_str = self.KOCOM_ROOM_REV.get(instr)
+        ret_str = {v: k for k, v in cfg.KOCOM_ROOM.items()}.get(instr)
         return ret_str if ret_str is not None else ''
 
     def get_kocom_room_thermo_data(self, instr: str) -> str:
-        ret_str = self.KOCOM_ROOM_THERMOSTAT_REV.get(instr)
+        ret_str = {v: k for k, v in cfg.KOCOM_ROOM_THERMOSTAT.items()}.get(instr)
         return ret_str if ret_str is not None else ''
 
+    # (dest, src, command, room) -> frame up to the value field and the sum of its checksummed bytes
+    FRAME_TEMPLATES: dict[tuple[DeviceType, DeviceType, Command, str], tuple[bytes, int]] = {}
+    # the room map the templates were made with
+    FRAME_TEMPLATES_ROOMS: dict[str, str] = cfg.KOCOM_ROOM
+
+    def make_frame(self,
+                   dest_devtype: DeviceType,
+                   src_devtype: DeviceType,
+                   cmd: Command,
+                   value: int = 0,
+                   room_name: str = '') -> bytes:
+        '''
+        full packet from a cached template. only the value field and the checksum are made per call.
+        '''
+        if Device.FRAME_TEMPLATES_ROOMS is not cfg.KOCOM_ROOM:
+            Device.FRAME_TEMPLATES.clear()
+            Device.FRAME_TEMPLATES_ROOMS = cfg.KOCOM_ROOM
+        key = (dest_devtype, src_devtype, cmd, room_name)
+        template = Device.FRAME_TEMPLATES.get(key)
+        if template is None:
+            new_packet = Device.PacketStruct()
+            made = self.make_device_basic_info(new_packet, dest_devtype, src_devtype, cmd, room_name)
+            if not made:
+                color_log = ColorLog()
+                color_log.log(f"Error in make {self.device} packet!", Color.Red, ColorLog.Level.WARN)
+            packet = new_packet.get_full_bytes_packet()
+            if packet == b'':
+                return b''
+            head = packet[:Device.PacketStruct.VALUE_OFFSET]
+            template = (head, sum(head[2:]))
+            if made:
+                Device.FRAME_TEMPLATES[key] = template
+        head, head_sum = template
+        value_bytes = value.to_bytes(8, 'big')
+        checksum = (head_sum + sum(value_bytes)) & 0xff
+        return head + value_bytes + Device.PacketStruct.CHECKSUM_BYTES[checksum] + Device.PacketStruct.POSTFIX
+
     def make_device_basic_info(self,
                                new_packet: PacketStruct,
                                dest_devtype: DeviceType,
@@ -217,10 +264,11 @@ class Device:
 
 
 class SwitchInput:
-    class StatePair:
-        def __init__(self, name: str, state: Enum) -> None:
-            self.name = name
-            self.state = state
+    class StatePair(NamedTuple):
+        name: str
+        state: Enum
+
+    __slots__ = ('switch_list', 'room_str')
 
     def __init__(self) -> None:
         self.switch_list: list[SwitchInput.StatePair] = []
@@ -2,11 +2,181 @@ from __future__ import annotations
 
 import asyncio
 import errno
+import socket
 import time
+from collections import deque
+from typing import Any, Callable, Protocol
 
 from classes.utils import Color, ColorLog
 
 
+class RingBuffer:
+    '''
+    fixed size byte ring for socket reads.
+
+    data is copied in with memoryview slices and never moves after that, so
+    consuming from the front does not shift or reallocate the remaining bytes.
+    the storage grows (doubling) only when a writer outruns the reader.
+    '''
+    def __init__(self, capacity: int = 4096) -> None:
+        self._buf                       = bytearray(capacity)
+        self._view                      = memoryview(self._buf)
+        self._capacity                  = capacity
+        self._head                      = 0         # index of first unread byte
+        self._size                      = 0         # count of unread bytes
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def free(self) -> int:
+        return self._capacity - self._size
+
+    def clear(self) -> None:
+        self._head = 0
+        self._size = 0
+
+    def _grow(self, need: int) -> None:
+        capacity = self._capacity
+        while capacity - self._size < need:
+            capacity *= 2
+        new_buf = bytearray(capacity)
+        new_buf[0:self._size] = self.peek(self._size)
+        self._buf       = new_buf
+        self._view      = memoryview(new_buf)
+        self._capacity  = capacity
+        self._head      = 0
+
+    def write(self, data) -> int:
+        length = len(data)
+        if length == 0:
+            return 0
+        if length > self.free:
+            self._grow(length)
+        tail = (self._head + self._size) % self._capacity
+        first = min(length, self._capacity - tail)
+        self._view[tail:tail + first] = data[0:first]
+        if first < length:
+            self._view[0:length - first] = data[first:length]
+        self._size += length
+        return length
+
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('RingBuffer index out of range')
+        return self._buf[(self._head + index) % self._capacity]
+
+    def peek(self, length: int, offset: int = 0) -> bytes:
+        '''
+        return up to length bytes starting at offset without consuming them.
+        '''
+        length = max(0, min(length, self._size - offset))
+        if length == 0:
+            return b''
+        start = (self._head + offset) % self._capacity
+        end = start + length
+        if end <= self._capacity:
+            return self._view[start:end].tobytes()
+        return self._view[start:].tobytes() + self._view[0:end - self._capacity].tobytes()
+
+    def skip(self, length: int) -> int:
+        length = min(length, self._size)
+        self._head = (self._head + length) % self._capacity
+        self._size -= length
+        if self._size == 0:
+            self._head = 0
+        return length
+
+    def consume(self, length: int) -> bytes:
+        # hot path of every socket read, so the common (not wrapped) case is inlined.
+        size = self._size
+        if length >= size:
+            length = size
+            if length == 0:
+                return b''
+        head = self._head
+        end = head + length
+        if end < self._capacity:
+            ret = self._view[head:end].tobytes()
+            self._head = end if length != size else 0
+            self._size = size - length
+            return ret
+        ret = self.peek(length)
+        self.skip(length)
+        return ret
+
+    def find(self, sub: bytes, start: int = 0) -> int:
+        '''
+        return offset (from the read position) of sub, or -1.
+        '''
+        if start >= self._size:
+            return -1
+        head = self._head
+        end = head + self._size
+        if end <= self._capacity:
+            index = self._buf.find(sub, head + start, end)
+            return index - head if index >= 0 else -1
+
+        # wrapped: search the upper part, the seam, then the lower part.
+        wrap = self._capacity - head
+        if start < wrap:
+            index = self._buf.find(sub, head + start, self._capacity)
+            if index >= 0:
+                return index - head
+            overlap = len(sub) - 1
+            if overlap > 0:
+                seam_start = max(start, wrap - overlap)
+                seam = self.peek(wrap - seam_start + overlap, seam_start)
+                index = seam.find(sub)
+                if index >= 0:
+                    return seam_start + index
+            start = wrap
+        index = self._buf.find(sub, start - wrap, end - self._capacity)
+        return index + wrap if index >= 0 else -1
+
+
+class FrameParser(Protocol):
+    frames: deque
+
+    def feed(self, data: bytes) -> int:
+        ...
+
+
+class FrameProtocol(asyncio.Protocol):
+    '''
+    hands every socket read straight to a frame parser and queues the finished frames.
+    None is queued when the connection is lost. on_data is called on every read.
+    '''
+    def __init__(self, parser: FrameParser, frames: asyncio.Queue, on_data: Callable[[], None] | None = None) -> None:
+        self.parser                                     = parser
+        self.frames                                     = frames
+        self.on_data                                    = on_data
+        self.transport: asyncio.Transport | None        = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def data_received(self, data: bytes) -> None:
+        if self.on_data is not None:
+            self.on_data()
+        parsed = self.parser.frames
+        if self.parser.feed(data):
+            while parsed:
+                self.frames.put_nowait(parsed.popleft())
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        if exc is not None:
+            color_log = ColorLog()
+            color_log.log(f"Connection lost: {exc}", Color.Red, ColorLog.Level.WARN)
+        self.frames.put_nowait(None)
+
+
 class TCPComm:
     def __init__(self, server: str, port: int, buffer_size: int = 2048, interval: float = 0.0) -> None:
         self.server                     = server
@@ -14,10 +184,20 @@ class TCPComm:
         self.buffer_size                = buffer_size
         self.interval                   = interval
         self.last_accessed_time         = time.monotonic()
-        self.read_buffer: bytes         = b''
+        self.read_buffer: RingBuffer    = RingBuffer(buffer_size * 2)
         self.connection_reset: bool     = False
         self.reader: asyncio.StreamReader
         self.writer: asyncio.StreamWriter
+        self.transport: asyncio.Transport | None    = None
+        self.frame_queue: asyncio.Queue | None      = None
+        # bus activity. every read is stamped, the end of a write is estimated from byte_time.
+        self.last_rx_time               = 0.
+        self.write_end_time             = 0.
+        self.byte_time                  = 0.
+        self.idle_waits                 = 0
+        self.idle_wait_time             = 0.
+        self.busy_writes                = 0
+        self.rx_during_write            = 0
 
     @classmethod
     async def async_init(cls, server: str, port: int, buffer_size: int = 2048, interval: float = 0.0):
@@ -27,10 +207,53 @@ class TCPComm:
         (self.reader, self.writer) = await asyncio.open_connection(host=self.server, port=self.port)
         self.socket = self.writer.get_extra_info('socket')
 
+    async def async_make_protocol_connection(self, parser: FrameParser) -> None:
+        '''
+        connect with a FrameProtocol instead of a StreamReader. read with async_read_frame().
+        '''
+        loop = asyncio.get_running_loop()
+        frame_queue: asyncio.Queue = asyncio.Queue()
+        self.transport, _ = await loop.create_connection(
+            lambda: FrameProtocol(parser, frame_queue, self.mark_rx), host=self.server, port=self.port
+        )
+        self.frame_queue = frame_queue
+        self.socket = self.transport.get_extra_info('socket')
+
+    async def async_read_frame(self) -> Any:
+        '''
+        return next frame from protocol connection. None means connection closed.
+        '''
+        assert self.frame_queue is not None
+        return await self.frame_queue.get()
+
     async def connect_async_socket(self) -> None:
         self.reader, self.writer = await asyncio.open_connection(self.server, int(self.port))
 
+    def is_connected(self) -> bool:
+        '''
+        health check of the stream connection. False if not connected yet, closed or EOF received.
+        '''
+        if not hasattr(self, 'writer') or self.writer.is_closing():
+            return False
+        return not self.reader.at_eof()
+
+    def set_keepalive(self, idle: int, interval: int = 10, count: int = 3) -> None:
+        '''
+        TCP keepalive on the stream connection, so a dead peer is found on an idle connection.
+        '''
+        sock = self.writer.get_extra_info('socket')
+        if sock is None:
+            return
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in (('TCP_KEEPIDLE', idle), ('TCP_KEEPINTVL', interval), ('TCP_KEEPCNT', count)):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
     async def close_async_socket(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+            return
         self.writer.close()
         await self.writer.wait_closed()
 
@@ -47,14 +270,63 @@ class TCPComm:
         if not self.is_passed_safty_interval():
             await asyncio.sleep(self.interval)
 
-    async def async_write_one_chunk(self, packet: bytes) -> bool:
+    def set_wire_speed(self, bps: int) -> None:
+        '''
+        speed of the serial line behind the socket (8N1), to know how long a write is on the wire.
+        '''
+        self.byte_time = 10 / bps if bps > 0 else 0.
+
+    def mark_rx(self) -> None:
+        now = time.monotonic()
+        if now < self.write_end_time:
+            # the other side talked while our frame was on the wire: most likely a collision.
+            self.rx_during_write += 1
+            self.write_end_time = 0.
+        self.last_rx_time = now
+
+    async def async_wait_bus_idle(self, gap: float, max_wait: float) -> bool:
+        '''
+        wait until nothing was received for gap seconds. False if max_wait passed first.
+        '''
+        start = time.monotonic()
+        now = start
+        while True:
+            silence = now - self.last_rx_time
+            if silence >= gap:
+                break
+            if now - start >= max_wait:
+                self.busy_writes += 1
+                return False
+            await asyncio.sleep(min(gap - silence, start + max_wait - now))
+            now = time.monotonic()
+        if now > start:
+            self.idle_waits += 1
+            self.idle_wait_time += now - start
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            'idle_waits': self.idle_waits,
+            'idle_wait_msec': round(self.idle_wait_time * 1000, 1),
+            'busy_writes': self.busy_writes,
+            'rx_during_write': self.rx_during_write,
+        }
 
-        await self.wait_safe_communication()
+    async def async_write_one_chunk(self, packet: bytes, wait_safe: bool = True) -> bool:
+        '''
+        wait_safe=False is for callers that pace writes by themselves (e.g. by ACK).
+        '''
+        if wait_safe:
+            await self.wait_safe_communication()
 
         try:
-            self.writer.write(packet)
-            await self.writer.drain()
+            if self.transport is not None:
+                self.transport.write(packet)
+            else:
+                self.writer.write(packet)
+                await self.writer.drain()
             self.last_accessed_time = time.monotonic()
+            self.write_end_time = self.last_accessed_time + len(packet) * self.byte_time
             return True
         except Exception as e:
             color_log = ColorLog()
@@ -74,21 +346,59 @@ class TCPComm:
                         buffer = b''
                         self.connection_reset = True
                     raise
-                self.read_buffer += buffer
-            ret = self.read_buffer[0:length]
-            self.read_buffer = self.read_buffer[length:]
+                if buffer == b'':
+                    return b''
+                self.mark_rx()
+                self.read_buffer.write(buffer)
+            ret = self.read_buffer.consume(length)
         except Exception as e:
             color_log = ColorLog()
             color_log.log(f"Exception in socket READ: {e}", Color.Red, ColorLog.Level.CRITICAL)
             ret = b''
         return ret
 
+    async def async_read_chunk(self) -> bytes:
+        '''
+        return whatever is buffered, or the next socket read.
+        return b'' means connection closed. if reset case, self.connection_reset is True
+        '''
+        if len(self.read_buffer) > 0:
+            return self.read_buffer.consume(len(self.read_buffer))
+        try:
+            buffer = await self.reader.read(self.buffer_size)
+            if buffer:
+                self.mark_rx()
+            return buffer
+        except IOError as e:
+            if e.errno == errno.ECONNRESET:
+                self.connection_reset = True
+            color_log = ColorLog()
+            color_log.log(f"Exception in socket READ: {e}", Color.Red, ColorLog.Level.CRITICAL)
+        return b''
+
+    async def async_read_exactly(self, length: int) -> bytes:
+        '''
+        return shorter than length (or b'') means connection closed. if reset case, self.connection_reset is True
+        '''
+        try:
+            buffer = await self.reader.readexactly(length)
+            self.mark_rx()
+            return buffer
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except IOError as e:
+            if e.errno == errno.ECONNRESET:
+                self.connection_reset = True
+        return b''
+
     async def async_get_data_direct(self, length: int) -> bytes:
         '''
         return b'' means connection closed. if reset case, self.connection_reset is True
         '''
         try:
             buffer = await self.reader.read(length)
+            if buffer:
+                self.mark_rx()
         except IOError as e:
             buffer = b''
             if e.errno == errno.ECONNRESET:
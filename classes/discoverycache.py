@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Callable
+
+
+class DiscoveryCache:
+    '''
+    HA discovery configs made and serialized once, with a digest of each, and the digest of
+    what the broker holds for every config topic.
+
+    configs are published retained. the config topics are subscribed, so the broker sends
+    its retained configs back after every (re)subscribe. sync() waits echo_wait seconds for
+    them and publishes only the configs the broker does not have or has in an other version.
+    '''
+    def __init__(self, echo_wait: float) -> None:
+        self.echo_wait                              = echo_wait
+        # topic -> (payload, digest)
+        self.documents: dict[str, tuple[str, str]]  = {}
+        # topic -> digest of the retained payload seen on (or published to) the broker
+        self.broker: dict[str, str]                 = {}
+        self.sync_after: float | None               = None
+        self.builds                                 = 0
+        self.echoes                                 = 0
+        self.published                              = 0
+        self.skipped                                = 0
+        self.last_sync_msec                         = 0.
+
+    @staticmethod
+    def digest(payload: str) -> str:
+        return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+    def set_documents(self, publish_list: list[dict]) -> None:
+        self.builds += 1
+        self.documents = {
+            topic: (payload, self.digest(payload)) for item in publish_list for topic, payload in item.items()
+        }
+
+    def observe(self, topic: str, payload: str) -> bool:
+        '''
+        a message on a config topic (retained echo or our own publish). returns False if topic
+        is not one of ours.
+        '''
+        if topic not in self.documents:
+            return False
+        self.echoes += 1
+        self.broker[topic] = self.digest(payload)
+        return True
+
+    def mark_published(self, topic: str, payload: str) -> None:
+        self.broker[topic] = self.digest(payload)
+
+    def expect_echo(self, now: float) -> None:
+        '''
+        config topics are about to be subscribed (new MQTT session). only the retained configs
+        sent back tell what the broker holds now, so sync once they had time to arrive.
+        '''
+        self.broker.clear()
+        self.sync_after = now + self.echo_wait
+
+    def request_sync(self, now: float) -> None:
+        if self.sync_after is None or self.sync_after > now:
+            self.sync_after = now
+
+    def sync(self, publish: Callable[[str, str], None], now: float) -> int:
+        '''
+        publish the configs the broker lacks. returns the number published.
+        '''
+        if self.sync_after is None or now < self.sync_after:
+            return 0
+        self.sync_after = None
+        start = time.perf_counter()
+        count = 0
+        for topic, (payload, digest) in self.documents.items():
+            if self.broker.get(topic) == digest:
+                self.skipped += 1
+                continue
+            publish(topic, payload)
+            self.broker[topic] = digest
+            count += 1
+        self.published += count
+        self.last_sync_msec = (time.perf_counter() - start) * 1000
+        return count
+
+    def get_stats(self) -> dict:
+        return {
+            'documents': len(self.documents),
+            'builds': self.builds,
+            'echoes': self.echoes,
+            'published': self.published,
+            'skipped': self.skipped,
+            'last_sync_msec': round(self.last_sync_msec, 3),
+        }
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from classes.basicdevice import Device
-from classes.utils import Color, ColorLog
+from classes.utils import Color, ColorLog, LazyHex
 from consts import (DEVICE_ELEVATOR, PAYLOAD_OFF, PAYLOAD_ON, Command,
                     DeviceType, State)
 
@@ -15,19 +15,12 @@ class Elevator(Device):
         self.scan.reset()
 
     def make_rs485_packet(self, cmd: Command) -> bytes:
-        new_packet = Device.PacketStruct()
-        color_log = ColorLog()
-
         if cmd != Command.CHECK:
-            make_ok = self.make_device_basic_info(new_packet, DeviceType.WALLPAD, self.device, Command.ON)
+            packet = self.make_frame(DeviceType.WALLPAD, self.device, Command.ON)
         else:
-            make_ok = self.make_device_basic_info(new_packet, self.device, DeviceType.WALLPAD, Command.CHECK)
-        if not make_ok:
-            color_log.log(f"Error in make {self.device} packet!", Color.Red, ColorLog.Level.WARN)
-
-        packet = new_packet.get_full_bytes_packet()
+            packet = self.make_frame(self.device, DeviceType.WALLPAD, Command.CHECK)
         color_log = ColorLog()
-        color_log.log(f"[Packet made - Elevator] = {packet.hex()}", Color.Yellow, ColorLog.Level.DEBUG)
+        color_log.log("[Packet made - Elevator] = %s", Color.Yellow, ColorLog.Level.DEBUG, LazyHex(packet))
         return packet
 
     def handle_mqtt(self, payload: str) -> bool:
@@ -41,6 +34,8 @@ class Elevator(Device):
             return False
 
     class ElevatorInput:
+        __slots__ = ('status', 'room_str')
+
         def __init__(self) -> None:
             self.status = PAYLOAD_OFF
             self.room_str: str = ''
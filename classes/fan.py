@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import config as cfg
 from classes.basicdevice import Device
-from classes.utils import Color, ColorLog
+from classes.utils import Color, ColorLog, LazyHex
 from consts import (DEVICE_FAN, MQTT_FAN_MODE, MQTT_FAN_SPEED, PAYLOAD_HIGH,
                     PAYLOAD_LOW, PAYLOAD_MEDIUM, PAYLOAD_OFF, PAYLOAD_ON,
                     Command, DeviceType, FanSpeed, State)
@@ -35,12 +35,9 @@ class Fan(Device):
         self.scan.reset()
 
     def make_rs485_packet(self, cmd: Command) -> bytes:
-        new_packet = Device.PacketStruct()
         color_log = ColorLog()
 
-        if not self.make_device_basic_info(new_packet, self.device, DeviceType.WALLPAD, cmd):
-            color_log.log(f"Error in make {self.device} packet!", Color.Red, ColorLog.Level.WARN)
-
+        value = 0
         if cmd != Command.CHECK:
             try:
                 color_log.log(f"mode={self.mode}, fan_mode={self.fan_mode}", Color.Yellow, ColorLog.Level.DEBUG)
@@ -54,18 +51,18 @@ class Fan(Device):
                     fan_mode = FanSpeed.OFF
 
                 if self.mode == PAYLOAD_ON:
-                    new_packet.value_array = 0x1100000000000000
+                    value = 0x1100000000000000
                 elif self.mode == PAYLOAD_OFF:
-                    new_packet.value_array = 0x0001000000000000
+                    value = 0x0001000000000000
 
                 fanspeed_nibble = (0xf0 & self.get_kocom_fan_speed_data(fan_mode)) << (5 * 8)
-                new_packet.value_array |= fanspeed_nibble
+                value |= fanspeed_nibble
             except Exception as e:
                 color_log.log(f"[Make Packet] Error({e}) on Fan make_rs485_packet", Color.Red, ColorLog.Level.DEBUG)
 
-        packet = new_packet.get_full_bytes_packet()
+        packet = self.make_frame(self.device, DeviceType.WALLPAD, cmd, value)
 
-        color_log.log(f"[Packet made - Fan] = {packet.hex()}", Color.Yellow, ColorLog.Level.DEBUG)
+        color_log.log("[Packet made - Fan] = %s", Color.Yellow, ColorLog.Level.DEBUG, LazyHex(packet))
         return packet
 
     def handle_mqtt(self, payload: str, cmd_str: str) -> None:
@@ -77,6 +74,8 @@ class Fan(Device):
             self.mode = State.ON
 
     class FanInput:
+        __slots__ = ('mode', 'fan_mode', 'room_str')
+
         def __init__(self) -> None:
             self.mode: State | None         = None
             self.fan_mode: FanSpeed | None  = None
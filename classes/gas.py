@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from classes.basicdevice import Device
-from classes.utils import Color, ColorLog
+from classes.utils import Color, ColorLog, LazyHex
 from consts import (DEVICE_GAS, PAYLOAD_OFF, PAYLOAD_ON, Command, DeviceType,
                     State)
 
@@ -15,17 +15,11 @@ class Gas(Device):
         self.scan.reset()
 
     def make_rs485_packet(self, cmd: Command) -> bytes:
-        new_packet = Device.PacketStruct()
-        color_log = ColorLog()
-
         modified_cmd = Command.OFF if cmd != Command.CHECK else cmd
-        if not self.make_device_basic_info(new_packet, self.device, DeviceType.WALLPAD, modified_cmd):
-            color_log.log(f"Error in make {self.device} packet!", Color.Red, ColorLog.Level.WARN)
-
-        packet = new_packet.get_full_bytes_packet()
+        packet = self.make_frame(self.device, DeviceType.WALLPAD, modified_cmd)
 
         color_log = ColorLog()
-        color_log.log(f"[Packet made - Gas] = {packet.hex()}", Color.Yellow, ColorLog.Level.DEBUG)
+        color_log.log("[Packet made - Gas] = %s", Color.Yellow, ColorLog.Level.DEBUG, LazyHex(packet))
         return packet
 
     def handle_mqtt(self, payload: str) -> bool:
@@ -39,6 +33,8 @@ class Gas(Device):
         return True
 
     class GasInput:
+        __slots__ = ('command', 'room_str')
+
         def __init__(self) -> None:
             self.command: str | None    = None
             self.room_str: str          = ''
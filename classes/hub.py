@@ -1,38 +1,105 @@
 from __future__ import annotations
 
 import asyncio
+import concurrent.futures
 import time
+from typing import Callable
 
 import config as cfg
 from classes.kocom import KocomHandler
 from classes.lgac485 import LGACPacketHandler
 from classes.mqtt import MqttHandler
+from classes.statestore import StateStore
 from classes.utils import Color, ColorLog
 from classes.wallpad import WallPad
 
 
 class Hub:
-    def __init__(self, kocom_handler, aircon_handler, mqtt_handler, wallpad) -> None:
+    def __init__(self, kocom_handler, aircon_handler, mqtt_handler, wallpad, state_store,
+                 started: float | None = None) -> None:
         self.kocom_handler: KocomHandler        = kocom_handler
         self.mqtt_handler: MqttHandler          = mqtt_handler
         self.aircon_handler: LGACPacketHandler  = aircon_handler
         self.wallpad: WallPad                   = wallpad
+        self.state_store: StateStore            = state_store
         self.devices: list                      = []
+        # startup to ready (EW11 links up and MQTT online) and warm reconnects. time.monotonic().
+        self.started                            = started if started is not None else time.monotonic()
+        self.ready_msec: float | None           = None
+        self.relinking                          = False
+        self.relinks                            = 0
+        self.last_relink_msec                   = 0.
 
     def add_devices(self, enabled: list):
         self.devices.extend(enabled)
 
+    async def async_reconnect_links(self, cold_reconnect: Callable[[], None]) -> None:
+        '''
+        warm reconnect: only the EW11 connections are made again. device states, MQTT session
+        and discovery are kept. cold_reconnect() (everything made again) if a link fails.
+        '''
+        if self.relinking:
+            return
+        color_log = ColorLog()
+        self.relinking = True
+        start = time.monotonic()
+        try:
+            await asyncio.gather(self.kocom_handler.async_relink(), self.aircon_handler.async_relink())
+        except Exception as e:
+            color_log.log(f"Warm reconnect of EW11 failed({e}). so, Restarting all.", Color.Red, ColorLog.Level.WARN)
+            cold_reconnect()
+            return
+        finally:
+            self.relinking = False
+        # wallpad frames were missed while the link was down.
+        self.wallpad.scan_scheduler.expire(time.monotonic())
+        self.relinks += 1
+        self.last_relink_msec = (time.monotonic() - start) * 1000
+        color_log.log(f"EW11 links made again in {self.last_relink_msec:.1f} msec.", Color.Yellow)
+
+    def reconnect_links_threadsafe(
+        self, loop: asyncio.AbstractEventLoop, cold_reconnect: Callable[[], None]
+    ) -> concurrent.futures.Future:
+        '''
+        async_reconnect_links() in loop, from any thread. an error it did not handle itself is
+        logged and also ends in cold_reconnect().
+        '''
+        future = asyncio.run_coroutine_threadsafe(self.async_reconnect_links(cold_reconnect), loop)
+
+        def check_result(done: concurrent.futures.Future) -> None:
+            # cancelled: the cold reconnect (or the end of the program) cancelled every task.
+            if done.cancelled() or done.exception() is None:
+                return
+            color_log = ColorLog()
+            color_log.log(
+                f"Warm reconnect of EW11 failed({done.exception()!r}). so, Restarting all.",
+                Color.Red, ColorLog.Level.WARN
+            )
+            loop.call_soon_threadsafe(cold_reconnect)
+
+        future.add_done_callback(check_result)
+        return future
+
+    def get_stats(self) -> dict:
+        return {
+            'ready_msec': round(self.ready_msec, 1) if self.ready_msec is not None else None,
+            'relinks': self.relinks,
+            'last_relink_msec': round(self.last_relink_msec, 1),
+        }
+
     async def async_scan_thread(self) -> None:
         color_log = ColorLog()
         while True:
             if self.mqtt_handler.start_discovery:
                 self.mqtt_handler.homeassistant_device_discovery(initial=True)
+            self.mqtt_handler.sync_discovery(time.monotonic())
+            if self.ready_msec is None and self.mqtt_handler.online:
+                self.ready_msec = (time.monotonic() - self.started) * 1000
+                color_log.log(f"Ready in {self.ready_msec:.1f} msec.", Color.Yellow)
+
+            self.state_store.refresh_if_due(time.monotonic())
 
             if self.kocom_handler.comm.is_passed_safty_interval():
-                try:
-                    self.aircon_handler.loop = asyncio.get_running_loop()
-                except Exception as e:
-                    color_log.log(f"scan loop is not set. err:{e}", Color.Yellow, ColorLog.Level.WARN)
                 try:
                     now = time.monotonic()
                     self.wallpad.scan_wallpad_devices(now)
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import asyncio
+import re
 import sys
-from typing import Union
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Callable, NamedTuple, Union
 
 import config as cfg
 from classes.appconf import MainConfig
@@ -14,245 +17,486 @@ from classes.gas import Gas
 from classes.light import Light
 from classes.plug import Plug
 from classes.thermostat import Thermostat
-from classes.utils import Color, ColorLog
+from classes.utils import Color, ColorLog, LazyHex
 from classes.wallpad import WallPad
 from config import PACKET_RESEND_INTERVAL_SEC
-from consts import (DEVICE_FAN, DEVICE_SENSOR, DEVICE_WALLPAD, Command,
-                    CommStatus, DeviceType, HeaderMark, HeaderType, PacketType)
-
-
-class KocomPacket:
-    class ParsedInfo:
-        def __init__(self, struct: Device.PacketStruct) -> None:
-            self.reset_info()
-            self.struct: Device.PacketStruct = struct
-
-        def reset_info(self) -> None:
-            self.device_id: DeviceType | None           = None
-            self.room_str: str                          = ''
-            self.type: PacketType                       = PacketType.ACK
-            self.sequence: int                          = 0
-            self.command: Command | None                = None
-            self.source_device: DeviceType | None       = None
-            self.source_room_no: int                    = 0
-            self.destination_device: DeviceType | None  = None
-            self.destination_room_no: int               = 0
-            self.parsed_dict: dict                      = {}
-            self.is_swapped                             = False
-
-        def check_type_and_sequence(self):
-            color_log = ColorLog()
-            if (self.struct.type_and_sequence & 0xff00) == 0x3000:
-                type_mask = self.struct.type_and_sequence & 0x00f0
-                if type_mask == 0xb0:
-                    self.type = PacketType.SEND
-                elif type_mask == 0xd0:
-                    self.type = PacketType.ACK
-                else:
-                    color_log.log(f"Unknown Packet Type! [0x{type_mask:02x}]", Color.Red, ColorLog.Level.WARN)
-                    return False
-                self.sequence = (self.struct.type_and_sequence & 0x000f) - 0x0c
-                return True
-            else:
-                if ((self.struct.type_and_sequence & 0xff00) >> 8) in [x.b2 for x in KocomHandler.HEADER_LIST]:
-                    if cfg.ALTERNATIVE_HEADER_DEBUG:
-                        color_log.log(
-                            f"[{self.struct.type_and_sequence:04x}] temporary passed!",
-                            Color.Yellow,
-                            ColorLog.Level.WARN
-                        )
-                    self.type = PacketType.ACK
-                    self.sequence = 0
-                    return True
-                color_log.log(
-                    f"Must not be HERE. Unknown Packet ***** [{self.struct.type_and_sequence:04x}]",
-                    Color.Yellow,
-                    ColorLog.Level.WARN
-                )
-                return False
-
-        def parse_basic_info(self):
-            self.command = Device.parse_kocom_command(self.struct.command)
-            self.source_device = Device.parse_kocom_device(self.struct.src_device_id)
-            self.source_room_no = self.struct.src_room_no
-            self.destination_device = Device.parse_kocom_device(self.struct.dest_device_id)
-            self.destination_room_no = self.struct.dest_room_no
-
-        def is_ack_when_check(self) -> bool:
-            if self.command == Command.CHECK and self.type == PacketType.ACK:
-                return True
-            return False
+from consts import (DEVICE_FAN, DEVICE_SENSOR, DEVICE_WALLPAD, PAYLOAD_OFF,
+                    PAYLOAD_ON, Command, CommStatus, DeviceType, HeaderMark,
+                    HeaderType, PacketType, SendResult)
 
-        def is_sending_to_elevator(self) -> bool:
-            if self.type == PacketType.SEND and self.destination_device == DeviceType.ELEVATOR:
-                return True
-            return False
 
-        def is_ack_to_wallpad(self) -> bool:
-            if self.type == PacketType.ACK and self.destination_device == DeviceType.WALLPAD:
-                return True
-            return False
+@lru_cache(maxsize=None)
+def make_header_pair_table(header_list: tuple[HeaderMark, ...]) -> list[HeaderMark | None]:
+    table: list[HeaderMark | None] = [None] * 0x10000
+    for hdr in header_list:
+        table[(hdr.b1 << 8) | hdr.b2] = hdr
+    return table
 
-        def is_ack_from_wallpad(self) -> bool:
-            if self.type == PacketType.ACK and self.source_device == DeviceType.WALLPAD:
-                return True
-            return False
 
-        def is_fake_device_for_fan(self) -> bool:
-            if self.source_device == self.destination_device:
-                return True
-            return False
+def make_byte_table(values) -> tuple[bool, ...]:
+    members = set(values)
+    return tuple(x in members for x in range(0x100))
 
-        def swap_if_need_condition(self) -> None:
-            if self.is_ack_from_wallpad():
-                self.source_device, self.destination_device = self.destination_device, self.source_device
-                self.source_room_no, self.destination_room_no = self.destination_room_no, self.source_room_no
-                color_log = ColorLog()
-                color_log.log(
-                    f"Parse after swap src/dest"
-                    f"(type={self.type}, cmd={self.command}, src={self.source_device}, dest={self.destination_device})",
-                    Color.Magenta,
-                    ColorLog.Level.DEBUG
-                )
-                self.is_swapped = True
-
-        def parse_devices(self, input_8bytes: bytes) -> None:
-            self.parsed_dict = {}
-            dev: Union[Fan, Gas, Light, Plug, Elevator, Thermostat]
-            if self.source_device == DeviceType.FAN:
-                dev = Fan()
-            elif self.source_device == DeviceType.LIGHT:
-                dev = Light()
-            elif self.source_device == DeviceType.PLUG:
-                dev = Plug()
-            elif self.source_device == DeviceType.THERMOSTAT:
-                dev = Thermostat()
-            elif self.source_device == DeviceType.GAS:
-                dev = Gas()
-            elif self.source_device == DeviceType.WALLPAD and self.destination_device == DeviceType.ELEVATOR:
-                dev = Elevator()
-            else:
-                color_log = ColorLog()
-                color_log.log(
-                    f"MUST NOT BE HERE!! or just Elevator "
-                    f"({input_8bytes.hex()}, {self.source_device}, {self.destination_device}, {self.type})",
-                    Color.Red,
-                    ColorLog.Level.DEBUG
-                )
-                return
 
-            if self.source_device != self.destination_device:
-                self.parsed_dict = dev.parse(input_8bytes, self.source_room_no)
-            else:
-                if type(dev) == Fan:
-                    self.parsed_dict = dev.parse_sensor(input_8bytes, self.source_room_no)
-            color_log = ColorLog()
-            color_log.log(f"parsed Result = ({self.parsed_dict})", Color.Blue, ColorLog.Level.DEBUG)
+class BodyRepairRule(NamedTuple):
+    check_prefix: bytes
+    result_prefix: bytes
+    check_sum: int
 
-        def make_parsed_info(self) -> None:
-            self.room_str = ''
-            color_log = ColorLog()
-            try:
-                color_log.log(f"make_parsed_info: input = {self.parsed_dict}", Color.Yellow, ColorLog.Level.DEBUG)
-                color_log.log(
-                    f"=>: t={self.type}, c={self.command}, s={self.source_device}, d={self.destination_device}",
-                    Color.Yellow,
-                    ColorLog.Level.DEBUG
-                )
-                self.device_id = self.source_device
-                if self.is_sending_to_elevator():
-                    self.device_id = self.destination_device
-                    self.room_str = DEVICE_WALLPAD
-                elif self.is_ack_to_wallpad() and self.is_swapped:
-                    if self.source_device in [DeviceType.FAN, DeviceType.GAS, DeviceType.ELEVATOR]:
-                        self.room_str = DEVICE_WALLPAD
-                    elif self.source_device in [DeviceType.LIGHT, DeviceType.PLUG]:
-                        self.room_str = Device.parse_kocom_room(f'{self.source_room_no:02d}')
-                    elif self.source_device == DeviceType.THERMOSTAT:
-                        self.room_str = Device.parse_kocom_room_thermo(f'{self.source_room_no:02d}')
-                    else:
-                        room = Device.parse_kocom_room(f'{self.source_room_no:02d}')
-                        roomdest = Device.parse_kocom_room(f'{self.destination_room_no:02d}')
-                        color_log.log(f"src room [{room}], dest rooom [{roomdest}]", Color.Yellow, ColorLog.Level.DEBUG)
+    @classmethod
+    def make(cls, check_prefix: bytes, result_prefix: bytes) -> BodyRepairRule:
+        return cls(check_prefix, result_prefix, sum(check_prefix))
 
-                if self.room_str == '':
-                    color_log.log(
-                        f"No Data to Send!! "
-                        f"t={self.type}, c={self.command}, s={self.source_device}, did={self.device_id}, "
-                        f"d={self.destination_device}, room=[{self.destination_room_no}]",
-                        Color.Yellow,
-                        ColorLog.Level.DEBUG
-                    )
-                    return
 
-                # current call 3
-                # when Send : dest elevator, wallpad, val:
-                # when ACK : src fan or gas, wallpad, val :
-                # when ACK : src themo or light or plug, room, val
-                color_log.log(
-                    f"[From Kocom]{self.device_id}/{self.room_str}/state = {self.parsed_dict}",
-                    Color.White,
-                    ColorLog.Level.DEBUG
-                )
-            except Exception as e:
-                color_log.log(f"Error in make_parsed_info [{e}]", Color.Red, ColorLog.Level.DEBUG)
+def get_room_maps() -> tuple:
+    '''
+    the config values that decoding depends on. a map is replaced, not changed, when it is loaded from env.
+    '''
+    return (cfg.KOCOM_ROOM, cfg.KOCOM_ROOM_THERMOSTAT, cfg.KOCOM_LIGHT_SIZE, cfg.KOCOM_PLUG_SIZE, cfg.INIT_TEMP)
 
-    def __init__(self, rawdata: bytes = b'') -> None:
-        self.struct = Device.PacketStruct()
-        self.parsed = KocomPacket.ParsedInfo(self.struct)
-        if rawdata != b'':
-            self.struct.match_data(rawdata)
 
-    def parse_data_from_packet(self) -> tuple[bool, str, str, dict]:
-        color_log = ColorLog()
+def is_room_maps_changed(saved: tuple) -> bool:
+    rooms, rooms_thermostat, light_size, plug_size, init_temp = saved
+    return (
+        rooms is not cfg.KOCOM_ROOM
+        or rooms_thermostat is not cfg.KOCOM_ROOM_THERMOSTAT
+        or light_size is not cfg.KOCOM_LIGHT_SIZE
+        or plug_size is not cfg.KOCOM_PLUG_SIZE
+        or init_temp != cfg.INIT_TEMP
+    )
 
-        # 0. Reset Previous parsed info.
-        self.parsed.reset_info()
-        try:
-            # 1. Check Type
-            if self.parsed.check_type_and_sequence():
-                # 2. parse command, src/dst device and room no.
-                self.parsed.parse_basic_info()
-
-                # 3. ignore no need state
-                if self.parsed.is_ack_when_check():
-                    color_log.log("Just Ack from CHECK! - OK", Color.White, ColorLog.Level.DEBUG)
-                else:
-                    color_log.log(f"parse: input(v={self.struct.value_array:016x})", Color.White, ColorLog.Level.DEBUG)
-                    color_log.log(
-                        f"Parse: making data start.(type={self.parsed.type}, cmd={self.parsed.command}, "
-                        f"src={self.parsed.source_device}, dest={self.parsed.destination_device})",
-                        Color.White,
-                        ColorLog.Level.DEBUG
-                    )
 
-                    # 3. src <-> dst some case.
-                    self.parsed.swap_if_need_condition()
-                    # 4. parse each devices
-                    value_list = self.struct.value_array.to_bytes(8, 'big')
-                    self.parsed.parse_devices(value_list)
-                    # 5. get device, room, command string
-                    self.parsed.make_parsed_info()
-                    if isinstance(self.parsed.device_id, DeviceType):
-                        if self.parsed.is_fake_device_for_fan():
-                            device_str = DEVICE_SENSOR
-                        else:
-                            device_str = Device.match_kocom_device(self.parsed.device_id)
-                        room_str = self.parsed.room_str
-                        value = self.parsed.parsed_dict
-                    else:
-                        device_str = ''
-                        room_str = ''
-                        value = {}
-                    return (True, device_str, room_str, value)
-        except Exception as e:
-            color_log.log(f"Packet parsing error [{e}] >>>>>>>>>>>", Color.Red, ColorLog.Level.DEBUG)
+class KocomDecodeCache:
+    '''
+    bounded LRU of validated body bytes -> decoder.decode() result.
+
+    the wallpad repeats the same status bodies all day, so most frames are hits.
+    entries are of one build of the decoder's tables. when the decoder builds them again
+    (config replaced a room map), the cache is dropped. the value dict is copied in and out,
+    so callers may keep or change what they get.
+    '''
+    def __init__(self, max_size: int, decoder: KocomDecoder) -> None:
+        self.max_size                                           = max_size
+        self.decoder                                            = decoder
+        self.generation                                         = decoder.generation
+        self.entries: OrderedDict[bytes, tuple[bool, str, str, dict]] = OrderedDict()
+        self.hits                                               = 0
+        self.misses                                             = 0
+        self.evictions                                          = 0
+        self.invalidations                                      = 0
+
+    def invalidate(self, generation: int) -> None:
+        self.entries.clear()
+        self.invalidations += 1
+        self.generation = generation
+
+    def get(self, body: bytes) -> tuple[bool, str, str, dict] | None:
+        generation = self.decoder.refresh()
+        if generation != self.generation:
+            self.invalidate(generation)
+        result = self.entries.get(body)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(body)
+        self.hits += 1
+        noti_to_HA, device_str, room_str, value = result
+        return (noti_to_HA, device_str, room_str, dict(value))
+
+    def put(self, body: bytes, result: tuple[bool, str, str, dict]) -> None:
+        if self.max_size <= 0:
+            return
+        noti_to_HA, device_str, room_str, value = result
+        self.entries[body] = (noti_to_HA, device_str, room_str, dict(value))
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self) -> dict:
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+class KocomRoute(NamedTuple):
+    parse: Callable[[bytes, int], dict] | None     # None: value is {}
+    swapped: bool                                   # room number is the destination room
+    device_str: str                                 # '' : (True, '', '', {}) whatever the value is
+    room: int                                       # one of KocomDecoder.ROOM_*
+
+
+# one decoder per device type for all frames of KocomDecoder. parse() does not change them.
+KOCOM_DEVICE_DECODERS: dict[DeviceType, Union[Fan, Gas, Light, Plug, Elevator, Thermostat]] = {
+    DeviceType.FAN: Fan(),
+    DeviceType.LIGHT: Light(),
+    DeviceType.PLUG: Plug(),
+    DeviceType.THERMOSTAT: Thermostat(),
+    DeviceType.GAS: Gas(),
+    DeviceType.ELEVATOR: Elevator(),
+}
+
+
+class KocomDecoder:
+    '''
+    table driven decoder of validated bodies. same result as the step by step KocomPacket it replaced,
+    which tests/helpers.py keeps as reference.
+
+    what a frame means depends only on its type and its source and destination devices. every
+    (type, src device id, dst device id) is resolved once into a KocomRoute. rooms are looked up
+    by room number in arrays made from the room maps, which are made again when config replaces a map.
+    '''
+    ROOM_NONE       = 0
+    ROOM_WALLPAD    = 1
+    ROOM_NORMAL     = 2
+    ROOM_THERMOSTAT = 3
+    CHECK_COMMAND   = Device.KOCOM_COMMAND_REV[Command.CHECK]
+    NOT_DECODED: tuple[bool, str, str, dict] = (False, '', '', {})
+
+    def __init__(self) -> None:
+        self.routes: dict[tuple[PacketType, int, int], KocomRoute] = {}
+        self.generation = 0
+        self.build()
+
+    def build(self) -> None:
+        self.generation += 1
+        self.room_maps = get_room_maps()
+        self.rooms = tuple(cfg.KOCOM_ROOM.get(f'{no:02d}', '') for no in range(0x100))
+        self.rooms_thermostat = tuple(cfg.KOCOM_ROOM_THERMOSTAT.get(f'{no:02d}', '') for no in range(0x100))
+        self.light_size = tuple(cfg.KOCOM_LIGHT_SIZE.get(room, 0) for room in self.rooms)
+        self.plug_size = tuple(cfg.KOCOM_PLUG_SIZE.get(room, 0) for room in self.rooms)
+        self.routes.clear()
+        for packet_type in PacketType:
+            for src_id in Device.KOCOM_DEVICE:
+                for dst_id in Device.KOCOM_DEVICE:
+                    self.routes[(packet_type, src_id, dst_id)] = self.make_route(packet_type, src_id, dst_id)
+
+    def make_route(self, packet_type: PacketType, src_id: int, dst_id: int) -> KocomRoute:
+        src = Device.parse_kocom_device(src_id)
+        dst = Device.parse_kocom_device(dst_id)
+        swapped = packet_type == PacketType.ACK and src == DeviceType.WALLPAD
+        if swapped:
+            src, dst = dst, src
+
+        parse: Callable[[bytes, int], dict] | None = None
+        decoders = KOCOM_DEVICE_DECODERS
+        if src == DeviceType.WALLPAD and dst == DeviceType.ELEVATOR:
+            parse = decoders[DeviceType.ELEVATOR].parse
+        elif src == DeviceType.LIGHT and src != dst:
+            parse = self.parse_light
+        elif src == DeviceType.PLUG and src != dst:
+            parse = self.parse_plug
+        elif src in decoders and src != DeviceType.ELEVATOR:
+            if src != dst:
+                parse = decoders[src].parse
+            elif src == DeviceType.FAN:
+                fan = decoders[DeviceType.FAN]
+                assert isinstance(fan, Fan)
+                parse = fan.parse_sensor
+
+        device_id = src
+        room = KocomDecoder.ROOM_NONE
+        if packet_type == PacketType.SEND and dst == DeviceType.ELEVATOR:
+            device_id = dst
+            room = KocomDecoder.ROOM_WALLPAD
+        elif swapped:
+            if src in (DeviceType.FAN, DeviceType.GAS, DeviceType.ELEVATOR):
+                room = KocomDecoder.ROOM_WALLPAD
+            elif src in (DeviceType.LIGHT, DeviceType.PLUG):
+                room = KocomDecoder.ROOM_NORMAL
+            elif src == DeviceType.THERMOSTAT:
+                room = KocomDecoder.ROOM_THERMOSTAT
+
+        if device_id is None:
+            device_str = ''
+        elif src == dst:
+            device_str = DEVICE_SENSOR
+        else:
+            device_str = Device.match_kocom_device(device_id)
+        return KocomRoute(parse, swapped, device_str, room)
+
+    def parse_light(self, value: bytes, room_no: int) -> dict:
+        return parse_switches(value, self.light_size[room_no], Light.SWITCH_NAMES)
+
+    def parse_plug(self, value: bytes, room_no: int) -> dict:
+        return parse_switches(value, self.plug_size[room_no], Plug.SWITCH_NAMES)
+
+    def get_packet_type(self, body: bytes) -> PacketType | None:
+        if body[0] == 0x30:
+            type_mask = body[1] & 0xf0
+            if type_mask == 0xb0:
+                return PacketType.SEND
+            if type_mask == 0xd0:
+                return PacketType.ACK
+            color_log = ColorLog()
+            color_log.log(f"Unknown Packet Type! [0x{type_mask:02x}]", Color.Red, ColorLog.Level.WARN)
+            return None
+        if KocomHandler.HEADER_B2_TABLE[body[0]]:
+            return PacketType.ACK
+        color_log = ColorLog()
+        color_log.log(
+            "Must not be HERE. Unknown Packet ***** [%s]", Color.Yellow, ColorLog.Level.WARN, LazyHex(body[0:2])
+        )
+        return None
+
+    def refresh(self) -> int:
+        '''
+        build the tables again if config replaced a map they were made from. returns the generation of the build.
+        '''
+        if is_room_maps_changed(self.room_maps):
+            self.build()
+        return self.generation
+
+    def decode(self, body: bytes) -> tuple[bool, str, str, dict]:
+        '''
+        body is a validated frame without its header: type(2), dummy, dst, dst room, src, src room,
+        command, value(8), checksum.
+        '''
+        self.refresh()
+        if len(body) != Device.PacketStruct.ONE_PACKET.size:
+            return KocomDecoder.NOT_DECODED
+        packet_type = self.get_packet_type(body)
+        if packet_type is None:
+            return KocomDecoder.NOT_DECODED
+        if packet_type == PacketType.ACK and body[7] == KocomDecoder.CHECK_COMMAND:
+            return KocomDecoder.NOT_DECODED
+
+        key = (packet_type, body[5], body[3])
+        route = self.routes.get(key)
+        if route is None:
+            route = self.routes[key] = self.make_route(*key)
+        room_no = body[4] if route.swapped else body[6]
+        value: dict = {}
+        if route.parse is not None:
+            try:
+                value = route.parse(body[8:16], room_no)
+            except Exception as e:
+                color_log = ColorLog()
+                color_log.log(f"Packet parsing error [{e}] >>>>>>>>>>>", Color.Red, ColorLog.Level.DEBUG)
+                return KocomDecoder.NOT_DECODED
+        if route.device_str == '':
+            return (True, '', '', {})
+        if route.room == KocomDecoder.ROOM_WALLPAD:
+            room_str = DEVICE_WALLPAD
+        elif route.room == KocomDecoder.ROOM_NORMAL:
+            room_str = self.rooms[room_no]
+        elif route.room == KocomDecoder.ROOM_THERMOSTAT:
+            room_str = self.rooms_thermostat[room_no]
+        else:
+            room_str = ''
+        return (True, route.device_str, room_str, value)
+
+
+def parse_switches(value: bytes, count: int, names: tuple[str, ...]) -> dict:
+    '''
+    {names[1]: on/off, ..., names[count]: on/off, names[0]: on if any is on}, like SwitchInput.make_dict_data().
+    '''
+    switches = {}
+    any_on = False
+    for i in range(count):
+        if value[i] != 0x00:
+            switches[names[i + 1]] = PAYLOAD_ON
+            any_on = True
+        else:
+            switches[names[i + 1]] = PAYLOAD_OFF
+    switches[names[0]] = PAYLOAD_ON if any_on else PAYLOAD_OFF
+    return switches
+
+
+WALLPAD_DEVICE_ID   = Device.KOCOM_DEVICE_REV[DeviceType.WALLPAD]
+# retries there are sequence numbers for in the type byte, after 0xbc.
+MAX_SEQUENCE_RETRY  = 3
+
+
+def make_ack_key(packet: bytes) -> tuple[int, int, int, int]:
+    '''
+    (src device, src room, dest device, dest room) of the ACK for a full packet made by
+    make_rs485_packet(). the ACK comes from the destination of the packet, back to its source.
+    '''
+    return (packet[5], packet[6], packet[7], packet[8])
+
+
+def get_ack_key(body: bytes) -> tuple[int, int, int, int] | None:
+    '''
+    same key of a received body (header stripped). None if body is not an ACK.
+    '''
+    if body[0] != 0x30 or (body[1] & 0xf0) != 0xd0:
+        return None
+    return (body[5], body[6], body[3], body[4])
+
+
+def is_ack_expected(packet: bytes) -> bool:
+    '''
+    False for a frame to the wallpad, like the elevator call made as if the elevator sent it.
+    nobody ACKs those.
+    '''
+    return packet[5] != WALLPAD_DEVICE_ID
+
+
+def make_retry_packet(packet: bytes, retry: int) -> bytes:
+    '''
+    the wallpad sends a command again with the next sequence number. 30bc -> 30bd -> 30be -> 30bf.
+    retry is at most MAX_SEQUENCE_RETRY.
+    '''
+    if retry == 0:
+        return packet
+    resend = bytearray(packet)
+    resend[3] += retry
+    resend[18] = (resend[18] + retry) & 0xff
+    return bytes(resend)
+
+
+class ScannedFrame(NamedTuple):
+    status: CommStatus
+    header_name: str
+    head: bytes
+    body: bytes
+    tail: bytes
+
+
+class KocomFrameScanner:
+    '''
+    chunk level version of the old byte by byte header/body/tail state machine.
+
+    bytes are fed as they come from the socket. every read attempt that the
+    state machine would have finished (footer seen or KOCOM_PACKET_LENGTH bytes
+    taken) is appended to self.frames, so a caller gets exactly the frames the
+    per byte reader returned, only without one await per byte.
+    '''
+    FOOTER = b'\x0d\x0d'
+
+    def __init__(self, header_list: tuple[HeaderMark, ...], packet_length: int) -> None:
+        self.packet_length                          = packet_length
+        self.header_pairs                           = make_header_pair_table(header_list)
+        self.header_start                           = re.compile(
+            b'[' + b''.join(re.escape(bytes([x.b1])) for x in header_list) + b']'
+        )
+        self.frames: deque[ScannedFrame]            = deque()
+        self.reset()
 
-        return (False, '', '', {})
+    def reset(self) -> None:
+        self.commstat       = CommStatus.WAIT_HEAD
+        self.packet_len     = 0
+        self.body_len       = 0
+        self.prev           = 0x00
+        self.header_name    = ''
+        self.need_len       = self.packet_length - 4      # 4 means 2 header, 2 footer
+        self.head_packet    = b''
+        self.body_packet    = b''
+        self.res_packet     = b''
+
+    def finish(self, footer_found: bool) -> None:
+        if footer_found and self.commstat != CommStatus.WAIT_TAIL:
+            color_log = ColorLog()
+            color_log.log(
+                "********* Wrong Packet = [ %s ] ********",
+                Color.Yellow,
+                ColorLog.Level.WARN,
+                LazyHex(self.res_packet)
+            )
+        self.frames.append(
+            ScannedFrame(self.commstat, self.header_name, self.head_packet, self.body_packet, self.res_packet)
+        )
+        self.reset()
+
+    def find_footer(self, data: bytes, start: int, end: int) -> int:
+        '''
+        return index of the 2nd footer byte in data[start:end] (counting self.prev), or -1
+        '''
+        if self.prev == KocomHandler.FOOTER_1st_BYTE and data[start] == KocomHandler.FOOTER_2nd_BYTE:
+            return start
+        index = data.find(self.FOOTER, start, end)
+        return index + 1 if index >= 0 else -1
+
+    def take(self, data: bytes, start: int, end: int) -> None:
+        self.res_packet += data[start:end]
+        self.packet_len += end - start
+        self.prev = data[end - 1]
+
+    def scan_whole_frame(self, data: bytes, i: int) -> int:
+        '''
+        fast path for a clean frame (header, body, footer) that is complete in data[i:].
+        returns index after the frame, or 0 to fall back to the state machine.
+        '''
+        if i + 2 > len(data):
+            return 0
+        hdr = self.header_pairs[(data[i] << 8) | data[i + 1]]
+        if hdr is None:
+            return 0
+        body_end = i + 2 + hdr.len
+        if body_end + 2 > len(data):
+            return 0
+        # a footer pair inside the body (or ending on the last body byte) ends the read early.
+        if data.find(self.FOOTER, i + 1, body_end + 1) >= 0 or data[body_end:body_end + 2] != self.FOOTER:
+            return 0
+        self.frames.append(
+            ScannedFrame(CommStatus.WAIT_TAIL, hdr.name, data[i:i + 2], data[i + 2:body_end], self.FOOTER)
+        )
+        return body_end + 2
+
+    def feed(self, data: bytes) -> int:
+        '''
+        scan one socket read. returns count of frames appended to self.frames.
+        '''
+        count = len(self.frames)
+        length = len(data)
+        i = 0
+        while i < length:
+            if self.commstat == CommStatus.WAIT_HEAD:
+                if self.packet_len == 0:
+                    match = self.header_start.search(data, i)
+                    if match is None:
+                        break
+                    i = match.start()
+                    end = self.scan_whole_frame(data, i)
+                    if end > 0:
+                        i = end
+                        continue
+                # headers are found within a couple of bytes, so stay byte by byte here.
+                pair = (self.prev, data[i])
+                self.take(data, i, i + 1)
+                i += 1
+                if pair == (KocomHandler.FOOTER_1st_BYTE, KocomHandler.FOOTER_2nd_BYTE):
+                    self.finish(True)
+                    continue
+                hdr = self.header_pairs[(pair[0] << 8) | pair[1]]
+                if hdr is not None:
+                    self.header_name    = hdr.name
+                    self.need_len       = hdr.len
+                    self.head_packet    = self.res_packet[-2:]
+                    self.res_packet     = b''
+                    self.body_len       = 0
+                    self.commstat       = CommStatus.WAIT_BODY
+                if self.packet_len >= self.packet_length:
+                    self.finish(False)
+                continue
 
-    def __repr__(self) -> str:
-        packets = self.struct.get_full_bytes_packet()
-        return str(packets.hex())
+            end = min(length, i + self.packet_length - self.packet_len)
+            if self.commstat == CommStatus.WAIT_BODY:
+                end = min(end, i + self.need_len - self.body_len)
+            footer = self.find_footer(data, i, end)
+            if footer >= 0:
+                self.take(data, i, footer + 1)
+                if self.commstat == CommStatus.WAIT_BODY:
+                    self.body_len += footer - i
+                i = footer + 1
+                self.finish(True)
+                continue
+
+            self.take(data, i, end)
+            if self.commstat == CommStatus.WAIT_BODY:
+                self.body_len += end - i
+                if self.body_len == self.need_len:
+                    self.body_packet    = self.res_packet
+                    self.res_packet     = b''
+                    self.commstat       = CommStatus.WAIT_TAIL
+            i = end
+            if self.packet_len >= self.packet_length:
+                self.finish(False)
+        return len(self.frames) - count
 
 
 class KocomHandler:
@@ -275,17 +519,57 @@ class KocomHandler:
     FOOTER_1st_BYTE = 0x0d
     FOOTER_2nd_BYTE = 0x0d
 
+    # (b1 << 8) | b2 -> HeaderMark, and 2nd header bytes as seen in type_and_sequence.
+    HEADER_PAIR_TABLE   = make_header_pair_table(HEADER_LIST)
+    HEADER_B2_TABLE     = make_byte_table(x.b2 for x in HEADER_LIST)
+
+    # body fix-ups for alternative headers, which are broken frames missing their first bytes.
+    # checksum is tested as if check_prefix was in front of body. if ok, body becomes result_prefix + body.
+    # rule is looked up by header name, then by 1st byte of body, then the header's default.
+    HEADER_REPAIR_RULES = {
+        '5530': BodyRepairRule.make(b'\x30', b'\x30'),
+        'D530': BodyRepairRule.make(b'\x30', b'\x30'),
+        '55E2': BodyRepairRule.make(b'\x0c', b'\x55\x30'),
+        '55EA': BodyRepairRule.make(b'\x0d', b'\x55\x30'),
+    }
+    BODY_REPAIR_RULES = {
+        0xdc: BodyRepairRule.make(b'\x30', b'\x30'),
+        0xe2: BodyRepairRule.make(b'\xd5\x55', b'\x55'),
+    }
+    DEFAULT_REPAIR_RULES = {
+        x.name: BodyRepairRule.make(bytes((x.b1, x.b2)), bytes((x.b2,))) for x in HEADER_LIST
+    }
+
     def __init__(self, config: MainConfig) -> None:
         self.name           = config.kocom_devicename
         self.enabled_dev    = []
         self.commstat       = CommStatus.WAIT_HEAD
         self.wallpad        = WallPad()
+        self.scanner        = KocomFrameScanner(KocomHandler.HEADER_LIST, KocomHandler.KOCOM_PACKET_LENGTH)
+        self.decoder        = KocomDecoder()
+        self.decode_cache   = KocomDecodeCache(cfg.KOCOM_DECODE_CACHE_SIZE, self.decoder)
+        # ACK awaited by the writer. key is make_ack_key() of the sent packet.
+        self.ack_key: tuple[int, int, int, int] | None  = None
+        self.ack_waiter: asyncio.Future | None          = None
+        self.commands       = 0
+        self.acked          = 0
+        self.retries        = 0
+        self.no_acks        = 0
+        # writes after KOCOM_BUS_IDLE_MAX_WAIT_SEC of a bus that never went idle.
+        self.busy_sends     = 0
+        self.ack_time       = 0.
+        self.bad_frames     = 0
+        # cleared while async_relink() makes a new EW11 connection for the running loops.
+        self.link_ready     = asyncio.Event()
+        self.link_ready.set()
+        self.relinks        = 0
         self.comm: TCPComm  = TCPComm(
             config.kocom_server,
             int(config.kocom_port),
             cfg.MAX_SOCKET_BUFFER,
             cfg.PACKET_RESEND_INTERVAL_SEC
         )
+        self.comm.set_wire_speed(cfg.KOCOM_BUS_BPS)
 
         for dev in [
             DeviceType.THERMOSTAT.value,
@@ -305,21 +589,52 @@ class KocomHandler:
         return cls(config)
 
     async def async_prepare_communication(self):
-        await self.comm.async_make_connection()
+        self.scanner.reset()
+        self.scanner.frames.clear()
+        if cfg.KOCOM_TRANSPORT == 'protocol':
+            await self.comm.async_make_protocol_connection(self.scanner)
+        else:
+            await self.comm.async_make_connection()
 
-    def is_checksum_ok(self, body: bytes) -> bool:
-        checksum = sum(body[:-1])
+    def is_checksum_ok(self, body: bytes, prefix_sum: int = 0) -> bool:
+        '''
+        prefix_sum is the sum of bytes that would be put in front of body.
+        '''
+        checksum = prefix_sum + sum(body) - body[-1]
 
         if body[-1] == (checksum & 0xff):
             return True
         else:
             return False
 
+    def get_repair_rule(self, header_name: str, body: bytes) -> BodyRepairRule:
+        rule = KocomHandler.HEADER_REPAIR_RULES.get(header_name)
+        if rule is None:
+            rule = KocomHandler.BODY_REPAIR_RULES.get(body[0])
+            if rule is None:
+                rule = KocomHandler.DEFAULT_REPAIR_RULES[header_name]
+        return rule
+
+    def repair_body(self, header_name: str, body: bytes) -> bytes | None:
+        '''
+        try the repair rule of an alternative header. returns fixed body or None.
+        '''
+        rule = self.get_repair_rule(header_name, body)
+        if self.is_checksum_ok(body, rule.check_sum):
+            return rule.result_prefix + body
+        return None
+
+    def decode_chunk(self, chunk: bytes) -> tuple[bool, str, str, dict]:
+        return self.decoder.decode(chunk)
+
     def handle_chunk(self, header_type: HeaderType, chunk: bytes) -> str:
         color_log = ColorLog()
-        packet = KocomPacket(chunk)
+        result = self.decode_cache.get(chunk)
+        if result is None:
+            result = self.decode_chunk(chunk)
+            self.decode_cache.put(chunk, result)
 
-        noti_to_HA, device_str, room_str, payload_value = packet.parse_data_from_packet()
+        noti_to_HA, device_str, room_str, payload_value = result
         if header_type == HeaderType.Alter1:
             if cfg.ALTERNATIVE_HEADER_DEBUG:
                 color_log.log(
@@ -334,13 +649,13 @@ class KocomHandler:
                 if device_str != '':
                     assert isinstance(payload_value, dict)
                     payload_value_str = payload_value
-                    self.wallpad.notify_to_homeassistant(device_str, room_str, payload_value_str)
-                    color_log.log(f"Yes. {packet} in sent to HA.", Color.White, ColorLog.Level.DEBUG)
+                    self.wallpad.notify_state(device_str, room_str, payload_value_str)
+                    color_log.log("Yes. %s in sent to HA.", Color.White, ColorLog.Level.DEBUG, LazyHex(chunk))
                     return device_str
             except Exception as e:
                 color_log.log(f"Error [{e}]in handling packets [{chunk.hex()}]", Color.White, ColorLog.Level.DEBUG)
         else:
-            color_log.log(f"ACK packet. So, Do Nothong!! packet={packet}", Color.White, ColorLog.Level.DEBUG)
+            color_log.log("ACK packet. So, Do Nothong!! packet=%s", Color.White, ColorLog.Level.DEBUG, LazyHex(chunk))
             return device_str
         return ''
 
@@ -353,162 +668,142 @@ class KocomHandler:
         color_log.log(f"Make kocom Data - Start{device_obj}", Color.Yellow, ColorLog.Level.DEBUG)
         full_packet: bytes = device_obj.make_rs485_packet(cmd)
         if len(full_packet) != 0:
-            ok: bool = await self.comm.async_write_one_chunk(full_packet)
-            if ok:
-                color_log.log(f"Data sent to Kocom : {full_packet.hex}", Color.Yellow, ColorLog.Level.DEBUG)
+            result = await self.async_send_and_wait_ack(full_packet)
+            if result == SendResult.WRITE_FAIL:
+                color_log.log("Writing to Kocom Fail: %s", Color.Red, ColorLog.Level.CRITICAL, LazyHex(full_packet))
+            elif result == SendResult.NO_ACK:
+                color_log.log("No ACK from Kocom: %s", Color.Red, ColorLog.Level.ERROR, LazyHex(full_packet))
             else:
-                color_log.log(f"Writing to Kocom Fail: {full_packet.hex}", Color.Red, ColorLog.Level.CRITICAL)
+                color_log.log("Data sent to Kocom : %s", Color.Yellow, ColorLog.Level.DEBUG, LazyHex(full_packet))
+            return result in (SendResult.ACKED, SendResult.SENT)
         else:
             color_log.log("Make kocom Data - Fail!!!", Color.Red, ColorLog.Level.DEBUG)
+        return False
 
-    async def async_read_until_tail(self) -> tuple[str, bytes, bytes, bytes]:
+    async def async_send_and_wait_ack(self, packet: bytes) -> SendResult:
+        '''
+        write packet and wait for its ACK from the read loop. sent again on timeout, up to
+        KOCOM_MAX_RETRY (at most MAX_SEQUENCE_RETRY) times. a frame nobody ACKs is written once.
+        '''
         color_log = ColorLog()
-
-        class Chunk:
-            def __init__(self) -> None:
-                self.reset()
-
-            def reset(self):
-                self.packet_len     = 0
-                self.body_len       = 0
-                self.prev_data      = b'\x00'
-                self.head_packet    = b''
-                self.body_packet    = b''
-                self.res_packet     = b''
-                self.header_name    = ''
-                self.need_len       = KocomHandler.KOCOM_PACKET_LENGTH - 4      # 4 means 2 header, 2 footer
-
-            def append(self, add):
-                self.res_packet += add
-                self.packet_len += 1
-
-            def is_body_len_match(self):
-                if self.body_len == self.need_len:
-                    return True
-                else:
-                    return False
-
-            def copy_body(self):
-                self.body_packet = self.res_packet
-                self.res_packet = b''
-
-            def copy_head(self, name: str, len: int):
-                self.header_name    = name
-                self.need_len       = len
-                self.head_packet    = self.res_packet[-2:]
-                self.res_packet     = b''
-                self.body_len       = 0
-
-            def __repr__(self):
-                return (
-                    f"PL:{self.packet_len}, BL:{self.body_len}, RP:{self.res_packet.hex()}, "
-                    f"HP:{self.head_packet.hex()}, BP:{self.body_packet.hex()}"
-                )
-
-        header_start = set((x.b1 for x in KocomHandler.HEADER_LIST))
-
-        chunk = Chunk()
-
-        while chunk.packet_len < KocomHandler.KOCOM_PACKET_LENGTH:
-            peek_data = await self.comm.async_get_data_from_buffer(1)
-            # if you want sync version socket read
-            # peek_data = await self.reader.read(1)
-            if peek_data == b'':        # myabe closed! or error
-                color_log.log("Socket Error. So, Quitting... for socket clear.", Color.Red, ColorLog.Level.WARN)
-                sys.exit(1)
-
-            if chunk.packet_len == 0 and self.commstat == CommStatus.WAIT_HEAD and not (peek_data[0] in header_start):
-                color_log.log(f"packet staring with {peek_data[0]:02x}. so, Skipping", Color.Blue, ColorLog.Level.DEBUG)
-                continue
-
-            chunk.append(peek_data)
-            pair = (chunk.prev_data[0], peek_data[0])
-
-            if pair == (KocomHandler.FOOTER_1st_BYTE, KocomHandler.FOOTER_2nd_BYTE):
-                color_log.log(str(chunk), Color.Red, ColorLog.Level.DEBUG)
-                if self.commstat != CommStatus.WAIT_TAIL:
-                    color_log = ColorLog()
+        loop = asyncio.get_running_loop()
+        self.commands += 1
+        ack_expected = is_ack_expected(packet)
+        retries = min(cfg.KOCOM_MAX_RETRY, MAX_SEQUENCE_RETRY) if ack_expected else 0
+        self.ack_key = make_ack_key(packet) if ack_expected else None
+        try:
+            for retry in range(retries + 1):
+                if retry > 0:
+                    self.retries += 1
+                if ack_expected:
+                    self.ack_waiter = loop.create_future()
+                # not into a connection async_relink() is replacing.
+                await self.link_ready.wait()
+                if not await self.comm.async_wait_bus_idle(cfg.KOCOM_BUS_IDLE_GAP_SEC, cfg.KOCOM_BUS_IDLE_MAX_WAIT_SEC):
+                    self.busy_sends += 1
                     color_log.log(
-                        f"********* Wrong Packet = [ {chunk.res_packet.hex()} ] ********",
-                        Color.Yellow,
-                        ColorLog.Level.WARN
+                        "Kocom bus not idle for %s sec. Sending anyway: %s",
+                        Color.Yellow, ColorLog.Level.DEBUG, cfg.KOCOM_BUS_IDLE_MAX_WAIT_SEC, LazyHex(packet)
                     )
-                break
-
-            if self.commstat == CommStatus.WAIT_HEAD:
-                color_log.log(str(chunk), Color.Red, ColorLog.Level.DEBUG)
-                for hdr in KocomHandler.HEADER_LIST:
-                    if pair == (hdr.b1, hdr.b2):
-                        color_log.log(f"Header Detected![{chunk.res_packet.hex()}]", Color.Yellow, ColorLog.Level.DEBUG)
-                        chunk.copy_head(hdr.name, hdr.len)
-                        self.commstat = CommStatus.WAIT_BODY
+                if not await self.comm.async_write_one_chunk(make_retry_packet(packet, retry), wait_safe=False):
+                    return SendResult.WRITE_FAIL
+                if not ack_expected:
+                    return SendResult.SENT
+                sent = loop.time()
+                try:
+                    await asyncio.wait_for(self.ack_waiter, cfg.KOCOM_ACK_TIMEOUT_SEC)
+                except asyncio.TimeoutError:
+                    continue
+                self.acked += 1
+                self.ack_time = loop.time() - sent
+                return SendResult.ACKED
+        finally:
+            self.ack_key = None
+            self.ack_waiter = None
+        self.no_acks += 1
+        return SendResult.NO_ACK
+
+    def resolve_ack(self, body: bytes) -> None:
+        if self.ack_waiter is None or self.ack_waiter.done():
+            return
+        if get_ack_key(body) == self.ack_key:
+            self.ack_waiter.set_result(True)
+
+    def get_stats(self) -> dict:
+        return {
+            'commands': self.commands,
+            'acked': self.acked,
+            'retries': self.retries,
+            'no_acks': self.no_acks,
+            'busy_sends': self.busy_sends,
+            'last_ack_msec': round(self.ack_time * 1000, 2),
+            'bad_frames': self.bad_frames,
+            'relinks': self.relinks,
+            'bus': self.comm.get_stats(),
+        }
+
+    async def async_read_next_frame(self) -> ScannedFrame:
+        while True:
+            if self.comm.transport is not None:
+                frame = await self.comm.async_read_frame()
+                if frame is not None:
+                    return frame
+            else:
+                while not self.scanner.frames:
+                    data = await self.comm.async_read_chunk()
+                    if data == b'':        # myabe closed! or error
                         break
-            elif self.commstat == CommStatus.WAIT_BODY:
-                chunk.body_len += 1
-                if chunk.is_body_len_match():
-                    color_log.log(str(chunk), Color.Red, ColorLog.Level.DEBUG)
-                    chunk.copy_body()
-                    self.commstat = CommStatus.WAIT_TAIL
-
-            chunk.prev_data = peek_data
-
-        return chunk.header_name, chunk.head_packet, chunk.body_packet, chunk.res_packet
+                    self.scanner.feed(data)
+                if self.scanner.frames:
+                    return self.scanner.frames.popleft()
+            if self.link_ready.is_set():
+                color_log = ColorLog()
+                color_log.log("Socket Error. So, Quitting... for socket clear.", Color.Red, ColorLog.Level.WARN)
+                sys.exit(1)
+            # closed by async_relink(). read from the new connection.
+            await self.link_ready.wait()
 
     async def async_get_one_chunk(self) -> tuple[HeaderType, bytes]:
         color_log = ColorLog()
         try:
             header_type = HeaderType.Normal
             while True:
-                self.commstat = CommStatus.WAIT_HEAD
-                (header_name, magic_word, body, postfix) = await self.async_read_until_tail()
+                (self.commstat, header_name, magic_word, body, postfix) = await self.async_read_next_frame()
 
-                color_log.log(f"=== read prefix = [{magic_word.hex()}]. Starting ===", Color.Cyan, ColorLog.Level.DEBUG)
+                color_log.log(
+                    "=== read prefix = [%s]. Starting ===", Color.Cyan, ColorLog.Level.DEBUG, LazyHex(magic_word)
+                )
                 if self.commstat != CommStatus.WAIT_TAIL:
-                    color_log.log(f"Bad Header[{magic_word.hex()}]. so, re-reading.", Color.Red, ColorLog.Level.DEBUG)
+                    color_log.log(
+                        "Bad Header[%s]. so, re-reading.", Color.Red, ColorLog.Level.DEBUG, LazyHex(magic_word)
+                    )
                     continue
 
                 if not self.is_checksum_ok(body):
                     if header_name != KocomHandler.HEADER_LIST[0].name:
-                        special_case = False
-                        # next check is adhoc.. TT.
-                        if header_name == '5530' or header_name == 'D530':
-                            alt_body = b'\x30' + body
-                            special_case = True
-                        elif header_name == '55E2':
-                            alt_body = b'\x0c' + body
-                        elif header_name == '55EA':
-                            alt_body = b'\x0d' + body
-                        else:
-                            if body[0] == 0xdc:
-                                alt_body = b'\x30' + body
-                                special_case = True
-                            elif body[0] == 0xe2:
-                                alt_body = b'\xd5\x55' + body
-                            else:
-                                alt_body = magic_word + body
-
-                        if self.is_checksum_ok(alt_body):
-                            if special_case:
-                                body = alt_body
-                            elif header_name == '55E2' or header_name == '55EA':
-                                body = b'\x55\x30' + body
-                            else:
-                                body = alt_body[1:]
+                        repaired = self.repair_body(header_name, body)
+                        if repaired is not None:
+                            body = repaired
                             color_log.log(f"Alt Header Detected! = [{header_name}]", Color.Blue, ColorLog.Level.DEBUG)
                         else:
+                            self.bad_frames += 1
                             if cfg.ALTERNATIVE_HEADER_DEBUG:
+                                rule = self.get_repair_rule(header_name, body)
                                 color_log.log(
-                                    f"Alt Header CASE : Body checksum Error![{alt_body.hex()}] will retry Read.",
+                                    f"Alt Header CASE : Body checksum Error![{(rule.check_prefix + body).hex()}] "
+                                    f"will retry Read.",
                                     Color.Yellow,
                                     ColorLog.Level.DEBUG
                                 )
                             self.commstat = CommStatus.WAIT_HEAD
                             continue
                     else:
+                        self.bad_frames += 1
                         color_log.log(
-                            f"Main Header : Body checksum Error![{body.hex()}] will retry Read.",
+                            "Main Header : Body checksum Error![%s] will retry Read.",
                             Color.Yellow,
-                            ColorLog.Level.DEBUG
+                            ColorLog.Level.DEBUG,
+                            LazyHex(body)
                         )
                         self.commstat = CommStatus.WAIT_HEAD
                         continue
@@ -517,7 +812,7 @@ class KocomHandler:
                     len(postfix) == 2
                     and (postfix[0], postfix[1]) == (KocomHandler.FOOTER_1st_BYTE, KocomHandler.FOOTER_2nd_BYTE)
                 ):
-                    color_log.log(f"Valid input body=[{body.hex()}]", Color.Green, ColorLog.Level.DEBUG)
+                    color_log.log("Valid input body=[%s]", Color.Green, ColorLog.Level.DEBUG, LazyHex(body))
                     # self.last_accessed_time = time.monotonic() # this maybe fix delayed action state change! - KKS
                     if header_name != KocomHandler.HEADER_LIST[0].name:
                         header_type = HeaderType.Alter1
@@ -547,6 +842,23 @@ class KocomHandler:
         await asyncio.sleep(3 * PACKET_RESEND_INTERVAL_SEC)
         await self.async_prepare_communication()
 
+    async def async_relink(self) -> None:
+        '''
+        warm reconnect. the EW11 connection is made again under the running read and write
+        loops, device states and queued commands are kept. raises if the new connection fails,
+        the loops wait until they are cancelled then.
+        '''
+        self.link_ready.clear()
+        try:
+            await self.comm.close_async_socket()
+        except Exception as e:
+            color_log = ColorLog()
+            color_log.log(f"Close Kocom socket : {e}", Color.Yellow, ColorLog.Level.DEBUG)
+        self.comm.read_buffer.clear()
+        await self.async_prepare_communication()
+        self.relinks += 1
+        self.link_ready.set()
+
     def sync_close_socket(self, loop: asyncio.AbstractEventLoop):
         #        loop.run_until_complete(self.comm.close_async_socket())
         pass
@@ -554,9 +866,9 @@ class KocomHandler:
     # main loop
     async def kocom_main_read_loop(self) -> None:
         while True:
-            await self.comm.wait_safe_communication()
             (header_type, chunk) = await self.async_get_one_chunk()
             if chunk != b'':
+                self.resolve_ack(chunk)
                 dev_str = self.handle_chunk(header_type, chunk)
                 if dev_str == DEVICE_FAN:
                     # adhoc adding fansensor
@@ -569,10 +881,11 @@ class KocomHandler:
                 await self.reconnect_socket()
 
     async def kocom_main_write_loop(self) -> None:
+        if self.wallpad.command_queue is None:
+            self.wallpad.set_event_loop(asyncio.get_running_loop())
+        command_queue = self.wallpad.command_queue
+        assert command_queue is not None
         while True:
-            await asyncio.sleep(0.01)
-            if not self.wallpad.command_queue.empty():
-                (_, obj, command) = self.wallpad.command_queue.get()
-                assert isinstance(obj, WallPad.QueueWraper)
-                await self.async_make_kocom_data_and_send(obj.device, command)
+            (_, _, device, command) = await command_queue.get()
+            if not await self.async_make_kocom_data_and_send(device, command):
                 await asyncio.sleep(PACKET_RESEND_INTERVAL_SEC)
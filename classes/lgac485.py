@@ -2,8 +2,7 @@ from __future__ import annotations
 
 import asyncio
 import sys
-from queue import Queue
-from struct import calcsize, pack, unpack
+from struct import Struct, pack
 import time
 from typing import Callable
 
@@ -11,7 +10,8 @@ import config as cfg
 from classes.aircon import Aircon
 from classes.appconf import MainConfig
 from classes.comm import TCPComm
-from classes.utils import Color, ColorLog
+from classes.topicrouter import CommandRoute
+from classes.utils import Color, ColorLog, LazyHex
 from consts import (DEVICE_AIRCON, MQTT_FAN_MODE, MQTT_MODE, MQTT_SWING_MODE,
                     MQTT_TARGET_TEMP, PAYLOAD_AUTO, PAYLOAD_COOL, PAYLOAD_DRY,
                     PAYLOAD_FAN_ONLY, PAYLOAD_FIXED, PAYLOAD_HEAT,
@@ -24,6 +24,7 @@ TEST_LGAC_SERVER = '10.0.0.252'
 TEST_LGAC_PORT = 8899
 
 MAX_READ_ERROR_RETRY = 3
+RESPONSE_TIME_EWMA_ALPHA = 0.2
 
 
 class LGACPacket:
@@ -64,6 +65,14 @@ class LGACPacket:
     #                             FMT_checksum
     FMT_body_read           = '>BBBBBBBBBBBBBBBB'
     FMT_body_write          = '>BBBB'
+    BODY_READ               = Struct(FMT_body_read)
+
+    __slots__ = (
+        'fill_return_head', 'action', 'fill_unknown1', 'fill_unknown2', 'groupandid', 'fill_unknown3',
+        'current_mode', 'set_temp', 'current_temp', 'pipe1_temp', 'pipe2_temp', 'fill_outer_sensor',
+        'fill_unknown4', 'fill_model', 'fill_fixedvalue', 'checksum',
+        'str_action', 'str_opmode', 'str_fanmove', 'str_fanmode'
+    )
 
     LGAC_ACTION = {
         0x00: PAYLOAD_SCAN,
@@ -93,6 +102,11 @@ class LGACPacket:
     LGAC_FAN_SPEED_REV     = {v: k for k, v in LGAC_FAN_SPEED.items()}
 
     def __init__(self, rawdata: bytes | None = None) -> None:
+        self.reset()
+        if rawdata is not None:
+            self.set_packet_data(rawdata)
+
+    def reset(self) -> None:
         self.fill_return_head    = 0
         self.action              = 0
         self.fill_unknown1       = 0
@@ -113,12 +127,10 @@ class LGACPacket:
         self.str_opmode: str = ''
         self.str_fanmove: str = ''
         self.str_fanmode: str = ''
-        if rawdata is not None:
-            self.set_packet_data(rawdata)
 
     @property
     def _body_size(self) -> int:
-        return calcsize(LGACPacket.FMT_body_read)
+        return LGACPacket.BODY_READ.size
 
     def set_packet_data(self, rawdata: bytes) -> bool:
         color_log = ColorLog()
@@ -131,7 +143,7 @@ class LGACPacket:
                     ColorLog.Level.DEBUG
                 )
                 return False
-            res = unpack(LGACPacket.FMT_body_read, rawdata)
+            res = LGACPacket.BODY_READ.unpack(rawdata)
             (
                 self.fill_return_head,
                 self.action,
@@ -155,7 +167,7 @@ class LGACPacket:
             self.pipe1_temp = self.calc_temp(self.pipe1_temp)
             self.pipe2_temp = self.calc_temp(self.pipe2_temp)
             self.get_detail_mode()
-            color_log.log(f"LGAC Packet Body = [ {rawdata.hex()} ]", Color.White, ColorLog.Level.DEBUG)
+            color_log.log("LGAC Packet Body = [ %s ]", Color.White, ColorLog.Level.DEBUG, LazyHex(rawdata))
             return True
         except Exception as e:
             color_log = ColorLog()
@@ -222,7 +234,7 @@ class LGACPacket:
             self.str_fanmode = PAYLOAD_LOW
 
         color_log = ColorLog()
-        color_log.log(f"LGAC new_packet = [{self}]", Color.White, ColorLog.Level.DEBUG)
+        color_log.log("LGAC new_packet = [%s]", Color.White, ColorLog.Level.DEBUG, self)
 
     def set_detail_mode(self) -> None:
         self.action = self.get_lgac_action_data(self.str_action)
@@ -266,28 +278,95 @@ class LGACPacket:
 
 class LGACPacketHandler:
     SYSTEM_ROOM_AIRCON_REV      = {v: k for k, v in cfg.SYSTEM_ROOM_AIRCON.items()}
+    # only read by async_send_and_get_result(), so one is enough.
+    STATUS_REQUEST              = Aircon.Info(PAYLOAD_STATUS, '', '', '', 25, 25)
 
     def __init__(self, config: MainConfig | None = None) -> None:
         self.name                       = config.aircon_devicename if config is not None else 'TestAircon'
         self.enabled_device_list: list  = []
         self.aircon: list               = []
+        self.room_aircon: dict[str, Aircon] = {}
         self.type                       = None
         if config:
+            # requests are paced by guard_gap(), not by the TCPComm interval.
             self.comm: TCPComm              = TCPComm(
                 config.aircon_server,
                 int(config.aircon_port),
-                cfg.MAX_SOCKET_BUFFER,
-                cfg.PACKET_RESEND_INTERVAL_SEC
+                cfg.MAX_SOCKET_BUFFER
             )
-        self.command_queue: Queue       = Queue()
-        self.loop: asyncio.AbstractEventLoop
+        # aircon_no -> (room_str, latest command). filled by enqueue_command() in the loop thread.
+        self.pending_commands: dict[int, tuple[str, Aircon.Info]] = {}
+        self.command_event: asyncio.Event | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.commands                   = 0
+        self.transactions_saved         = 0
         self.read_error_count           = 0
+        # one request and one response packet, reused by every transaction.
+        self.tx_packet                  = LGACPacket()
+        self.rx_packet                  = LGACPacket()
         self.send_and_get_state         = False
+        # one transaction at a time on the link.
+        self.transaction_lock           = asyncio.Lock()
+        self.persistent                 = cfg.LGAC_PERSISTENT_CONNECTION
+        self.transactions               = 0
+        self.connects                   = 0
+        self.connection_drops           = 0
+        # pacing measured from the bus. times are time.monotonic() seconds.
+        self.last_bus_activity          = 0.
+        self.response_time: float | None    = None
+        self.unit_stats: dict[int, dict]    = {}
+        self.sweeps                     = 0
+        self.last_sweep_sec             = 0.
         self.prepare_enabled()
 
+    async def async_relink(self) -> None:
+        '''
+        warm reconnect. drops the persistent connection between two transactions and makes it
+        again. units are swept once more, their states may have changed meanwhile.
+        '''
+        async with self.transaction_lock:
+            await self.async_disconnect()
+            if self.persistent:
+                await self.async_connect()
+        for aircon in self.aircon:
+            aircon.scan.tick = 0.
+
     def sync_close_socket(self, loop):
         pass
 
+    def set_event_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        '''
+        must be called in the loop that runs the aircon write loop.
+        '''
+        self.loop = loop
+        self.command_event = asyncio.Event()
+
+    def enqueue_command(self, aircon_no: int, room_str: str, aircon_cmd: Aircon.Info) -> None:
+        '''
+        loop thread only. a command still pending for the unit is replaced, because every
+        command carries the full settings of the unit.
+        '''
+        assert self.command_event is not None
+        self.commands += 1
+        if aircon_no in self.pending_commands:
+            self.transactions_saved += 1
+        self.pending_commands[aircon_no] = (room_str, aircon_cmd)
+        self.command_event.set()
+
+    def enqueue_command_threadsafe(self, aircon_no: int, room_str: str, aircon_cmd: Aircon.Info) -> None:
+        if self.loop is None or self.command_event is None:
+            color_log = ColorLog()
+            color_log.log(f"Command queue is not ready. {room_str} command is dropped.", Color.Red, ColorLog.Level.WARN)
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            self.enqueue_command(aircon_no, room_str, aircon_cmd)
+        else:
+            self.loop.call_soon_threadsafe(self.enqueue_command, aircon_no, room_str, aircon_cmd)
+
     def set_notify_function(self, change_aircon_status):
         self.notify_to_homeassistant: Callable[[str, str, Aircon.Info], None] = change_aircon_status
 
@@ -296,6 +375,7 @@ class LGACPacketHandler:
             aircon = Aircon(r_name)
             aircon.set_initial_state()
             self.aircon.append(aircon)
+            self.room_aircon[r_name] = aircon
         self.enabled_device_list.append((DeviceType.AIRCON, self.aircon))
 
     def get_room_aircon_number(self, instr: str) -> str:
@@ -303,12 +383,9 @@ class LGACPacketHandler:
         return ret_str if ret_str is not None else ''
 
     def get_aircon(self, room_name: str) -> Aircon:
-        if self.aircon is not None and len(self.aircon) >= 1:
-            for item in self.aircon:
-                assert isinstance(item, Aircon)
-                if item.room_name == room_name:
-                    return item
-        assert False, "get_aircon error!"
+        aircon = self.room_aircon.get(room_name)
+        assert isinstance(aircon, Aircon), "get_aircon error!"
+        return aircon
 
     def is_checksum_ok(self, body: bytes) -> bool:
         checksum = sum(body[:-1])
@@ -318,14 +395,32 @@ class LGACPacketHandler:
         else:
             return False
 
+    def get_command_handlers(self) -> dict[DeviceType, Callable[[CommandRoute, str], None]]:
+        return {DeviceType.AIRCON: self.command_aircon}
+
     def handle_aircon_mqtt_message(self, topic: list[str], payload: str):
+        '''
+        topics without a route (see TopicRouter). finds the aircon from the topic parts.
+        '''
         color_log = ColorLog()
-        color_log.log(f"LGAircon Action From MQTT.{topic}, = {payload}", Color.Yellow, ColorLog.Level.DEBUG)
+        try:
+            room_str = topic[2]
+            route = CommandRoute(self.command_aircon, self.get_aircon(room_str), room_str, '', topic[3])
+        except Exception as e:
+            color_log.log(f"[From HA]Error [{e}] {topic} = {payload}", Color.Red)
+            return
+        self.command_aircon(route, payload)
+
+    def command_aircon(self, route: CommandRoute, payload: str) -> None:
+        color_log = ColorLog()
+        color_log.log(
+            f"LGAircon Action From MQTT.{route.room}/{route.cmd}, = {payload}", Color.Yellow, ColorLog.Level.DEBUG
+        )
         device_str = DEVICE_AIRCON
-        room_str = topic[2]
-        cmd_str = topic[3]
+        room_str = route.room
+        cmd_str = route.cmd
         try:
-            aircon = self.get_aircon(room_str)
+            aircon = route.device
             assert isinstance(aircon, Aircon)
             if cmd_str == MQTT_MODE:
                 aircon.action = payload
@@ -355,24 +450,16 @@ class LGACPacketHandler:
             aircon_no = int(self.get_room_aircon_number(room_str))
             aircon_cmd = Aircon.Info(action_str, '', aircon.fanmove, aircon.fanmode, 0, aircon.target_temp)
 
-            self.command_queue.put((aircon_no, room_str, aircon_cmd))
+            self.enqueue_command_threadsafe(aircon_no, room_str, aircon_cmd)
 
             color_log.log(
                 f"[From HA]{device_str}/{room_str}/set = [mode={aircon.action}, target_temp={aircon.target_temp}]"
             )
         except Exception as e:
-            color_log.log(f"[From HA]Error [{e}] {topic} = {payload}", Color.Red)
+            color_log.log(f"[From HA]Error [{e}] {room_str}/{cmd_str} = {payload}", Color.Red)
 
     async def async_read_until_tail(self) -> bytes:
-        packet_len = 0
-        res_packet = bytes()
-        while packet_len < LGACPacket._RESPONSE_PACKET_SIZE:
-            peek_data = await self.comm.async_get_data_direct(1)
-            if peek_data == b'':        # maybe closed!
-                break
-            res_packet += peek_data
-            packet_len += 1
-        return res_packet
+        return await self.comm.async_read_exactly(LGACPacket._RESPONSE_PACKET_SIZE)
 
     async def async_read_one_chunk(self) -> bytes | None:
         try:
@@ -394,16 +481,129 @@ class LGACPacketHandler:
             color_log.log(f"[Error LGAC rs485] : {e} : Cannot read From LGAC!", Color.Yellow, ColorLog.Level.WARN)
         return None
 
+    async def async_connect(self) -> None:
+        '''
+        make the persistent connection if it is not healthy. tries LGAC_CONNECT_RETRY times.
+        '''
+        if self.comm.is_connected():
+            return
+        color_log = ColorLog()
+        for retry in range(cfg.LGAC_CONNECT_RETRY):
+            try:
+                await asyncio.wait_for(self.comm.connect_async_socket(), cfg.LGAC_READ_TIMEOUT_SEC)
+                self.comm.set_keepalive(cfg.LGAC_KEEPALIVE_IDLE_SEC)
+                self.connects += 1
+                return
+            except (OSError, asyncio.TimeoutError) as e:
+                color_log.log(f"Connect to LGAC fail({retry + 1}) : {e}", Color.Yellow, ColorLog.Level.WARN)
+                await asyncio.sleep(cfg.PACKET_RESEND_INTERVAL_SEC)
+        raise ConnectionError(f"Cannot connect to LGAC {self.comm.server}:{self.comm.port}")
+
+    async def async_disconnect(self) -> None:
+        try:
+            await self.comm.close_async_socket()
+        except Exception:
+            pass
+
+    def guard_gap(self) -> float:
+        '''
+        idle time before the next request. derived from measured response time on the persistent
+        connection, PACKET_RESEND_INTERVAL_SEC until measured or in connect per request mode.
+        '''
+        if not self.persistent or self.response_time is None:
+            return cfg.PACKET_RESEND_INTERVAL_SEC
+        gap = cfg.LGAC_GUARD_GAP_FACTOR * self.response_time
+        return min(max(gap, cfg.LGAC_MIN_GUARD_GAP_SEC), cfg.PACKET_RESEND_INTERVAL_SEC)
+
+    async def async_wait_guard_gap(self) -> None:
+        wait = self.last_bus_activity + self.guard_gap() - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def update_response_time(self, aircon_no: int, response_time: float | None) -> None:
+        '''
+        response_time is None when the unit did not answer.
+        '''
+        unit = self.unit_stats.setdefault(aircon_no, {'last_msec': 0., 'avg_msec': 0., 'fails': 0})
+        if response_time is None:
+            unit['fails'] += 1
+            return
+        if self.response_time is None:
+            self.response_time = response_time
+        else:
+            self.response_time += RESPONSE_TIME_EWMA_ALPHA * (response_time - self.response_time)
+        msec = response_time * 1000
+        if unit['last_msec'] == 0.:
+            unit['avg_msec'] = msec
+        else:
+            unit['avg_msec'] += RESPONSE_TIME_EWMA_ALPHA * (msec - unit['avg_msec'])
+        unit['last_msec'] = msec
+
+    async def async_exchange_per_connection(self, send_packet: bytes) -> tuple[bool, bytes | None]:
+        '''
+        old way. connect, write, read and close for each transaction.
+        '''
+        try:
+            await self.comm.connect_async_socket()
+            self.connects += 1
+            ok: bool = await self.comm.async_write_one_chunk(send_packet)
+            if not ok:
+                return False, None
+            await asyncio.sleep(cfg.RS485_WRITE_INTERVAL_SEC)
+            return True, await self.async_read_one_chunk()
+        finally:
+            await self.comm.close_async_socket()
+
+    async def async_exchange_persistent(self, send_packet: bytes) -> tuple[bool, bytes | None]:
+        '''
+        write and read on the persistent connection. a connection with no or bad response may have
+        a late reply in it, so it is dropped and the transaction is tried once more on a new one.
+        '''
+        ok = False
+        for _ in range(2):
+            await self.async_connect()
+            ok = await self.comm.async_write_one_chunk(send_packet)
+            if ok:
+                try:
+                    read_packet = await asyncio.wait_for(self.async_read_one_chunk(), cfg.LGAC_READ_TIMEOUT_SEC)
+                except asyncio.TimeoutError:
+                    read_packet = None
+                if read_packet:
+                    return True, read_packet
+            self.connection_drops += 1
+            await self.async_disconnect()
+        return ok, None
+
     async def async_send_and_get_result(self, group_no: int, id: int, airconset: Aircon.Info) -> Aircon.Info | None:
+        async with self.transaction_lock:
+            return await self.async_send_and_get_result_locked(group_no, id, airconset)
+
+    def decode_response(self, read_packet: bytes) -> Aircon.Info:
+        packet = self.rx_packet
+        if not packet.set_packet_data(read_packet):
+            packet.reset()
+        return Aircon.Info(
+            packet.str_action,
+            packet.str_opmode,
+            packet.str_fanmove,
+            packet.str_fanmode,
+            packet.current_temp,
+            packet.set_temp
+        )
+
+    async def async_send_and_get_result_locked(
+        self, group_no: int, id: int, airconset: Aircon.Info
+    ) -> Aircon.Info | None:
         def handle_max_read_error():
             color_log.log("Now, Exiting program for reset all!", Color.Red, ColorLog.Level.CRITICAL)
             time.sleep(5)
             sys.exit(1)
 
         self.send_and_get_state = True
+        self.transactions += 1
 
         color_log = ColorLog()
-        packet = LGACPacket(None)
+        packet = self.tx_packet
         packet.make_new_packet(
             group_no, id,
             airconset.action, airconset.opmode, airconset.fanmove, airconset.fanmode, airconset.target_temp
@@ -414,25 +614,21 @@ class LGACPacketHandler:
         ret: Aircon.Info | None = None
         # need some wait
         try:
-            await self.comm.connect_async_socket()
-            ok: bool = await self.comm.async_write_one_chunk(send_packet)
+            await self.async_wait_guard_gap()
+            try:
+                if self.persistent:
+                    ok, read_packet = await self.async_exchange_persistent(send_packet)
+                else:
+                    ok, read_packet = await self.async_exchange_per_connection(send_packet)
+            finally:
+                self.last_bus_activity = time.monotonic()
+            # comm.last_accessed_time is the time of the last write.
+            response_time = self.last_bus_activity - self.comm.last_accessed_time if read_packet else None
+            self.update_response_time(id, response_time)
             if ok:
-                await asyncio.sleep(cfg.RS485_WRITE_INTERVAL_SEC)
-                read_packet = await self.async_read_one_chunk()
                 if read_packet:
-                    color_log.log(f"Read From LGAC ==> {read_packet.hex()}", Color.Green, ColorLog.Level.DEBUG)
-
-                    new_packet = LGACPacket(read_packet)
-                    color_log.log(f'{new_packet}', Color.Green, ColorLog.Level.DEBUG)
-
-                    ret = Aircon.Info(
-                        new_packet.str_action,
-                        new_packet.str_opmode,
-                        new_packet.str_fanmove,
-                        new_packet.str_fanmode,
-                        new_packet.current_temp,
-                        new_packet.set_temp
-                    )
+                    color_log.log("Read From LGAC ==> %s", Color.Green, ColorLog.Level.DEBUG, LazyHex(read_packet))
+                    ret = self.decode_response(read_packet)
                     self.read_error_count = 0
                 else:
                     color_log.log("Read From LGAC FAIL!", Color.Green, ColorLog.Level.WARN)
@@ -447,33 +643,43 @@ class LGACPacketHandler:
             color_log.log(f"Something wrong in Write and read Aircon({e})", Color.Red, ColorLog.Level.CRITICAL)
             handle_max_read_error()
         finally:
-            await self.comm.close_async_socket()
             self.send_and_get_state = False
 
         return ret
 
+    def get_stats(self) -> dict:
+        return {
+            'persistent': self.persistent,
+            'transactions': self.transactions,
+            'connects': self.connects,
+            'connection_drops': self.connection_drops,
+            'response_msec': round(self.response_time * 1000, 2) if self.response_time is not None else None,
+            'guard_gap_msec': round(self.guard_gap() * 1000, 2),
+            'sweeps': self.sweeps,
+            'last_sweep_sec': round(self.last_sweep_sec, 3),
+            'units': {no: {k: round(v, 2) for k, v in unit.items()} for no, unit in self.unit_stats.items()},
+            'commands': self.commands,
+            'transactions_saved': self.transactions_saved,
+        }
+
     async def async_get_current_status(self, aircon_no: int) -> Aircon.Info | None:
-        aircon_cmd = Aircon.Info(PAYLOAD_STATUS, '', '', '', 25, 25)
+        aircon_cmd = self.STATUS_REQUEST
         color_log = ColorLog()
         color_log.log(f"Get Aircon Status : {aircon_no}", Color.Yellow, ColorLog.Level.DEBUG)
 
-        if not self.send_and_get_state:
-            aircon_info: Aircon.Info | None = await self.async_send_and_get_result(0, aircon_no, aircon_cmd)
-            if aircon_info:
-                color_log.log(f"Returned Get Aircon Status : {aircon_info.opmode})", Color.Yellow, ColorLog.Level.DEBUG)
-                if aircon_info.opmode == PAYLOAD_AUTO:
-                    aircon_info.action = PAYLOAD_ON
-                if aircon_info.fanmode == PAYLOAD_SILENT:
-                    aircon_info.fanmode = PAYLOAD_LOW
-                return aircon_info
+        aircon_info: Aircon.Info | None = await self.async_send_and_get_result(0, aircon_no, aircon_cmd)
+        if aircon_info:
+            color_log.log(f"Returned Get Aircon Status : {aircon_info.opmode})", Color.Yellow, ColorLog.Level.DEBUG)
+            if aircon_info.opmode == PAYLOAD_AUTO:
+                aircon_info.action = PAYLOAD_ON
+            if aircon_info.fanmode == PAYLOAD_SILENT:
+                aircon_info.fanmode = PAYLOAD_LOW
+            return aircon_info
         return None
 
     async def async_set_current_mode(self, aircon_no: int, aircon_cmd: Aircon.Info) -> Aircon.Info | None:
-        aircon_info: Aircon.Info | None = None
-
-        if not self.send_and_get_state:
-            aircon_info = await self.async_send_and_get_result(0, aircon_no, aircon_cmd)
-        return aircon_info
+        # waits for a running transaction instead of dropping the command.
+        return await self.async_send_and_get_result(0, aircon_no, aircon_cmd)
 
     async def async_scan_aircon_status(self, device_obj: Aircon):
         color_log = ColorLog()
@@ -486,21 +692,41 @@ class LGACPacketHandler:
             self.notify_to_homeassistant(device_obj.name, device_obj.room_name, aircon_info)
 
     async def async_scan_aircons(self, now: float):
+        '''
+        sweep all due units back to back on one connection, paced by guard_gap().
+        a command from HA may run between two units.
+        '''
         color_log = ColorLog()
-        for aircon in self.aircon:
+        due = [aircon for aircon in self.aircon if (now - aircon.scan.tick) > cfg.WALLPAD_SCAN_INTERVAL_TIME]
+        if len(due) == 0:
+            return
+        start = time.monotonic()
+        for aircon in due:
             assert isinstance(aircon, Aircon)
-            if (now - aircon.scan.tick) > cfg.WALLPAD_SCAN_INTERVAL_TIME:
-                aircon.scan.tick = now
-                color_log.log(f">>>>>Rescan {aircon} Check Sending!!!!", Color.Blue, ColorLog.Level.DEBUG)
-                await self.async_scan_aircon_status(aircon)
-                await asyncio.sleep(cfg.PACKET_RESEND_INTERVAL_SEC)
+            aircon.scan.tick = now
+            color_log.log(f">>>>>Rescan {aircon} Check Sending!!!!", Color.Blue, ColorLog.Level.DEBUG)
+            await self.async_scan_aircon_status(aircon)
+        self.last_sweep_sec = time.monotonic() - start
+        self.sweeps += 1
+        color_log.log(
+            "LGAC sweep: %d units in %.3f sec, guard gap %.3f sec",
+            Color.Blue,
+            ColorLog.Level.DEBUG,
+            len(due), self.last_sweep_sec, self.guard_gap()
+        )
 
     async def async_lgac_main_write_loop(self) -> None:
+        if self.command_event is None:
+            self.set_event_loop(asyncio.get_running_loop())
+        command_event = self.command_event
+        assert command_event is not None
         while True:
-            await asyncio.sleep(0.01)
-            if not self.command_queue.empty():
-                (aircon_no, room_str, aircon_cmd) = self.command_queue.get()
-                assert isinstance(aircon_cmd, Aircon.Info)
+            await command_event.wait()
+            # let the rest of the settings from the same HA action arrive.
+            await asyncio.sleep(cfg.LGAC_COALESCE_WINDOW_SEC)
+            command_event.clear()
+            pending, self.pending_commands = self.pending_commands, {}
+            for aircon_no, (room_str, aircon_cmd) in pending.items():
                 aircon_info = await self.async_set_current_mode(aircon_no, aircon_cmd)
                 if aircon_info:
                     self.notify_to_homeassistant(DEVICE_AIRCON, room_str, aircon_info)
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import time
 from typing import TYPE_CHECKING, Callable
 
 import paho.mqtt.client as pahomqtt
 
 import config as cfg
 from classes.appconf import MainConfig
+from classes.discoverycache import DiscoveryCache
+from classes.mqttasync import AsyncioMqttLoop
+from classes.offlinebuffer import OfflineBuffer
+from classes.publishcoalescer import PublishCoalescer
+from classes.stateencoder import StateEncoder
+from classes.topicrouter import CommandRoute, TopicRouter
 from classes.utils import Color, ColorLog
 from consts import (DEVICE_AIRCON, DEVICE_ELEVATOR, DEVICE_FAN, DEVICE_GAS,
                     DEVICE_LIGHT, DEVICE_PLUG, DEVICE_SENSOR,
@@ -24,12 +32,21 @@ from consts import (DEVICE_AIRCON, DEVICE_ELEVATOR, DEVICE_FAN, DEVICE_GAS,
 
 if TYPE_CHECKING:
     from classes.aircon import Aircon
+    from classes.statestore import StateStore
 
 
 class Discovery:
-    def __init__(self, pub, sub) -> None:
+    def __init__(self, pub, sub, router: TopicRouter | None = None) -> None:
         self.pub: list[dict] = pub
         self.sub: list[tuple[str, int]] = sub
+        self.router = router
+
+    def add_route(self, topic: str, device, room: str, sub_device: str = '') -> None:
+        if self.router is not None and device is not None:
+            self.router.add(topic, device, room, sub_device)
+
+    def get_single_device(self, enabled_device: list | None):
+        return enabled_device[0] if enabled_device else None
 
     def make_topic_and_payload_for_discovery(
         self, kind: str, room: str, device: str, icon_name: str
@@ -144,6 +161,9 @@ class Discovery:
         )
         self.sub.append((ha_topic, 0))
         self.sub.append((ha_payload[MQTT_CMD_T], 0))
+        self.add_route(
+            ha_payload[MQTT_CMD_T], self.get_single_device(enabled_device), DEVICE_WALLPAD, DEVICE_ELEVATOR
+        )
         if remove:
             self.pub.append({ha_topic: ''})
         else:
@@ -155,6 +175,9 @@ class Discovery:
         )
         self.sub.append((ha_topic, 0))
         self.sub.append((ha_payload[MQTT_CMD_T], 0))
+        self.add_route(
+            ha_payload[MQTT_CMD_T], self.get_single_device(enabled_device), DEVICE_WALLPAD, DEVICE_GAS
+        )
         if remove:
             self.pub.append({ha_topic: ''})
         else:
@@ -172,6 +195,9 @@ class Discovery:
         )
         self.sub.append((ha_topic, 0))
 #        self.sub.append((ha_payload[MQTT_CMD_T], 0))
+        fan = self.get_single_device(enabled_device)
+        self.add_route(ha_payload[MQTT_CMD_T], fan, DEVICE_WALLPAD)
+        self.add_route(ha_payload['percentage_command_topic'], fan, DEVICE_WALLPAD)
         if remove:
             self.pub.append({ha_topic: ''})
         else:
@@ -202,6 +228,8 @@ class Discovery:
                     self.sub.append((ha_topic, 0))
                     self.sub.append((ha_payload[f'{MQTT_MODE}_{MQTT_CMD_T}'], 0))
                     self.sub.append((ha_payload[f'{MQTT_TEMP}_{MQTT_CMD_T}'], 0))
+                    self.add_route(ha_payload[f'{MQTT_MODE}_{MQTT_CMD_T}'], room_thermostats, room_name)
+                    self.add_route(ha_payload[f'{MQTT_TEMP}_{MQTT_CMD_T}'], room_thermostats, room_name)
                     if remove:
                         self.pub.append({ha_topic: ''})
                     else:
@@ -223,6 +251,8 @@ class Discovery:
                     self.sub.append((ha_payload[f'{MQTT_TEMP}_{MQTT_CMD_T}'], 0))
                     self.sub.append((ha_payload[f'{MQTT_FAN_MODE}_{MQTT_CMD_T}'], 0))
                     self.sub.append((ha_payload[f'{MQTT_SWING_MODE}_{MQTT_CMD_T}'], 0))
+                    for cmd in (MQTT_MODE, MQTT_TEMP, MQTT_FAN_MODE, MQTT_SWING_MODE):
+                        self.add_route(ha_payload[f'{cmd}_{MQTT_CMD_T}'], room_aircon, room_name)
                     if remove:
                         self.pub.append({ha_topic: ''})
                     else:
@@ -243,6 +273,7 @@ class Discovery:
 
                         self.sub.append((ha_topic, 0))
                         self.sub.append((ha_payload[MQTT_CMD_T], 0))
+                        self.add_route(ha_payload[MQTT_CMD_T], room_lights, room_name, light_name)
                         if remove:
                             self.pub.append({ha_topic: ''})
                         else:
@@ -262,6 +293,7 @@ class Discovery:
                         )
                         self.sub.append((ha_topic, 0))
                         self.sub.append((ha_payload[MQTT_CMD_T], 0))
+                        self.add_route(ha_payload[MQTT_CMD_T], room_plugs, room_name, plug_name)
                         if remove:
                             self.pub.append({ha_topic: ''})
                         else:
@@ -269,11 +301,11 @@ class Discovery:
 
     def make_discovery_list(self, dev_name: DeviceType, enabled_device: list, remove: bool) -> None:
         if dev_name == DeviceType.ELEVATOR:
-            self.discovery_elevator(remove)
+            self.discovery_elevator(remove, enabled_device)
         elif dev_name == DeviceType.GAS:
-            self.discovery_gas(remove)
+            self.discovery_gas(remove, enabled_device)
         elif dev_name == DeviceType.FAN:
-            self.discovery_fan(remove)
+            self.discovery_fan(remove, enabled_device)
             self.discovery_fan_sensor(remove)
         elif dev_name == DeviceType.LIGHT:
             self.discovery_light(remove, enabled_device)
@@ -286,6 +318,17 @@ class Discovery:
 
 
 class MqttHandler:
+    HA_DEVICE_STRINGS = {
+        DEVICE_ELEVATOR: cfg.HA_SWITCH,
+        DEVICE_PLUG: cfg.HA_SWITCH,
+        DEVICE_THERMOSTAT: cfg.HA_CLIMATE,
+        DEVICE_AIRCON: cfg.HA_CLIMATE,
+        DEVICE_LIGHT: cfg.HA_LIGHT,
+        DEVICE_FAN: cfg.HA_FAN,
+        DEVICE_GAS: cfg.HA_GAS,
+        DEVICE_SENSOR: cfg.HA_SENSOR,
+    }
+
     def __init__(self, config: MainConfig) -> None:
         self.server                                 = config.mqtt_server
         self.port                                   = int(config.mqtt_port)
@@ -298,6 +341,29 @@ class MqttHandler:
         self.subscribe_list: list[tuple[str, int]]  = []
         self.publish_list: list[dict]               = []
         self.ignore_handling: bool                  = False
+        self.stats_providers: dict[str, Callable[[], dict]] = {}
+        self.state_store: StateStore | None         = None
+        # exact command topic -> device and handler. filled by homeassistant_device_discovery().
+        self.topic_router                           = TopicRouter()
+        self.discovery_cache                        = DiscoveryCache(cfg.HA_DISCOVERY_ECHO_WAIT_SEC)
+        self.publish_coalescer                      = PublishCoalescer(
+            self.publish_state, cfg.STATE_COALESCE_WINDOW_SEC
+        )
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.asyncio_loop: AsyncioMqttLoop | None   = None
+        # (device, room) -> state topics. see get_state_topics().
+        self.state_topics: dict[tuple[str, str], tuple[str, ...]] = {}
+        self.state_encoder                          = StateEncoder(cfg.STATE_USE_ORJSON)
+        # True once the states held while disconnected were replayed. loop thread only.
+        self.online                                 = False
+        self.offline_buffer                         = OfflineBuffer(cfg.MQTT_OFFLINE_BUFFER_TOPICS)
+
+    def set_event_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        '''
+        state publishes are coalesced in this loop. with MQTT_ASYNCIO_LOOP the client runs in it too.
+        '''
+        self.loop = loop
+        self.publish_coalescer.set_event_loop(loop)
 
     def set_enabled_list(self, enabled_list: list):
         self.enabled_list = enabled_list
@@ -308,9 +374,28 @@ class MqttHandler:
     def set_aircon_mqtt_handler(self, handle_aircon_mqtt_message):
         self.aircon_mqtt_handler: Callable[[list[str], str], None] = handle_aircon_mqtt_message
 
+    def set_command_handlers(self, handlers: dict[DeviceType, Callable[[CommandRoute, str], None]]):
+        self.topic_router.set_handlers(handlers)
+
     def set_reconnect_action(self, reconnect_action):
         self.reconnect_action: Callable[[], None] = reconnect_action
 
+    def set_state_store(self, state_store: StateStore):
+        self.state_store = state_store
+
+    def add_stats_provider(self, name: str, provider: Callable[[], dict]):
+        self.stats_providers[name] = provider
+
+    def publish_stats(self) -> None:
+        '''
+        log counters of all stats providers and publish them to rs485/stats. call in the loop thread.
+        '''
+        color_log = ColorLog()
+        stats = {name: provider() for name, provider in self.stats_providers.items()}
+        color_log.log(f"[Stats] {stats}", Color.Cyan)
+        if self.mqtt_client:
+            self.mqtt_client.publish(f'{cfg.HA_CALLBACK_MAIN}/{cfg.HA_CALLBACK_STATS}', json.dumps(stats))
+
     def set_ignore_handling(self):
         self.ignore_handling = True
 
@@ -324,6 +409,7 @@ class MqttHandler:
         # self.mqtt_client.on_publish = self.on_publish
         self.mqtt_client.on_subscribe = self.on_subscribe
         self.mqtt_client.on_connect = self.on_connect
+        self.mqtt_client.on_disconnect = self.on_disconnect
 
         if not is_anonymous:
             username = self.id
@@ -339,12 +425,21 @@ class MqttHandler:
             color_log.log(f"{cfg.CONF_MQTT} Configuration: [{server}:{port}]")
 
         color_log.log("Connectting MQTT...", Color.Yellow)
-        self.mqtt_client.connect(server, port, 60)
-        self.mqtt_client.loop_start()
+        if cfg.MQTT_ASYNCIO_LOOP and self.loop is not None:
+            # socket callbacks must be set before connect() opens the socket.
+            self.asyncio_loop = AsyncioMqttLoop(self.mqtt_client, self.loop, cfg.MQTT_RECONNECT_DELAY_SEC)
+            self.mqtt_client.connect(server, port, 60)
+        else:
+            self.mqtt_client.connect(server, port, 60)
+            self.mqtt_client.loop_start()
 
     def cleanup(self) -> None:
+        self.publish_coalescer.flush()
         if self.mqtt_client:
-            self.mqtt_client.loop_stop()
+            if self.asyncio_loop is not None:
+                self.asyncio_loop.stop()
+            else:
+                self.mqtt_client.loop_stop()
             self.mqtt_client.disconnect()
         self.mqtt_connect_error = True
 
@@ -359,92 +454,152 @@ class MqttHandler:
             color_log.log("This topic is for HA CONFIGURATION. Not ME.!", Color.Green, ColorLog.Level.DEBUG)
             return
 
+        self.topic_router.unrouted += 1
         if topic[0] == cfg.CONF_AIRCON_DEVICE_NAME:
             self.aircon_mqtt_handler(topic, payload)
         else:
             self.kocom_mqtt_handler(topic, payload)
 
     def homeassistant_device_discovery(self, initial: bool = False, remove: bool = False) -> None:
-
-        self.subscribe_list = []
-        self.subscribe_list.append((cfg.HA_CALLBACK_MAIN + '/' + cfg.HA_CALLBACK_BRIDGE + '/#', 0))
-        self.publish_list = []
-
+        '''
+        configs are made once. later calls (HA restart, MQTT reconnect) let sync_discovery()
+        publish only the configs the broker lost or holds in an other version.
+        '''
         color_log = ColorLog()
-        color_log.log("** Starting Devices Discovery.", Color.Yellow)
-        discovery = Discovery(self.publish_list, self.subscribe_list)
+        if remove or not self.discovery_cache.documents:
+            self.subscribe_list = []
+            self.subscribe_list.append((cfg.HA_CALLBACK_MAIN + '/' + cfg.HA_CALLBACK_BRIDGE + '/#', 0))
+            self.publish_list = []
+
+            color_log.log("** Starting Devices Discovery.", Color.Yellow)
+            discovery = Discovery(self.publish_list, self.subscribe_list, self.topic_router)
 
-        color_log.log(f"enabled list = [{self.enabled_list}]", Color.White, ColorLog.Level.DEBUG)
-        for dev_name, enabled_device in self.enabled_list:
-            color_log.log(f"dev_name = {dev_name}, device = {enabled_device}", Color.White, ColorLog.Level.DEBUG)
-            discovery.make_discovery_list(DeviceType(dev_name), enabled_device, remove)
+            color_log.log(f"enabled list = [{self.enabled_list}]", Color.White, ColorLog.Level.DEBUG)
+            for dev_name, enabled_device in self.enabled_list:
+                color_log.log(f"dev_name = {dev_name}, device = {enabled_device}", Color.White, ColorLog.Level.DEBUG)
+                discovery.make_discovery_list(DeviceType(dev_name), enabled_device, remove)
+            if not remove:
+                self.discovery_cache.set_documents(self.publish_list)
 
         if self.mqtt_client:
             if initial:
+                if not remove:
+                    # the broker sends its retained configs for the subscription. publish after they came.
+                    self.discovery_cache.expect_echo(time.monotonic())
                 self.mqtt_client.subscribe(self.subscribe_list)
-            for ha in self.publish_list:
-                for topic, payload in ha.items():
-                    self.mqtt_client.publish(topic, payload)
+            if remove:
+                for ha in self.publish_list:
+                    for topic, payload in ha.items():
+                        self.publish_discovery(topic, payload)
+            elif not initial:
+                self.discovery_cache.request_sync(time.monotonic())
 
         if self.start_discovery:
             self.start_discovery = False
 
+        # HA (or the broker) may have lost states along with discovery. so, send all again.
+        # after a reconnect the offline buffer has sent the states changed meanwhile.
+        if self.state_store is not None and (not initial or self.offline_buffer.limit <= 0):
+            self.state_store.request_refresh()
+
+    def publish_discovery(self, topic: str, payload: str) -> None:
+        if self.mqtt_client:
+            self.mqtt_client.publish(topic, payload, retain=True)
+            self.discovery_cache.mark_published(topic, payload)
+
+    def sync_discovery(self, now: float) -> None:
+        count = self.discovery_cache.sync(self.publish_discovery, now)
+        if count:
+            color_log = ColorLog()
+            color_log.log(f"Published {count} discovery configs.", Color.Yellow)
+            # new entities have no state yet.
+            if self.state_store is not None:
+                self.state_store.request_refresh()
+
     def make_topic_string(self, prefix: str, main: str, sub: str, item: str, postfix: str | None = None) -> str:
         if postfix is None:
             return f'{prefix}/{main}/{sub}/{item}'
         return f'{prefix}/{main}/{sub}_{postfix}/{item}'
 
-    def send_state_to_homeassistant(self, device: str, room: str, value: dict) -> None:
-        color_log = ColorLog()
-
-        def get_ha_device_string(device: str):
-            if device in [DEVICE_ELEVATOR, DEVICE_PLUG]:
-                return cfg.HA_SWITCH
-            elif device in [DEVICE_THERMOSTAT, DEVICE_AIRCON]:
-                return cfg.HA_CLIMATE
-            elif device == DEVICE_LIGHT:
-                return cfg.HA_LIGHT
-            elif device == DEVICE_FAN:
-                return cfg.HA_FAN
-            elif device == DEVICE_GAS:
-                return cfg.HA_GAS
-            elif device == DEVICE_SENSOR:
-                return cfg.HA_SENSOR
-            else:
+    def get_state_topics(self, device: str, room: str) -> tuple[str, ...]:
+        '''
+        state topics of a device, made once per (device, room).
+        '''
+        topics = self.state_topics.get((device, room))
+        if topics is not None:
+            return topics
+        if device == DEVICE_GAS:
+            # gas state send to item sensor and switch - KKS
+            topics = (
+                self.make_topic_string(cfg.HA_PREFIX, cfg.HA_SENSOR, room, PAYLOAD_STATE, DEVICE_GAS),
+                self.make_topic_string(cfg.HA_PREFIX, cfg.HA_SWITCH, room, PAYLOAD_STATE, DEVICE_GAS),
+            )
+        else:
+            # others only send one - KKS
+            ha_device = self.HA_DEVICE_STRINGS.get(device)
+            if ha_device is None:
+                color_log = ColorLog()
                 color_log.log(f"Wrong device matching to HA = [{device}]", Color.Red, ColorLog.Level.DEBUG)
-                return
-
-        color_log.log(f"Trying to send states to HA : d=[{device}], v=[{value}]", Color.Magenta, ColorLog.Level.DEBUG)
-
-        if self.mqtt_client:
-            v_value = json.dumps(value)
-
-            if device == DEVICE_GAS:
-                # gas state send to item sensor and switch - KKS
-                topic = self.make_topic_string(cfg.HA_PREFIX, cfg.HA_SENSOR, room, PAYLOAD_STATE, DEVICE_GAS)
-                self.mqtt_client.publish(topic, v_value)
-                topic = self.make_topic_string(cfg.HA_PREFIX, cfg.HA_SWITCH, room, PAYLOAD_STATE, DEVICE_GAS)
+                topics = ()
             else:
-                # others only send one - KKS
-                ha_device = get_ha_device_string(device)
-                if ha_device is not None:
-                    if device == DEVICE_AIRCON:
-                        prefix = cfg.CONF_AIRCON_DEVICE_NAME
-                    else:
-                        prefix = cfg.HA_PREFIX
-                    if ha_device == cfg.HA_SENSOR:
-                        topic = self.make_topic_string(prefix, ha_device, DEVICE_WALLPAD, PAYLOAD_STATE, DEVICE_SENSOR)
-                    else:
-                        topic = self.make_topic_string(prefix, ha_device, room, PAYLOAD_STATE)
+                prefix = cfg.CONF_AIRCON_DEVICE_NAME if device == DEVICE_AIRCON else cfg.HA_PREFIX
+                if ha_device == cfg.HA_SENSOR:
+                    topic = self.make_topic_string(prefix, ha_device, DEVICE_WALLPAD, PAYLOAD_STATE, DEVICE_SENSOR)
                 else:
-                    topic = None
+                    topic = self.make_topic_string(prefix, ha_device, room, PAYLOAD_STATE)
+                topics = (topic,)
+        self.state_topics[(device, room)] = topics
+        return topics
 
-            if topic is not None:
-                self.mqtt_client.publish(topic, v_value)
-                color_log.log(f"[To HA]{topic} = {v_value}", Color.White, ColorLog.Level.DEBUG)
+    def send_state_to_homeassistant(self, device: str, room: str, value: dict) -> None:
+        color_log = ColorLog()
+        color_log.log(
+            "Trying to send states to HA : d=[%s], v=[%s]", Color.Magenta, ColorLog.Level.DEBUG, device, value
+        )
+
+        if self.mqtt_client:
+            topics = self.get_state_topics(device, room)
+            if not topics:
+                return
+            v_value = self.state_encoder.encode(value)
+            for topic in topics:
+                self.publish_coalescer.submit(topic, v_value)
+                color_log.log("[To HA]%s = %s", Color.White, ColorLog.Level.DEBUG, topic, v_value)
         else:
             color_log.log("MQTT handle is invalid!", Color.Red, ColorLog.Level.CRITICAL)
 
+    def publish_state(self, topic: str, payload: str | bytes) -> None:
+        if not self.mqtt_client:
+            return
+        if self.offline_buffer.limit <= 0:
+            self.mqtt_client.publish(topic, payload)
+        elif not self.online:
+            self.offline_buffer.hold(topic, payload)
+        else:
+            self.publish_or_hold(topic, payload)
+
+    def publish_or_hold(self, topic: str, payload: str | bytes) -> None:
+        if self.mqtt_client.publish(topic, payload).rc == pahomqtt.MQTT_ERR_NO_CONN:
+            # connection lost, on_disconnect not called yet
+            self.offline_buffer.hold(topic, payload)
+
+    def replay_offline_states(self) -> None:
+        '''
+        states held while disconnected go out in one go, before any newer state can.
+        '''
+        if not self.mqtt_client or not self.mqtt_client.is_connected():
+            return
+        count = self.offline_buffer.replay(self.publish_or_hold)
+        self.online = True
+        if count:
+            color_log = ColorLog()
+            color_log.log(f"[MQTT] replayed {count} states held while disconnected.", Color.Yellow)
+        if self.offline_buffer.overflowed:
+            # some states were dropped. send all of them.
+            self.offline_buffer.overflowed = False
+            if self.state_store is not None:
+                self.state_store.request_refresh()
+
     def change_aircon_status(self, dev_str: str, room_str: str, aircon_info: Aircon.Info):
         color_log = ColorLog()
         if aircon_info.action in [PAYLOAD_OFF, PAYLOAD_LOCKOFF]:
@@ -461,14 +616,17 @@ class MqttHandler:
         else:
             swing = PAYLOAD_OFF
         value = {
-            f'{MQTT_MODE}': f'{mode}',
-            f'{MQTT_SWING_MODE}': f'{swing}',
-            f'{MQTT_FAN_MODE}': f'{aircon_info.fanmode}',
-            f'{MQTT_CURRENT_TEMP}': f'{aircon_info.cur_temp:.2f}',
-            f'{MQTT_TARGET_TEMP}': f'{aircon_info.target_temp}'
+            MQTT_MODE: f'{mode}',
+            MQTT_SWING_MODE: swing,
+            MQTT_FAN_MODE: f'{aircon_info.fanmode}',
+            MQTT_CURRENT_TEMP: f'{aircon_info.cur_temp:.2f}',
+            MQTT_TARGET_TEMP: f'{aircon_info.target_temp}'
         }
-        color_log.log(f"new aircon status = [{value}]", Color.White, ColorLog.Level.DEBUG)
-        self.send_state_to_homeassistant(dev_str, room_str, value)
+        color_log.log("new aircon status = [%s]", Color.White, ColorLog.Level.DEBUG, value)
+        if self.state_store is not None:
+            self.state_store.update(dev_str, room_str, value)
+        else:
+            self.send_state_to_homeassistant(dev_str, room_str, value)
 
     def on_publish(self, client, obj, mid):
         color_log = ColorLog()
@@ -483,6 +641,11 @@ class MqttHandler:
         if int(rc) == 0:
             color_log.log("[MQTT] connected OK", Color.Yellow)
             self.start_discovery = True
+            # replay in the loop thread, where states are published.
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.replay_offline_states)
+            else:
+                self.replay_offline_states()
             return
         elif int(rc) == 1:
             color_log.log("[MQTT] 1: Connection refused – incorrect protocol version", Color.Red)
@@ -498,11 +661,21 @@ class MqttHandler:
             color_log.log(f"[MQTT] {rc} : Connection refused", Color.Red)
         self.mqtt_connect_error = True
 
+    def on_disconnect(self, client, userdata, rc):
+        self.online = False
+        if int(rc) != 0:
+            color_log = ColorLog()
+            color_log.log(f"[MQTT] disconnected ({rc}). states are held until reconnect.", Color.Red)
+
     # handle message form homeassistant through mqtt
     def on_message(self, client, obj, msg: pahomqtt.MQTTMessage):
         if not self.ignore_handling:
-            rcv_topic = msg.topic.split('/')
             rcv_payload = msg.payload.decode()
+            if not self.start_discovery and self.topic_router.dispatch(msg.topic, rcv_payload):
+                return
+            if self.discovery_cache.observe(msg.topic, rcv_payload):
+                return
+            rcv_topic = msg.topic.split('/')
 
             color_log = ColorLog()
             if (
@@ -530,6 +703,13 @@ class MqttHandler:
                 elif rcv_topic[3] == 'check_alive':
                     color_log.log("[From HA]Handler(hacollector) is alive!", Color.Blue)
                     return
+                elif rcv_topic[3] == cfg.HA_CALLBACK_STATS:
+                    # the counters are changed in the loop thread. read them there, not in paho's thread.
+                    if self.loop is not None:
+                        self.loop.call_soon_threadsafe(self.publish_stats)
+                    else:
+                        self.publish_stats()
+                    return
             elif not self.start_discovery:
                 self.handle_message_from_mqtt(rcv_topic, rcv_payload)
                 return
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+
+import paho.mqtt.client as pahomqtt
+
+from classes.utils import Color, ColorLog
+
+
+class AsyncioMqttLoop:
+    '''
+    runs a paho client on an asyncio loop instead of the network thread of loop_start().
+
+    paho tells through its socket callbacks which socket to watch. reads and writes are done
+    by loop readers and writers, keepalive by a task that calls loop_misc(). so on_message and
+    every handler behind it run in the loop thread, like the RS485 handlers.
+
+    a lost connection is made again every reconnect_delay seconds. the (blocking) connect runs
+    in the default executor, its socket callbacks are handed back to the loop.
+    '''
+    MISC_INTERVAL_SEC = 1.
+
+    def __init__(self, client: pahomqtt.Client, loop: asyncio.AbstractEventLoop, reconnect_delay: float) -> None:
+        self.client                             = client
+        self.loop                               = loop
+        self.reconnect_delay                    = reconnect_delay
+        self.misc_task: asyncio.Task | None     = None
+        self.stopping                           = False
+        self.reconnects                         = 0
+        client.on_socket_open                   = self.on_socket_open
+        client.on_socket_close                  = self.on_socket_close
+        client.on_socket_register_write         = self.on_socket_register_write
+        client.on_socket_unregister_write       = self.on_socket_unregister_write
+
+    def call_in_loop(self, callback, *args) -> None:
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def watch(self, sock) -> None:
+        self.loop.add_reader(sock, self.client.loop_read)
+        if self.misc_task is None:
+            self.misc_task = self.loop.create_task(self.async_misc_loop())
+
+    def unwatch(self, sock) -> None:
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+
+    def on_socket_open(self, client, userdata, sock) -> None:
+        self.call_in_loop(self.watch, sock)
+
+    def on_socket_close(self, client, userdata, sock) -> None:
+        self.call_in_loop(self.unwatch, sock)
+
+    def on_socket_register_write(self, client, userdata, sock) -> None:
+        self.call_in_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock) -> None:
+        self.call_in_loop(self.loop.remove_writer, sock)
+
+    async def async_misc_loop(self) -> None:
+        color_log = ColorLog()
+        while not self.stopping:
+            await asyncio.sleep(self.MISC_INTERVAL_SEC)
+            if self.client.loop_misc() != pahomqtt.MQTT_ERR_NO_CONN or self.stopping:
+                continue
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                await self.loop.run_in_executor(None, self.client.reconnect)
+                self.reconnects += 1
+            except Exception as e:
+                color_log.log(f"[MQTT] reconnect failed ({e})", Color.Red, ColorLog.Level.WARN)
+
+    def stop(self) -> None:
+        '''
+        paho writes in the caller from now on, so what is queued and a disconnect() go out
+        even if the loop does not run again.
+        '''
+        self.stopping = True
+        if self.misc_task is not None:
+            self.misc_task.cancel()
+            self.misc_task = None
+        self.client.on_socket_register_write    = None
+        self.client.on_socket_unregister_write  = None
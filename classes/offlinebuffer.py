@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+
+class OfflineBuffer:
+    '''
+    state publishes made while the broker is not connected, only the latest payload of each
+    topic. replay() sends them all at once when the connection is back.
+
+    at most limit topics are held. when a new topic does not fit, the topic updated longest
+    ago is dropped and overflowed is set, then only a full state refresh makes HA right.
+    loop thread only.
+    '''
+    def __init__(self, limit: int) -> None:
+        self.limit                                  = limit
+        # topic -> payload, in order of the last update
+        self.held: dict[str, str | bytes]           = {}
+        self.overflowed                             = False
+        self.holds                                  = 0
+        self.replaced                               = 0
+        self.dropped                                = 0
+        self.replays                                = 0
+        self.replayed                               = 0
+        self.last_replay                            = 0
+        self.last_replay_msec                       = 0.
+
+    def hold(self, topic: str, payload: str | bytes) -> None:
+        self.holds += 1
+        if self.held.pop(topic, None) is not None:
+            self.replaced += 1
+        elif len(self.held) >= self.limit:
+            del self.held[next(iter(self.held))]
+            self.dropped += 1
+            self.overflowed = True
+        self.held[topic] = payload
+
+    def replay(self, publish: Callable[[str, str | bytes], None]) -> int:
+        '''
+        publish everything held, oldest update first. returns the number published.
+        '''
+        held, self.held = self.held, {}
+        if not held:
+            return 0
+        start = time.perf_counter()
+        for topic, payload in held.items():
+            publish(topic, payload)
+        self.replays += 1
+        self.replayed += len(held)
+        self.last_replay = len(held)
+        self.last_replay_msec = (time.perf_counter() - start) * 1000
+        return len(held)
+
+    def get_stats(self) -> dict:
+        return {
+            'held': len(self.held),
+            'holds': self.holds,
+            'replaced': self.replaced,
+            'dropped': self.dropped,
+            'replays': self.replays,
+            'replayed': self.replayed,
+            'last_replay': self.last_replay,
+            'last_replay_msec': round(self.last_replay_msec, 3),
+        }
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from classes.basicdevice import Device, SwitchInput
-from classes.utils import Color, ColorLog
+from classes.utils import Color, ColorLog, LazyHex
 from consts import (DEVICE_PLUG, PAYLOAD_ON, Command, DeviceType, State,
                     SwitchState)
 
@@ -23,15 +23,11 @@ class Plug(Device):
         self.plug_list.append(SwitchState(itemname, list([state])))
 
     def make_rs485_packet(self, cmd: Command) -> bytes:
-        new_packet = Device.PacketStruct()
         color_log = ColorLog()
 
-        if not self.make_device_basic_info(new_packet, self.device, DeviceType.WALLPAD, cmd, self.room_name):
-            color_log.log(f"Error in make {self.device} packet!", Color.Red, ColorLog.Level.WARN)
-
+        value = 0
         if cmd != Command.CHECK:
             try:
-                new_packet.value_array = 0
                 for switch_state in self.plug_list:
                     plug_num = int(switch_state.name.lstrip(DEVICE_PLUG))
                     if plug_num == 0:      # 0 is special meaning for all plug
@@ -44,14 +40,14 @@ class Plug(Device):
                     if switch_state.statelist[0] == State.ON:
                         pad = 0xff
                         pad = pad << (8 - plug_num) * 8
-                        new_packet.value_array |= pad
-                color_log.log(f"Plugs Set Data = [{new_packet.value_array:016x}]", Color.White, ColorLog.Level.DEBUG)
+                        value |= pad
+                color_log.log("Plugs Set Data = [%016x]", Color.White, ColorLog.Level.DEBUG, value)
             except Exception as e:
                 color_log.log(f"[Make Packet] Error({e}) on DeviceType.LIGHT", Color.White, ColorLog.Level.DEBUG)
 
-        packet = new_packet.get_full_bytes_packet()
+        packet = self.make_frame(self.device, DeviceType.WALLPAD, cmd, value, self.room_name)
 
-        color_log.log(f"[Packet made - light] = {packet.hex()}", Color.White, ColorLog.Level.DEBUG)
+        color_log.log("[Packet made - light] = %s", Color.White, ColorLog.Level.DEBUG, LazyHex(packet))
         return packet
 
     def handle_mqtt(self, payload: str, sub_device_str: str, room_str: str) -> None:
@@ -67,15 +63,19 @@ class Plug(Device):
                 break
 
     class PlugInput(SwitchInput):
+        __slots__ = ()
+
         def __init__(self) -> None:
             super().__init__()
 
+    # plug0 is all plugs, plug1.. are the plugs of a room (up to 8, one per value byte).
+    SWITCH_NAMES = tuple(DEVICE_PLUG + str(i) for i in range(9))
+
     def parse(self, value_p: bytes, room_no: int) -> dict:
         on_count = 0
 
         counts = 0
         switch = self.PlugInput()
-        device_name = DEVICE_PLUG
         room_name = self.parse_kocom_room(f'{room_no:02d}')
         counts = self.parse_kocom_plug_size(room_name)
 
@@ -86,8 +86,8 @@ class Plug(Device):
                 on_count += 1
             else:
                 state = State.OFF
-            switch.add_switch(device_name + str(i + 1), state)
+            switch.add_switch(self.SWITCH_NAMES[i + 1], state)
 
         all_switch_state = State.ON if on_count > 0 else State.OFF
-        switch.add_switch(device_name + str('0'), all_switch_state)
+        switch.add_switch(self.SWITCH_NAMES[0], all_switch_state)
         return switch.make_dict_data()
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Callable
+
+
+class PublishCoalescer:
+    '''
+    state publishes held for window seconds, one payload per topic: a newer payload of a
+    topic replaces the held one. the first held publish starts the window, and when it
+    ends everything held goes to publish in one batch.
+
+    without a loop (or window <= 0) every publish goes out at once. loop thread only.
+    '''
+    def __init__(self, publish: Callable[[str, str | bytes], None], window: float) -> None:
+        self.publish                                    = publish
+        self.window                                     = window
+        self.loop: asyncio.AbstractEventLoop | None     = None
+        self.pending: dict[str, str | bytes]            = {}
+        self.flush_handle: asyncio.TimerHandle | None   = None
+        self.submitted                                  = 0
+        self.published                                  = 0
+        self.coalesced                                  = 0
+        self.batches                                    = 0
+        self.last_batch                                 = 0
+
+    def set_event_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+
+    def submit(self, topic: str, payload: str | bytes) -> None:
+        self.submitted += 1
+        if self.loop is None or self.window <= 0:
+            self.published += 1
+            self.publish(topic, payload)
+            return
+        if topic in self.pending:
+            self.coalesced += 1
+        self.pending[topic] = payload
+        if self.flush_handle is None:
+            self.flush_handle = self.loop.call_later(self.window, self.flush)
+
+    def flush(self) -> None:
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        self.batches += 1
+        self.last_batch = len(pending)
+        self.published += len(pending)
+        for topic, payload in pending.items():
+            self.publish(topic, payload)
+
+    def get_stats(self) -> dict:
+        return {
+            'submitted': self.submitted,
+            'published': self.published,
+            'coalesced': self.coalesced,
+            'batches': self.batches,
+            'last_batch': self.last_batch,
+            'per_batch': round(self.published / self.batches, 2) if self.batches else 0.,
+        }
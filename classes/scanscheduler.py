@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+
+
+class ScanScheduler:
+    '''
+    next CHECK time of every device in a heap, so a tick only looks at the earliest one.
+
+    each device has its own interval. it is halved when a new state is seen and grows
+    by GROW_FACTOR when a whole interval passed without a change, between min_interval
+    and max_interval. any status frame of a device (answer or unsolicited) makes it
+    fresh, so its next CHECK is pushed back by one interval.
+    '''
+    GROW_FACTOR     = 1.5
+    SHRINK_FACTOR   = 0.5
+
+    def __init__(self, interval: float, min_interval: float, max_interval: float) -> None:
+        self.base_interval                      = interval
+        self.min_interval                       = min(min_interval, interval)
+        self.max_interval                       = max(max_interval, interval)
+        # (due, sequence, key). an entry is stale when its due differs from self.due[key].
+        self.heap: list[tuple[float, int, str]] = []
+        self.sequence                           = itertools.count()
+        self.due: dict[str, float]              = {}
+        self.interval: dict[str, float]         = {}
+        self.changed: set[str]                  = set()
+        self.checking: set[str]                 = set()
+        self.checks                             = 0
+        self.answers                            = 0
+        self.unsolicited                        = 0
+
+    def add(self, key: str, due: float = 0.) -> None:
+        self.interval[key] = self.base_interval
+        # unknown state counts as changed, so the first CHECK keeps the base interval.
+        self.changed.add(key)
+        self.schedule(key, due)
+
+    def schedule(self, key: str, due: float) -> None:
+        self.due[key] = due
+        heapq.heappush(self.heap, (due, next(self.sequence), key))
+        if len(self.heap) > 4 * len(self.due) + 16:
+            # frequent unsolicited frames leave stale entries behind. drop them all at once.
+            self.heap = [(d, next(self.sequence), k) for k, d in self.due.items()]
+            heapq.heapify(self.heap)
+
+    def next_due(self) -> float | None:
+        while self.heap:
+            due, _, key = self.heap[0]
+            if self.due.get(key) == due:
+                return due
+            heapq.heappop(self.heap)
+        return None
+
+    def pop_due(self, now: float) -> list[str]:
+        '''
+        devices to CHECK now. they are scheduled again one (adapted) interval later.
+        '''
+        due_keys = []
+        while True:
+            due = self.next_due()
+            if due is None or due > now:
+                break
+            _, _, key = heapq.heappop(self.heap)
+            if key not in self.changed:
+                self.interval[key] = min(self.max_interval, self.interval[key] * self.GROW_FACTOR)
+            self.changed.discard(key)
+            self.checking.add(key)
+            self.schedule(key, now + self.interval[key])
+            due_keys.append(key)
+        self.checks += len(due_keys)
+        return due_keys
+
+    def observe(self, key: str, changed: bool, now: float) -> None:
+        '''
+        a status frame of key was received. changed is True if it carried a new state.
+        '''
+        if key not in self.due:
+            return
+        if key in self.checking:
+            self.checking.discard(key)
+            self.answers += 1
+        else:
+            self.unsolicited += 1
+        if changed:
+            self.interval[key] = max(self.min_interval, self.interval[key] * self.SHRINK_FACTOR)
+            self.changed.add(key)
+        self.schedule(key, now + self.interval[key])
+
+    def expire(self, now: float) -> None:
+        '''
+        every device is due at now, e.g. frames may have been missed while the link was down.
+        '''
+        for key in list(self.due):
+            self.schedule(key, now)
+
+    def get_stats(self) -> dict:
+        return {
+            'devices': len(self.due),
+            'checks': self.checks,
+            'answers': self.answers,
+            'unsolicited': self.unsolicited,
+            'intervals': {key: round(interval, 1) for key, interval in self.interval.items()},
+        }
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StateEncoder:
+    '''
+    JSON of the small, fixed shape state dicts (switches, thermostat, fan, aircon, ..).
+
+    orjson does it when asked and installed (compact separators, HA reads both). otherwise every shape
+    (tuple of keys) gets a format string at its first dict and only the values are filled
+    in, the same text as json.dumps. string values are few (on, off, heat, ..) so their
+    JSON is kept. values other than str and int go through json.dumps.
+    '''
+    MAX_STRINGS = 1024
+
+    def __init__(self, use_orjson: bool = False) -> None:
+        self.use_orjson                         = use_orjson and orjson is not None
+        # (key, ...) -> '{"key": %s, ...}'
+        self.formats: dict[tuple, str]          = {}
+        self.strings: dict[str, str]            = {}
+
+    def make_format(self, keys: tuple) -> str:
+        items = ', '.join(json.dumps(key).replace('%', '%%') + ': %s' for key in keys)
+        text = '{' + items + '}'
+        self.formats[keys] = text
+        return text
+
+    def encode_value(self, item) -> str:
+        kind = type(item)
+        if kind is str:
+            text = self.strings.get(item)
+            if text is None:
+                text = json.dumps(item)
+                if len(self.strings) < self.MAX_STRINGS:
+                    self.strings[item] = text
+            return text
+        if kind is int:
+            return int.__repr__(item)
+        return json.dumps(item)
+
+    def encode(self, value: dict) -> str | bytes:
+        if self.use_orjson:
+            return orjson.dumps(value)
+        keys = tuple(value)
+        text = self.formats.get(keys)
+        if text is None:
+            if not all(type(key) is str for key in keys):
+                return json.dumps(value)
+            text = self.make_format(keys)
+        return text % tuple(map(self.encode_value, value.values()))
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+from classes.utils import Color, ColorLog
+
+
+class StateStore:
+    '''
+    last known state of every (device, room), shared by the Kocom and LG aircon paths.
+
+    a state is handed to publish only when it differs from the stored one. everything
+    is published again every refresh_interval seconds, or after request_refresh()
+    (e.g. Home Assistant restarted and lost its states).
+    '''
+    def __init__(self, publish: Callable[[str, str, dict], None], refresh_interval: float) -> None:
+        self.publish                                = publish
+        self.refresh_interval                       = refresh_interval
+        self.states: dict[tuple[str, str], dict]    = {}
+        self.last_refresh                           = time.monotonic()
+        self.refresh_requested                      = False
+        self.published                              = 0
+        self.suppressed                             = 0
+        self.refreshed                              = 0
+
+    def update(self, device: str, room: str, value: dict) -> bool:
+        '''
+        returns True if value is new and was published.
+        '''
+        key = (device, room)
+        if self.states.get(key) == value:
+            self.suppressed += 1
+            return False
+        self.states[key] = value
+        self.published += 1
+        self.publish(device, room, value)
+        return True
+
+    def request_refresh(self) -> None:
+        self.refresh_requested = True
+
+    def refresh_if_due(self, now: float) -> None:
+        if not self.refresh_requested:
+            if self.refresh_interval <= 0 or now - self.last_refresh < self.refresh_interval:
+                return
+        self.refresh_requested = False
+        self.last_refresh = now
+
+        color_log = ColorLog()
+        color_log.log(f"Refresh {len(self.states)} states to HA.", Color.Blue, ColorLog.Level.DEBUG)
+        for (device, room), value in list(self.states.items()):
+            self.refreshed += 1
+            self.publish(device, room, value)
+
+    def get_stats(self) -> dict:
+        return {
+            'entries': len(self.states),
+            'published': self.published,
+            'suppressed': self.suppressed,
+            'refreshed': self.refreshed,
+        }
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import config as cfg
 from classes.basicdevice import Device
-from classes.utils import Color, ColorLog
+from classes.utils import Color, ColorLog, LazyHex
 from consts import (DEVICE_THERMOSTAT, MQTT_CURRENT_TEMP, MQTT_MODE,
                     MQTT_TARGET_TEMP, PAYLOAD_FAN_ONLY, PAYLOAD_HEAT,
                     PAYLOAD_OFF, Command, DeviceType, HeatMode)
@@ -20,26 +20,23 @@ class Thermostat(Device):
         self.scan.reset()
 
     def make_rs485_packet(self, cmd: Command) -> bytes:
-        new_packet = Device.PacketStruct()
         color_log = ColorLog()
 
-        if not self.make_device_basic_info(new_packet, self.device, DeviceType.WALLPAD, cmd, self.room_name):
-            color_log.log(f"Error in make {self.device} packet!", Color.Red, ColorLog.Level.WARN)
-
+        value = 0
         if cmd != Command.CHECK:
             try:
                 if self.mode == HeatMode.HEAT:
-                    new_packet.value_array = 0x1100000000000000
+                    value = 0x1100000000000000
                 elif self.mode == HeatMode.OFF:
-                    new_packet.value_array = 0x0001000000000000
+                    value = 0x0001000000000000
                 else:
-                    new_packet.value_array = 0x1101000000000000
-                new_packet.value_array |= (0xff & int(float(self.target_temp))) << (5 * 8)
+                    value = 0x1101000000000000
+                value |= (0xff & int(float(self.target_temp))) << (5 * 8)
             except Exception as e:
                 color_log.log(f"[Make Packet] Error({e}) on DeviceType.THERMOSTAT", Color.White, ColorLog.Level.DEBUG)
 
-        packet = new_packet.get_full_bytes_packet()
-        color_log.log(f"[Packet made - thermostat] = {packet.hex()}", Color.White, ColorLog.Level.DEBUG)
+        packet = self.make_frame(self.device, DeviceType.WALLPAD, cmd, value, self.room_name)
+        color_log.log("[Packet made - thermostat] = %s", Color.White, ColorLog.Level.DEBUG, LazyHex(packet))
         return packet
 
     def handle_mqtt(self, payload: str, cmd_str: str) -> None:
@@ -56,6 +53,8 @@ class Thermostat(Device):
             self.mode = HeatMode(payload)
 
     class ThermostatInput:
+        __slots__ = ('mode', 'current_temp', 'target_temp', 'room_str')
+
         def __init__(self) -> None:
             self.mode: HeatMode | None  = None
             self.current_temp           = 0
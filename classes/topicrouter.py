@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from typing import Callable, NamedTuple
+
+from classes.basicdevice import Device
+from classes.utils import Color, ColorLog
+from consts import DeviceType
+
+
+class CommandRoute(NamedTuple):
+    handler: Callable[[CommandRoute, str], None]
+    device: Device
+    room: str
+    sub_device: str
+    cmd: str
+
+
+class TopicRouter:
+    '''
+    exact command topic -> device object and its handler, filled while discovery makes the topics.
+
+    an inbound command is one dict lookup, no topic split and no substring match on the
+    device name. the same topics are made by every discovery, so routes are only added
+    (or replaced with equal ones) and the paho thread can read them at any time.
+    '''
+    def __init__(self) -> None:
+        self.handlers: dict[DeviceType, Callable[[CommandRoute, str], None]] = {}
+        self.routes: dict[str, CommandRoute]    = {}
+        self.routed                             = 0
+        # commands that had no route and were parsed from the topic. counted by the caller.
+        self.unrouted                           = 0
+
+    def set_handlers(self, handlers: dict[DeviceType, Callable[[CommandRoute, str], None]]) -> None:
+        self.handlers.update(handlers)
+
+    def add(self, topic: str, device: Device, room: str, sub_device: str = '') -> None:
+        handler = self.handlers.get(device.device)
+        if handler is None:
+            return
+        # last level of a command topic is the command. e.g. .../mode, .../target_temp, .../set
+        cmd = topic.rsplit('/', 1)[-1]
+        self.routes[topic] = CommandRoute(handler, device, room, sub_device, cmd)
+
+    def dispatch(self, topic: str, payload: str) -> bool:
+        '''
+        returns False if topic has no route. the caller may handle it the old way.
+        '''
+        route = self.routes.get(topic)
+        if route is None:
+            return False
+        self.routed += 1
+        try:
+            route.handler(route, payload)
+        except Exception as e:
+            color_log = ColorLog()
+            color_log.log(f"[From HA]Error [{e}] {topic} = {payload}", Color.Red)
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            'routes': len(self.routes),
+            'routed': self.routed,
+            'unrouted': self.unrouted,
+        }
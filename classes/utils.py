@@ -1,11 +1,12 @@
 from __future__ import annotations
 
-import inspect
+import atexit
 import logging
 import pathlib
+import queue
 import sys
 from enum import Enum
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 
 # dict of ANSI color set
@@ -20,6 +21,86 @@ class Color(Enum):
     White     = '\033[37m'
 
 
+class LazyHex:
+    '''
+    bytes which become a hex string only when a log line is really written.
+    ex) color_log.log("body=[%s]", Color.Green, ColorLog.Level.DEBUG, LazyHex(body))
+    '''
+    __slots__ = ('data',)
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    def __str__(self) -> str:
+        return self.data.hex()
+
+
+class ColorFormatter(logging.Formatter):
+    '''
+    wraps the message of ColorLog records with caller info and ANSI color.
+    records from other loggers are formatted as usual.
+    '''
+    def format(self, record: logging.LogRecord) -> str:
+        prefix = getattr(record, 'color_prefix', '')
+        if prefix == '':
+            return super().format(record)
+        msg = record.msg
+        record.msg = f'{prefix}{msg}{Color.EoC.value}'
+        try:
+            return super().format(record)
+        finally:
+            record.msg = msg
+
+
+class DroppingQueueHandler(QueueHandler):
+    '''
+    QueueHandler with a bounded queue, never blocks the caller.
+
+    when the queue is full, the oldest queued record (DROP_OLDEST) or the new one
+    (DROP_NEWEST) is dropped and counted. records with only immutable (or LazyHex) args
+    are queued as they are, so formatting is left to the listener thread. others, e.g.
+    with a dict that may change meanwhile, are formatted at once.
+    '''
+    DROP_OLDEST = 'oldest'
+    DROP_NEWEST = 'newest'
+    LAZY_ARGS   = (str, int, float, bytes, Enum, LazyHex, type(None))
+
+    def __init__(self, max_size: int, drop_policy: str = DROP_OLDEST) -> None:
+        super().__init__(queue.Queue(max_size))
+        self.drop_policy    = drop_policy
+        self.dropped        = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (
+            isinstance(args, tuple) and all(isinstance(arg, DroppingQueueHandler.LAZY_ARGS) for arg in args)
+        ):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        self.dropped += 1
+        if self.drop_policy != DroppingQueueHandler.DROP_OLDEST:
+            return
+        try:
+            self.queue.get_nowait()
+            self.queue.put_nowait(record)
+        except (queue.Empty, queue.Full):
+            pass
+
+
+class LogListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # queue may be full at exit. wait for the listener to make room.
+        self.queue.put(self._sentinel)
+
+
 STR_INFO    = 'info'
 STR_DEBUG   = 'debug'
 STR_WARN    = 'warn'
@@ -41,6 +122,20 @@ class ColorLog:
 
     LOG_FORMAT = "%(asctime)s %(levelname)8s:%(message)s"
 
+    # unknown levels are logged as info.
+    LEVEL_NUMBERS = {
+        Level.DEBUG: logging.DEBUG,
+        Level.INFO: logging.INFO,
+        Level.WARN: logging.WARNING,
+        Level.ERROR: logging.ERROR,
+        Level.CRITICAL: logging.CRITICAL,
+        STR_DEBUG: logging.DEBUG,
+        STR_INFO: logging.INFO,
+        STR_WARN: logging.WARNING,
+        STR_ERROR: logging.ERROR,
+        STR_CRITICAL: logging.CRITICAL,
+    }
+
     # use Singleton Class Design pattern
     def __new__(cls, _=''):
         if not hasattr(cls, 'instance'):
@@ -51,9 +146,11 @@ class ColorLog:
         if logger_name != '':
             self.debug_string_length = 25
             self.log_stream_handler = logging.StreamHandler(sys.stderr)
-            self.log_stream_handler.setFormatter(logging.Formatter(ColorLog.LOG_FORMAT))
+            self.log_stream_handler.setFormatter(ColorFormatter(ColorLog.LOG_FORMAT))
             self.log_stream_handler.setLevel(CONSOLE_LOG_LEVEL)
             self.partial_debug: bool = False
+            self.log_queue_handler: DroppingQueueHandler | None = None
+            self.log_listener: LogListener | None = None
 
             if logger_name == 'CONSOLE':
                 self.logger = logging.getLogger(None)
@@ -76,10 +173,14 @@ class ColorLog:
         sub_path: str   = 'log',
         file_name: str  = 'logfile.log',
         file_size: int  = 1024 * 1000,
-        file_counts: int = 10
+        file_counts: int = 10,
+        queue_size: int = 10000,
+        drop_policy: str = DroppingQueueHandler.DROP_OLDEST
     ):
         '''
         prepare logging environment.
+        console and file output are moved to a listener thread behind a bounded queue,
+        so a log call never writes or rotates a file in the caller (asyncio loop).
 
         Arguments :
             root        : path of root dir
@@ -87,6 +188,8 @@ class ColorLog:
             file_name   : log file name
             file_size   : max file size of one log file
             file_counts : max file counts of log files
+            queue_size  : max records waiting for the listener
+            drop_policy : 'oldest' or 'newest'. record dropped when the queue is full
 
         Returns :
             True        : if all set is ok
@@ -105,15 +208,42 @@ class ColorLog:
             self.log_file_handler = RotatingFileHandler(
                 filename=log_file, maxBytes=file_size, backupCount=file_counts, encoding='utf-8'
             )
-            self.log_file_handler.setFormatter(logging.Formatter(ColorLog.LOG_FORMAT))
+            self.log_file_handler.setFormatter(ColorFormatter(ColorLog.LOG_FORMAT))
             self.log_file_handler.setLevel(logging.DEBUG)
-            self.logger.addHandler(self.log_file_handler)
+
+            self.log_queue_handler = DroppingQueueHandler(queue_size, drop_policy)
+            self.log_listener = LogListener(
+                self.log_queue_handler.queue,
+                self.log_stream_handler,
+                self.log_file_handler,
+                respect_handler_level=True
+            )
+            self.logger.removeHandler(self.log_stream_handler)
+            self.logger.addHandler(self.log_queue_handler)
+            self.log_listener.start()
+            atexit.register(self.stop_logs)
 
         except Exception as e:
             print(f"Error in preparing log. [{e}]")
             return False
         return True
 
+    def stop_logs(self) -> None:
+        '''
+        flush queued records and stop the listener thread.
+        '''
+        if self.log_listener is not None:
+            self.log_listener.stop()
+            self.log_listener = None
+
+    def get_stats(self) -> dict:
+        if self.log_queue_handler is None:
+            return {'queued': 0, 'dropped': 0}
+        return {
+            'queued': self.log_queue_handler.queue.qsize(),
+            'dropped': self.log_queue_handler.dropped,
+        }
+
     def get_logger(self):
         return self.logger
 
@@ -144,33 +274,37 @@ class ColorLog:
             debug_info = debug_info + ' ' * (self.debug_string_length - length)
         return debug_info
 
-    def log(self, string: str, color: Color = Color.White, level: ColorLog.Level = Level.INFO):
+    def log(self, string: str, color: Color = Color.White, level: ColorLog.Level = Level.INFO, *args):
         '''
         ouput log with ANSI color
 
         Arguments :
-            string  : str for log output
+            string  : str for log output. if args are given, %-style format of them.
             color   : color of log string.
             level   : level of loggin. enum or string value is valid
+            args    : arguments for string. formatted only when the log is really written,
+                      so use these (and LazyHex) instead of f-string on hot paths.
+                      with the log thread, only str, numbers, bytes, enums and LazyHex
+                      are formatted there. others are formatted at the call.
 
         Return :
             None    : but, logger color is changed.
         '''
-        if isinstance(color, Color):
-            if color in set(item.value for item in Color) or color in Color:
-                color_str = Color(color).value
-            else:
-                color_str = Color.White.value
-        else:
-            color_str = Color.White.value
+        level_no = ColorLog.LEVEL_NUMBERS.get(level, logging.INFO)
+        if not self.logger.isEnabledFor(level_no):
+            return
 
-        if level not in set(item.value for item in ColorLog.Level) and level not in ColorLog.Level:
-            fn = self.logger.info
-        else:
-            fn_str = f"self.logger.{ColorLog.Level(level).value}"
-            fn = eval(fn_str)
+        color_str = color.value if isinstance(color, Color) else Color.White.value
 
-        debug_info = f"{inspect.stack()[1].function}:{inspect.stack()[1].lineno}"
+        caller = sys._getframe(1)
+        code = caller.f_code
+        debug_info = f"{code.co_name}:{caller.f_lineno}"
         debug_info = '[' + self.adjust_info_length(debug_info) + '] '
 
-        fn(f'{debug_info}{color_str}{string}{Color.EoC.value}')
+        # caller is known already, so skip logger.log() and its stack walk.
+        # caller info and color are put on the message by ColorFormatter.
+        record = self.logger.makeRecord(
+            self.logger.name, level_no, code.co_filename, caller.f_lineno, string, args, None, code.co_name,
+            {'color_prefix': debug_info + color_str}
+        )
+        self.logger.handle(record)
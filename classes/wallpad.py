@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from queue import PriorityQueue
+import asyncio
+import itertools
+import time
 from typing import Callable, NamedTuple
 
 import config as cfg
@@ -10,11 +12,12 @@ from classes.fan import Fan
 from classes.gas import Gas
 from classes.light import Light
 from classes.plug import Plug
+from classes.scanscheduler import ScanScheduler
 from classes.thermostat import Thermostat
+from classes.topicrouter import CommandRoute
 from classes.utils import Color, ColorLog
-from config import KOCOM_LIGHT_SIZE, KOCOM_PLUG_SIZE
-from consts import (DEVICE_ELEVATOR, DEVICE_FAN, DEVICE_GAS,  # DEVICE_WALLPAD,
-                    DEVICE_LIGHT, DEVICE_PLUG, DEVICE_THERMOSTAT,
+from consts import (DEVICE_ELEVATOR, DEVICE_FAN, DEVICE_GAS, DEVICE_LIGHT,
+                    DEVICE_PLUG, DEVICE_SENSOR, DEVICE_THERMOSTAT, DEVICE_WALLPAD,
                     PRIORITY_HIGH, PRIORITY_LOW, Command, DeviceType)
 
 
@@ -24,13 +27,6 @@ class EnabledDevice(NamedTuple):
 
 
 class WallPad:
-    class QueueWraper:
-        def __init__(self, obj: Device) -> None:
-            self.device = obj
-
-        def __lt__(self, other: Device) -> bool:
-            return id(self.device) < id(other)
-
     def __init__(self) -> None:
         self.elevator: list[Device]                     = []
         self.gas: list[Device]                          = []
@@ -40,10 +36,64 @@ class WallPad:
         self.fan: list[Device]                          = []
         self.device_list: list[Device]                  = []
         self.enabled_device_list: list[EnabledDevice]   = []
-        self.command_queue: PriorityQueue = PriorityQueue()
+        # (priority, sequence, device, command). sequence keeps FIFO order in a priority.
+        self.command_queue: asyncio.PriorityQueue | None = None
+        self.command_sequence                           = itertools.count()
+        self.loop: asyncio.AbstractEventLoop | None     = None
+        self.scan_scheduler                             = ScanScheduler(
+            cfg.WALLPAD_SCAN_INTERVAL_TIME, cfg.KOCOM_SCAN_MIN_INTERVAL_SEC, cfg.KOCOM_SCAN_MAX_INTERVAL_SEC
+        )
+        self.scan_devices: dict[str, Device]            = {}
+        # (device_str, room_str) of a status frame -> key of the scanned device
+        self.scan_keys: dict[tuple[str, str], str]      = {}
+        # (device_str, room_str) -> device of a room (thermostat, light, plug)
+        self.room_devices: dict[tuple[str, str], Device] = {}
+
+    def set_event_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        '''
+        must be called in the loop that runs the kocom write loop.
+        '''
+        self.loop = loop
+        self.command_queue = asyncio.PriorityQueue()
+
+    def enqueue_command(self, priority: int, device: Device, command: Command) -> None:
+        '''
+        queue a command for the kocom write loop. safe to call from any thread (e.g. paho MQTT thread).
+        '''
+        if self.loop is None or self.command_queue is None:
+            color_log = ColorLog()
+            color_log.log(f"Command queue is not ready. {device} {command} is dropped.", Color.Red, ColorLog.Level.WARN)
+            return
+        item = (priority, next(self.command_sequence), device, command)
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            self.command_queue.put_nowait(item)
+        else:
+            self.loop.call_soon_threadsafe(self.command_queue.put_nowait, item)
 
     def set_notify_function(self, send_state_to_homeassistant):
-        self.notify_to_homeassistant: Callable[[str, str, dict], None] = send_state_to_homeassistant
+        self.notify_to_homeassistant: Callable[[str, str, dict], bool] = send_state_to_homeassistant
+
+    def notify_state(self, device_str: str, room_str: str, value: dict) -> None:
+        '''
+        hand a received state to HA and let the scan scheduler know the device is fresh.
+        '''
+        changed = self.notify_to_homeassistant(device_str, room_str, value)
+        key = self.scan_keys.get((device_str, room_str))
+        if key is not None:
+            self.scan_scheduler.observe(key, bool(changed), time.monotonic())
+
+    def add_scan_device(self, device: Device, device_str: str, room_str: str) -> None:
+        key = f'{device_str}/{room_str}'
+        self.scan_devices[key] = device
+        self.scan_keys[(device_str, room_str)] = key
+        if isinstance(device, Fan):
+            # CO2 sensor frames come with the fan status.
+            self.scan_keys[(DEVICE_SENSOR, room_str)] = key
+        self.scan_scheduler.add(key)
 
     def prepare_enabled(self, enabled: list):
         self.set_initial_state(enabled)
@@ -66,37 +116,45 @@ class WallPad:
                     gas = Gas()
                     self.gas.append(gas)
                     self.device_list.append(gas)
+                    self.add_scan_device(gas, DEVICE_GAS, DEVICE_WALLPAD)
                     self.enabled_device_list.append(EnabledDevice(d_name, self.gas))
                 elif d_name == DeviceType.FAN:
                     self.fan = []
                     fan = Fan()
                     self.fan.append(fan)
                     self.device_list.append(fan)
+                    self.add_scan_device(fan, DEVICE_FAN, DEVICE_WALLPAD)
                     self.enabled_device_list.append(EnabledDevice(d_name, self.fan))
                 elif d_name == DeviceType.THERMOSTAT:
                     self.thermostat = []
                     for r_name in cfg.KOCOM_ROOM_THERMOSTAT.values():
                         thermostat = Thermostat(r_name)
                         self.thermostat.append(thermostat)
+                        self.room_devices[(DEVICE_THERMOSTAT, r_name)] = thermostat
                         self.device_list.append(thermostat)
+                        self.add_scan_device(thermostat, DEVICE_THERMOSTAT, r_name)
                     self.enabled_device_list.append(EnabledDevice(d_name, self.thermostat))
                 elif d_name == DeviceType.LIGHT:
                     self.light = []
                     for r_name in cfg.KOCOM_ROOM.values():
-                        if r_name in KOCOM_LIGHT_SIZE:
+                        if r_name in cfg.KOCOM_LIGHT_SIZE:
                             light = Light(r_name)
-                            light.set_initial_state(KOCOM_LIGHT_SIZE[r_name])
+                            light.set_initial_state(cfg.KOCOM_LIGHT_SIZE[r_name])
                             self.light.append(light)
+                            self.room_devices[(DEVICE_LIGHT, r_name)] = light
                             self.device_list.append(light)
+                            self.add_scan_device(light, DEVICE_LIGHT, r_name)
                     self.enabled_device_list.append(EnabledDevice(d_name, self.light))
                 elif d_name == DeviceType.PLUG:
                     self.plug = []
                     for r_name in cfg.KOCOM_ROOM.values():
-                        if r_name in KOCOM_PLUG_SIZE:
-                            plug = Plug()
-                            plug.set_initial_state(KOCOM_PLUG_SIZE[r_name])
+                        if r_name in cfg.KOCOM_PLUG_SIZE:
+                            plug = Plug(r_name)
+                            plug.set_initial_state(cfg.KOCOM_PLUG_SIZE[r_name])
                             self.plug.append(plug)
+                            self.room_devices[(DEVICE_PLUG, r_name)] = plug
                             self.device_list.append(plug)
+                            self.add_scan_device(plug, DEVICE_PLUG, r_name)
                     self.enabled_device_list.append(EnabledDevice(d_name, self.plug))
 
     def get_elevator(self) -> Elevator:
@@ -121,28 +179,19 @@ class WallPad:
         assert False, "get_fan error!"
 
     def get_thermostat(self, room_name) -> Thermostat:
-        if self.thermostat is not None and len(self.thermostat) >= 1:
-            for item in self.thermostat:
-                assert isinstance(item, Thermostat)
-                if item.room_name == room_name:
-                    return item
-        assert False, "get_thermostat error!"
+        thermostat = self.room_devices.get((DEVICE_THERMOSTAT, room_name))
+        assert isinstance(thermostat, Thermostat), "get_thermostat error!"
+        return thermostat
 
     def get_light(self, room_name) -> Light:
-        if self.light is not None and len(self.light) >= 1:
-            for item in self.light:
-                assert isinstance(item, Light)
-                if item.room_name == room_name:
-                    return item
-        assert False, "get_light error!"
+        light = self.room_devices.get((DEVICE_LIGHT, room_name))
+        assert isinstance(light, Light), "get_light error!"
+        return light
 
     def get_plug(self, room_name) -> Plug:
-        if self.plug is not None and len(self.plug) == 1:
-            for item in self.plug:
-                assert isinstance(item, Plug)
-                if item.room_name == room_name:
-                    return item
-        assert False, "get_plug error!"
+        plug = self.room_devices.get((DEVICE_PLUG, room_name))
+        assert isinstance(plug, Plug), "get_plug error!"
+        return plug
 
     def get_real_device_from_subdevice(self, subdevice: str) -> str:
         real_device: str = ''
@@ -180,7 +229,74 @@ class WallPad:
 
         self.handle_from_mqtt(device_str, sub_device_str, room_str, cmd_str, payload)
 
+    def get_command_handlers(self) -> dict[DeviceType, Callable[[CommandRoute, str], None]]:
+        return {
+            DeviceType.GAS: self.command_gas,
+            DeviceType.ELEVATOR: self.command_elevator,
+            DeviceType.LIGHT: self.command_light,
+            DeviceType.PLUG: self.command_plug,
+            DeviceType.THERMOSTAT: self.command_thermostat,
+            DeviceType.FAN: self.command_fan,
+        }
+
+    def command_gas(self, route: CommandRoute, payload: str) -> None:
+        gas = route.device
+        assert isinstance(gas, Gas)
+        next = gas.handle_mqtt(payload)
+        if next:
+            self.enqueue_command(PRIORITY_HIGH, gas, Command.STATUS)
+        color_log = ColorLog()
+        color_log.log(f"[From HA]{DEVICE_GAS}/{route.room}/{route.sub_device}/{route.cmd} = {payload}")
+
+    def command_elevator(self, route: CommandRoute, payload: str) -> None:
+        elevator = route.device
+        assert isinstance(elevator, Elevator)
+        next = elevator.handle_mqtt(payload)
+        if True and next:       # maybe always check status is enough
+            self.enqueue_command(PRIORITY_HIGH, elevator, Command.STATUS)
+        color_log = ColorLog()
+        color_log.log(f"[From HA]{DEVICE_ELEVATOR}/{route.room}/{route.sub_device}/{route.cmd} = {payload}")
+
+    def command_light(self, route: CommandRoute, payload: str) -> None:
+        light = route.device
+        assert isinstance(light, Light)
+        light.handle_mqtt(payload, route.sub_device, route.room)
+        self.enqueue_command(PRIORITY_HIGH, light, Command.STATUS)
+        color_log = ColorLog()
+        color_log.log(f"[From HA]{DEVICE_LIGHT}/{route.room}/{route.sub_device}/{route.cmd} = {payload}")
+
+    def command_plug(self, route: CommandRoute, payload: str) -> None:
+        plug = route.device
+        assert isinstance(plug, Plug)
+        plug.handle_mqtt(payload, route.sub_device, route.room)
+        self.enqueue_command(PRIORITY_HIGH, plug, Command.STATUS)
+        color_log = ColorLog()
+        color_log.log(f"[From HA]{DEVICE_PLUG}/{route.room}/{route.sub_device}/{route.cmd} = {payload}")
+
+    def command_thermostat(self, route: CommandRoute, payload: str) -> None:
+        thermostat = route.device
+        assert isinstance(thermostat, Thermostat)
+        thermostat.handle_mqtt(payload, route.cmd)
+        self.enqueue_command(PRIORITY_HIGH, thermostat, Command.STATUS)
+        color_log = ColorLog()
+        color_log.log(
+            f"[From HA]{DEVICE_THERMOSTAT}/{route.room}/set:"
+            f"[mode={thermostat.mode},target_temp={thermostat.target_temp}]"
+        )
+
+    def command_fan(self, route: CommandRoute, payload: str) -> None:
+        fan = route.device
+        assert isinstance(fan, Fan)
+        color_log = ColorLog()
+        color_log.log(f"cmd = {route.cmd}, payload = {payload}")
+        fan.handle_mqtt(payload, route.cmd)
+        self.enqueue_command(PRIORITY_HIGH, fan, Command.STATUS)
+        color_log.log(f"[From HA]{DEVICE_FAN}/{route.room}/set = [mode={fan.mode}, fan_mode={fan.fan_mode}]")
+
     def handle_from_mqtt(self, device_str: str, sub_device_str: str, room_str: str, cmd_str: str, payload: str) -> None:
+        '''
+        topics without a route (see TopicRouter). finds the device from the topic parts.
+        '''
         color_log = ColorLog()
         try:
             if self.is_multi_info_topic(device_str):
@@ -194,65 +310,39 @@ class WallPad:
                     return
 
                 if device_str == DEVICE_GAS:
-                    gas = self.get_gas()
-                    next = gas.handle_mqtt(payload)
-                    if next:
-                        self.command_queue.put((PRIORITY_HIGH, WallPad.QueueWraper(gas), Command.STATUS))
+                    device: Device = self.get_gas()
                 elif device_str == DEVICE_ELEVATOR:
-                    elevator = self.get_elevator()
-                    next = elevator.handle_mqtt(payload)
-                    if True and next:       # maybe always check status is enough
-                        self.command_queue.put((PRIORITY_HIGH, WallPad.QueueWraper(elevator), Command.STATUS))
-                    # else:
-                    #     self.notify_to_homeassistant(device_str, DEVICE_WALLPAD, payload)
+                    device = self.get_elevator()
                 elif device_str == DEVICE_LIGHT:
-                    light = self.get_light(room_str)
-                    light.handle_mqtt(payload, sub_device_str, room_str)
-                    self.command_queue.put((PRIORITY_HIGH, WallPad.QueueWraper(light), Command.STATUS))
+                    device = self.get_light(room_str)
                 elif device_str == DEVICE_PLUG:
-                    plug = self.get_plug(room_str)
-                    plug.handle_mqtt(payload, sub_device_str, room_str)
-                    self.command_queue.put((PRIORITY_HIGH, WallPad.QueueWraper(plug), Command.STATUS))
+                    device = self.get_plug(room_str)
                 else:
-                    pass
-
-                color_log.log(f"[From HA]{device_str}/{room_str}/{sub_device_str}/{cmd_str} = {payload}")
+                    return
 
             elif device_str == cfg.HA_CLIMATE:
-                device_str = DEVICE_THERMOSTAT
-                thermostat = self.get_thermostat(room_str)
-                thermostat.handle_mqtt(payload, cmd_str)
-                self.command_queue.put((PRIORITY_HIGH, WallPad.QueueWraper(thermostat), Command.STATUS))
-                color_log.log(
-                    f"[From HA]{device_str}/{room_str}/set:"
-                    f"[mode={thermostat.mode},target_temp={thermostat.target_temp}]"
-                )
+                device = self.get_thermostat(room_str)
 
             elif device_str == cfg.HA_FAN:
-                device_str = DEVICE_FAN
-                color_log.log(f"cmd = {cmd_str}, payload = {payload}")
-                fan = self.get_fan()
-                fan.handle_mqtt(payload, cmd_str)
-                self.command_queue.put((PRIORITY_HIGH, WallPad.QueueWraper(fan), Command.STATUS))
-                color_log.log(f"[From HA]{device_str}/{room_str}/set = [mode={fan.mode}, fan_mode={fan.fan_mode}]")
+                device = self.get_fan()
+
+            else:
+                return
+
+            handler = self.get_command_handlers()[device.device]
+            handler(CommandRoute(handler, device, room_str, sub_device_str, cmd_str), payload)
 
         except Exception as e:
             color_log.log(f"[From HA]Error [{e}] {device_str}/{room_str}/{cmd_str} = {payload}", Color.Red)
 
     def scan_wallpad_devices(self, now: float):
+        # elevator is not scanned - from org source. why?
         color_log = ColorLog()
         try:
-            for _, device_list in self.enabled_device_list:
-                # color_log.log(f'Scan Device list =[{device_list}]', Color.Cyan, ColorLog.Level.DEBUG)
-                if type(device_list) == list:
-                    if len(device_list) < 1:
-                        break
-                    for obj in device_list:
-                        if isinstance(obj, Device):
-                            if (now - obj.scan.tick) > cfg.WALLPAD_SCAN_INTERVAL_TIME and not isinstance(obj, Elevator):
-                                # elevator must exclude - from org source. why?
-                                obj.scan.tick = now
-                                color_log.log(f">>>>>{obj} Check append to Queue.", Color.Blue, ColorLog.Level.DEBUG)
-                                self.command_queue.put((PRIORITY_LOW, WallPad.QueueWraper(obj), Command.CHECK))
+            for key in self.scan_scheduler.pop_due(now):
+                obj = self.scan_devices[key]
+                obj.scan.tick = now
+                color_log.log(f">>>>>{obj} Check append to Queue.", Color.Blue, ColorLog.Level.DEBUG)
+                self.enqueue_command(PRIORITY_LOW, obj, Command.CHECK)
         except Exception as e:
             color_log.log(f"Scan Walpad Error [{e}]")
@@ -1,9 +1,31 @@
 # Default socker buffer size
 MAX_SOCKET_BUFFER   = 2048
 
+# Kocom EW11 link. 'protocol' feeds socket reads straight into the frame scanner (asyncio.Protocol),
+# 'stream' reads through asyncio StreamReader.
+KOCOM_TRANSPORT     = 'protocol'
+
+# entries of decoded Kocom status frames kept for reuse. 0 disables.
+KOCOM_DECODE_CACHE_SIZE = 256
+
+# next Kocom command is sent as soon as the device ACKs. without ACK in KOCOM_ACK_TIMEOUT_SEC
+# the command is sent again with the next sequence number, up to KOCOM_MAX_RETRY times.
+# at most 3: the sequence is the low bits of the type byte, 30bc .. 30bf. more is used as 3.
+KOCOM_ACK_TIMEOUT_SEC   = 0.5
+KOCOM_MAX_RETRY         = 2
+# a Kocom command is written after the bus was silent for KOCOM_BUS_IDLE_GAP_SEC, so it does not
+# collide with wallpad traffic. a busy bus is written anyway after KOCOM_BUS_IDLE_MAX_WAIT_SEC.
+KOCOM_BUS_IDLE_GAP_SEC      = 0.05
+KOCOM_BUS_IDLE_MAX_WAIT_SEC = 0.5
+KOCOM_BUS_BPS               = 9600
+
 # Default Log Level
 CONF_LOGLEVEL       = 'info'          # debug, info, warn
 
+# records waiting for the log thread. when full, LOG_DROP_POLICY record is dropped: 'oldest' or 'newest'
+LOG_QUEUE_SIZE      = 10000
+LOG_DROP_POLICY     = 'oldest'
+
 # HA MQTT Discovery
 HA_PREFIX           = 'homeassistant'
 HA_SWITCH           = 'switch'
@@ -14,6 +36,17 @@ HA_FAN              = 'fan'
 HA_GAS              = 'gas'
 HA_CALLBACK_MAIN    = 'rs485'
 HA_CALLBACK_BRIDGE  = 'bridge'
+HA_CALLBACK_STATS   = 'stats'
+# discovery configs are published retained. after subscribing, the retained configs the broker
+# sends back within this time decide which configs must be published (again).
+HA_DISCOVERY_ECHO_WAIT_SEC  = 1.0
+# True runs the MQTT client in the asyncio loop, False in the paho network thread (loop_start).
+# in the loop, a lost broker connection is made again every MQTT_RECONNECT_DELAY_SEC.
+MQTT_ASYNCIO_LOOP           = False
+MQTT_RECONNECT_DELAY_SEC    = 5.
+# state publishes while the broker is not connected are held, the latest per topic, and sent on
+# reconnect. at most this many topics, 0 disables.
+MQTT_OFFLINE_BUFFER_TOPICS  = 1024
 
 
 CONF_FILE               = 'hacollector.conf'
@@ -65,10 +98,37 @@ SYSTEM_ROOM_AIRCON = {
 }
 
 WALLPAD_SCAN_INTERVAL_TIME  = 120.
+# the scan interval of each wallpad device halves when a CHECK finds a new state and grows when not,
+# within these bounds. status frames the wallpad gets anyway count as fresh and delay the next CHECK.
+KOCOM_SCAN_MIN_INTERVAL_SEC = 30.
+KOCOM_SCAN_MAX_INTERVAL_SEC = 300.
+# unchanged states are not published again, except all of them once per this interval. 0 disables.
+STATE_REFRESH_INTERVAL_SEC  = 600.
+# states of a topic published within this window are sent once, the latest one. 0 sends each at once.
+STATE_COALESCE_WINDOW_SEC   = 0.05
+# True encodes state payloads by orjson if installed (pip install orjson, not in requirements.txt).
+# False keeps json.dumps output.
+STATE_USE_ORJSON            = False
 PACKET_RESEND_INTERVAL_SEC  = 0.8
 
 RS485_WRITE_INTERVAL_SEC    = 0.1
 
+# LG aircon EW11 link. True keeps one connection for all transactions, False connects per request.
+LGAC_PERSISTENT_CONNECTION  = True
+# True: the reconnect command from HA makes only the EW11 connections again. device states, the MQTT
+# session and discovery are kept. False (or a failed link): everything is made again, like a restart.
+EW11_WARM_RECONNECT         = True
+LGAC_READ_TIMEOUT_SEC       = 1.0       # no response in time: the connection is made again
+LGAC_CONNECT_RETRY          = 3
+LGAC_KEEPALIVE_IDLE_SEC     = 30        # TCP keepalive probes after this idle time
+# gap before the next LG aircon request = LGAC_GUARD_GAP_FACTOR x average response time,
+# kept between LGAC_MIN_GUARD_GAP_SEC and PACKET_RESEND_INTERVAL_SEC. persistent connection only.
+LGAC_GUARD_GAP_FACTOR       = 2.0
+LGAC_MIN_GUARD_GAP_SEC      = 0.05
+# HA sends mode, fan_mode, swing_mode and target_temp as separate messages. settings of one unit
+# arriving within this window are sent as one command.
+LGAC_COALESCE_WINDOW_SEC    = 0.05
+
 DEFAULT_SPEED               = 'low'
 
 ALTERNATIVE_HEADER_DEBUG    = False
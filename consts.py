@@ -97,6 +97,13 @@ class CommStatus(Enum):
     WAIT_TAIL = 3
 
 
+class SendResult(Enum):
+    ACKED       = 1
+    SENT        = 2     # nobody ACKs the frame
+    NO_ACK      = 3
+    WRITE_FAIL  = 4
+
+
 class PacketType(Enum):
     SEND = 1
     ACK  = 2
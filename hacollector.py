@@ -2,6 +2,7 @@ import asyncio
 import configparser
 import pathlib
 import sys
+import time
 
 from dotenv import load_dotenv
 
@@ -11,18 +12,26 @@ from classes.hub import Hub
 from classes.kocom import KocomHandler
 from classes.lgac485 import LGACPacketHandler
 from classes.mqtt import MqttHandler
+from classes.statestore import StateStore
 from classes.utils import Color, ColorLog
 from consts import DEVICE_AIRCON, SW_VERSION_STRING
 
 
 async def main(loop: asyncio.AbstractEventLoop, first_run: bool):
+    started = time.monotonic()
     root_dir = pathlib.Path.cwd()
 
     color_log: ColorLog
 
     if first_run:
         color_log = ColorLog(cfg.CONF_LOGFILE)
-        if not color_log.prepare_logs(root=root_dir, sub_path='log', file_name=cfg.CONF_LOGFILE):
+        if not color_log.prepare_logs(
+            root=root_dir,
+            sub_path='log',
+            file_name=cfg.CONF_LOGFILE,
+            queue_size=cfg.LOG_QUEUE_SIZE,
+            drop_policy=cfg.LOG_DROP_POLICY
+        ):
             sys.exit(1)
         color_log.set_level(cfg.CONF_LOGLEVEL)
     else:
@@ -47,6 +56,7 @@ async def main(loop: asyncio.AbstractEventLoop, first_run: bool):
     kocom = KocomHandler(app_config)
     aircon = LGACPacketHandler(app_config)
     mqtt = MqttHandler(app_config)
+    state_store = StateStore(mqtt.send_state_to_homeassistant, cfg.STATE_REFRESH_INTERVAL_SEC)
 
     def close_all_devices_sockets():
         kocom.sync_close_socket(loop)
@@ -58,17 +68,41 @@ async def main(loop: asyncio.AbstractEventLoop, first_run: bool):
         for task in asyncio.all_tasks(loop):
             task.cancel()
 
+    def reconnect_devices():
+        if cfg.EW11_WARM_RECONNECT:
+            # may be called in the paho thread.
+            hub.reconnect_links_threadsafe(loop, prepare_reconnect)
+        else:
+            prepare_reconnect()
+
     color_log.log(f"{cfg.CONF_KOCOM_DEVICE_NAME} Configuration: [{app_config.kocom_server}:{app_config.kocom_port}]")
     color_log.log(f"{cfg.CONF_AIRCON_DEVICE_NAME} Configuration: [{app_config.aircon_server}:{app_config.aircon_port}]")
 
     # setup callback functions
-    kocom.wallpad.set_notify_function(mqtt.send_state_to_homeassistant)
+    kocom.wallpad.set_event_loop(loop)
+    aircon.set_event_loop(loop)
+    mqtt.set_event_loop(loop)
+    kocom.wallpad.set_notify_function(state_store.update)
     aircon.set_notify_function(mqtt.change_aircon_status)
+    mqtt.set_state_store(state_store)
     mqtt.set_kocom_mqtt_handler(kocom.wallpad.handle_wallpad_mqtt_message)
     mqtt.set_aircon_mqtt_handler(aircon.handle_aircon_mqtt_message)
-    mqtt.set_reconnect_action(prepare_reconnect)
-
-    hub = Hub(kocom, aircon, mqtt, kocom.wallpad)
+    mqtt.set_command_handlers(kocom.wallpad.get_command_handlers())
+    mqtt.set_command_handlers(aircon.get_command_handlers())
+    mqtt.set_reconnect_action(reconnect_devices)
+    mqtt.add_stats_provider('kocom', kocom.get_stats)
+    mqtt.add_stats_provider('kocom_decode_cache', kocom.decode_cache.get_stats)
+    mqtt.add_stats_provider('state_store', state_store.get_stats)
+    mqtt.add_stats_provider('log', color_log.get_stats)
+    mqtt.add_stats_provider('lgac', aircon.get_stats)
+    mqtt.add_stats_provider('wallpad_scan', kocom.wallpad.scan_scheduler.get_stats)
+    mqtt.add_stats_provider('mqtt_routes', mqtt.topic_router.get_stats)
+    mqtt.add_stats_provider('discovery', mqtt.discovery_cache.get_stats)
+    mqtt.add_stats_provider('mqtt_publish', mqtt.publish_coalescer.get_stats)
+    mqtt.add_stats_provider('mqtt_offline', mqtt.offline_buffer.get_stats)
+
+    hub = Hub(kocom, aircon, mqtt, kocom.wallpad, state_store, started)
+    mqtt.add_stats_provider('links', hub.get_stats)
 
     # add each rs485 devices
     hub.add_devices(kocom.enabled_dev)
@@ -107,6 +141,9 @@ async def main(loop: asyncio.AbstractEventLoop, first_run: bool):
     else:
         color_log.log("[ERROR] Something is wrong. check configuration!", Color.Red, ColorLog.Level.CRITICAL)
 
+    # states held by the publish coalescer go out before the loop is closed, and the client of
+    # this run is stopped. a restart makes a new one.
+    mqtt.cleanup()
     color_log.log("End of Program.")
     loop.stop()
 
@@ -45,7 +45,13 @@ def main(argv):
 
     handler = LGACPacketHandler(app_config)
     aircon_cmd = Aircon.Info(args.action, args.operation, args.fanmove, args.fanmode, 25, int(args.temp))
-    info: Aircon.Info = synchronize_async_helper(handler.async_send_and_get_result(0, int(args.id), aircon_cmd))
+
+    async def send_and_close():
+        info = await handler.async_send_and_get_result(0, int(args.id), aircon_cmd)
+        await handler.async_disconnect()
+        return info
+
+    info: Aircon.Info = synchronize_async_helper(send_and_close())
 
     if info is not None:
         color_log.log(
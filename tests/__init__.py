@@ -0,0 +1,4 @@
+from classes.utils import ColorLog
+
+# the singleton logger is named at start of the app, as in benchmark.py. only errors on the console.
+ColorLog('CONSOLE').set_level('error')
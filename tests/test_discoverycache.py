@@ -0,0 +1,73 @@
+import time
+
+import config as cfg
+from classes.discoverycache import DiscoveryCache
+from classes.kocom import KocomHandler
+from classes.mqtt import MqttHandler
+
+from .helpers import FakeMqttBroker, load_app_config
+
+WAIT = cfg.HA_DISCOVERY_ECHO_WAIT_SEC
+DOCUMENTS = [{'homeassistant/light/a/config': '{"name": "a"}'}, {'homeassistant/light/b/config': '{"name": "b"}'}]
+
+
+def make_cache() -> tuple[DiscoveryCache, list[tuple[str, str]]]:
+    cache = DiscoveryCache(WAIT)
+    cache.set_documents(DOCUMENTS)
+    cache.expect_echo(0.)
+    return cache, []
+
+
+def sync(cache: DiscoveryCache, published: list[tuple[str, str]], now: float) -> int:
+    return cache.sync(lambda topic, payload: published.append((topic, payload)), now)
+
+
+def test_matching_echo_skipped():
+    cache, published = make_cache()
+    assert cache.observe('homeassistant/light/a/config', '{"name": "a"}')
+    assert cache.observe('homeassistant/light/b/config', '{"name": "b"}')
+    assert not cache.observe('homeassistant/light/c/config', '{"name": "c"}')
+    assert sync(cache, published, WAIT) == 0
+    assert cache.get_stats()['skipped'] == 2
+
+
+def test_changed_echo_republished():
+    cache, published = make_cache()
+    cache.observe('homeassistant/light/a/config', '{"name": "a"}')
+    cache.observe('homeassistant/light/b/config', '{"name": "old b"}')
+    assert sync(cache, published, WAIT) == 1
+    assert published == [('homeassistant/light/b/config', '{"name": "b"}')]
+
+
+def test_no_echo_published_after_wait():
+    cache, published = make_cache()
+    assert sync(cache, published, WAIT - 0.01) == 0
+    assert sync(cache, published, WAIT) == 2
+    assert published == [(topic, payload) for item in DOCUMENTS for topic, payload in item.items()]
+    # once in sync, nothing goes out again until the next echo or request.
+    assert sync(cache, published, WAIT * 2) == 0
+
+
+def test_discovery_on_broker():
+    '''
+    start on an empty broker, then restart with its retained configs, one of them outdated.
+    '''
+    app_config = load_app_config()
+    kocom = KocomHandler(app_config)
+    broker = FakeMqttBroker()
+    publishes = []
+    for start in ('empty', 'retained', 'outdated'):
+        mqtt = MqttHandler(app_config)
+        mqtt.set_enabled_list(kocom.wallpad.enabled_device_list)
+        broker.handler = mqtt
+        mqtt.mqtt_client = broker
+        if start == 'outdated':
+            broker.retained[next(iter(broker.retained))] = '{}'
+        before = broker.publishes
+        mqtt.homeassistant_device_discovery(initial=True)
+        mqtt.sync_discovery(time.monotonic() + WAIT)
+        publishes.append(broker.publishes - before)
+    documents = len(mqtt.discovery_cache.documents)
+    assert documents > 1
+    assert publishes == [documents, 0, 1]
+    assert broker.retained == {topic: payload for topic, (payload, _) in mqtt.discovery_cache.documents.items()}
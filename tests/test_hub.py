@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import config as cfg
+from classes.hub import Hub
+from classes.scanscheduler import ScanScheduler
+
+
+class FakeLink:
+    '''
+    an EW11 link whose relink works, or raises error.
+    '''
+    def __init__(self, error: Exception | None = None) -> None:
+        self.error      = error
+        self.relinks    = 0
+
+    async def async_relink(self) -> None:
+        self.relinks += 1
+        if self.error is not None:
+            raise self.error
+
+
+def make_hub(kocom: FakeLink, aircon: FakeLink) -> Hub:
+    scheduler = ScanScheduler(
+        cfg.WALLPAD_SCAN_INTERVAL_TIME, cfg.KOCOM_SCAN_MIN_INTERVAL_SEC, cfg.KOCOM_SCAN_MAX_INTERVAL_SEC
+    )
+    scheduler.add('light/livingroom', due=1e9)
+    return Hub(kocom, aircon, None, SimpleNamespace(scan_scheduler=scheduler), None)
+
+
+@pytest.fixture
+def loop():
+    '''
+    event loop running in a thread of its own, as in hacollector.py next to the paho thread.
+    '''
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_relink_success():
+    hub = make_hub(FakeLink(), FakeLink())
+    cold: list[bool] = []
+    asyncio.run(hub.async_reconnect_links(lambda: cold.append(True)))
+    assert not cold
+    assert (hub.kocom_handler.relinks, hub.aircon_handler.relinks, hub.relinks) == (1, 1, 1)
+    # frames were missed while the link was down: every device is due again.
+    assert hub.wallpad.scan_scheduler.next_due() < 1e9
+    assert not hub.relinking
+
+
+def test_relink_failure_falls_back_to_cold():
+    hub = make_hub(FakeLink(), FakeLink(ConnectionRefusedError()))
+    cold: list[bool] = []
+    asyncio.run(hub.async_reconnect_links(lambda: cold.append(True)))
+    assert cold == [True]
+    assert hub.relinks == 0
+    assert not hub.relinking
+
+
+def test_relink_from_thread(loop):
+    hub = make_hub(FakeLink(), FakeLink())
+    cold = threading.Event()
+    hub.reconnect_links_threadsafe(loop, cold.set).result(timeout=5)
+    # a fall back of the done callback would be queued by now. let it run.
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result(timeout=5)
+    assert not cold.is_set()
+    assert hub.relinks == 1
+
+
+def test_relink_error_from_thread_falls_back_to_cold(loop):
+    '''
+    an error that async_reconnect_links() does not handle itself.
+    '''
+    hub = make_hub(FakeLink(), FakeLink())
+    hub.wallpad.scan_scheduler = None
+    cold = threading.Event()
+    future = hub.reconnect_links_threadsafe(loop, cold.set)
+    assert isinstance(future.exception(timeout=5), AttributeError)
+    assert cold.wait(5)
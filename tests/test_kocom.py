@@ -0,0 +1,145 @@
+import asyncio
+
+import config as cfg
+from classes.appconf import MainConfig
+from classes.basicdevice import Device
+from classes.elevator import Elevator
+from classes.kocom import KocomDecodeCache, KocomDecoder, KocomFrameScanner, KocomHandler
+from classes.light import Light
+from classes.plug import Plug
+from consts import Command, CommStatus, SendResult
+
+from .helpers import (KocomPacket, legacy_make_frame, make_encode_jobs, make_kocom_ack, make_kocom_bodies,
+                      make_kocom_handler, make_kocom_stream, measure_allocations)
+
+DECODE_ALLOC_BUDGET = 256       # bytes per frame at peak
+ROOM_MAPS = ('KOCOM_ROOM', 'KOCOM_ROOM_THERMOSTAT', 'KOCOM_LIGHT_SIZE', 'KOCOM_PLUG_SIZE')
+
+
+def scan_bodies(frame_count: int) -> list[bytes]:
+    scanner = KocomFrameScanner(KocomHandler.HEADER_LIST, KocomHandler.KOCOM_PACKET_LENGTH)
+    for chunk in make_kocom_stream(frame_count):
+        scanner.feed(chunk)
+    return [frame.body for frame in scanner.frames if frame.status == CommStatus.WAIT_TAIL]
+
+
+def load_env_rooms(monkeypatch) -> None:
+    '''
+    room maps other than config.py, loaded from env like at start of the app. restored after the test.
+    '''
+    for name in ROOM_MAPS:
+        monkeypatch.setattr(cfg, name, getattr(cfg, name))
+    monkeypatch.setenv('ROOMS', 'livingroom:room1:room2:bedroom:kitchen')
+    monkeypatch.setenv('ROOMS_PLUG_NUMBERS', '1:2:0:3:1')
+    monkeypatch.setenv('ROOMS_LIGHT_NUMBERS', '2:1:0:0:4')
+    monkeypatch.setenv('ROOMS_THERMOSTATS', 'bedroom:livingroom:room2')
+    MainConfig().load_env_values()
+
+
+def decoder_mismatches() -> list[str]:
+    bodies = scan_bodies(5000) + make_kocom_bodies()
+    decoder = KocomDecoder()
+    return [body.hex() for body in bodies if decoder.decode(body) != KocomPacket(body).parse_data_from_packet()]
+
+
+def test_decoder_matches_packet():
+    assert not decoder_mismatches()
+
+
+def test_decoder_matches_packet_with_env_rooms(monkeypatch):
+    load_env_rooms(monkeypatch)
+    assert cfg.KOCOM_LIGHT_SIZE == {'livingroom': 2, 'room1': 1, 'kitchen': 4}
+    assert not decoder_mismatches()
+
+
+def test_decode_cache_dropped_on_room_map_change(monkeypatch):
+    decoder = KocomDecoder()
+    cache = KocomDecodeCache(16, decoder)
+    # ACK of the plugs in room 3: 2 plugs in config.py, 3 with the env rooms, plus plug0 of all.
+    body = make_kocom_ack(Plug('room1').make_rs485_packet(Command.STATUS))[2:19]
+    cache.put(body, decoder.decode(body))
+    assert len(cache.get(body)[3]) == 3
+    load_env_rooms(monkeypatch)
+    assert cache.get(body) is None
+    assert cache.get_stats()['invalidations'] == 1
+    assert len(decoder.decode(body)[3]) == 4
+
+
+def test_decode_cache_returns_copies():
+    decoder = KocomDecoder()
+    cache = KocomDecodeCache(16, decoder)
+    body = make_kocom_ack(Plug('room1').make_rs485_packet(Command.STATUS))[2:19]
+    decoded = decoder.decode(body)
+    expected = dict(decoded[3])
+    cache.put(body, decoded)
+    decoded[3]['plug1'] = 'changed'
+    cache.get(body)[3].clear()
+    assert cache.get(body)[3] == expected
+
+
+def test_frames_use_env_rooms(monkeypatch):
+    assert Light('bedroom').make_rs485_packet(Command.STATUS)[6] == 0x01
+    load_env_rooms(monkeypatch)
+    assert Light('bedroom').make_rs485_packet(Command.STATUS)[6] == 0x03
+
+
+def test_template_frames_match_struct(monkeypatch):
+    jobs = make_encode_jobs(make_kocom_handler())
+    frames = [obj.make_rs485_packet(cmd) for obj, cmd in jobs]
+    monkeypatch.setattr(Device, 'make_frame', legacy_make_frame)
+    assert [obj.make_rs485_packet(cmd) for obj, cmd in jobs] == frames
+
+
+def test_reused_decoder_allocation():
+    handler = make_kocom_handler()
+    bodies = [body for body in scan_bodies(3000) if handler.is_checksum_ok(body)]
+    peak, _ = measure_allocations(handler.decode_chunk, bodies)
+    assert peak <= DECODE_ALLOC_BUDGET
+
+
+class SilentComm:
+    '''
+    Kocom link nobody answers on. keeps the frames written. the bus goes idle or, if busy, never does.
+    '''
+    def __init__(self, busy: bool = False) -> None:
+        self.written: list[bytes] = []
+        self.busy                 = busy
+
+    async def async_wait_bus_idle(self, gap: float, max_wait: float) -> bool:
+        return not self.busy
+
+    async def async_write_one_chunk(self, data: bytes, wait_safe: bool = True) -> bool:
+        self.written.append(data)
+        return True
+
+
+def test_no_ack_after_retries(monkeypatch):
+    monkeypatch.setattr(cfg, 'KOCOM_ACK_TIMEOUT_SEC', 0.01)
+    monkeypatch.setattr(cfg, 'KOCOM_MAX_RETRY', 5)
+    handler = make_kocom_handler()
+    handler.comm = SilentComm()
+    result = asyncio.run(handler.async_send_and_wait_ack(Light('livingroom').make_rs485_packet(Command.STATUS)))
+    assert result == SendResult.NO_ACK
+    # retries stop at the last sequence number of the type byte.
+    assert [frame[3] for frame in handler.comm.written] == [0xbc, 0xbd, 0xbe, 0xbf]
+    assert all(handler.is_checksum_ok(frame[2:19]) for frame in handler.comm.written)
+    assert handler.no_acks == 1
+    assert handler.busy_sends == 0
+
+
+def test_send_on_bus_never_idle_counted():
+    handler = make_kocom_handler()
+    handler.comm = SilentComm(busy=True)
+    result = asyncio.run(handler.async_send_and_wait_ack(Elevator().make_rs485_packet(Command.ON)))
+    assert result == SendResult.SENT
+    assert len(handler.comm.written) == 1
+    assert handler.busy_sends == 1
+
+
+def test_elevator_call_written_once():
+    handler = make_kocom_handler()
+    handler.comm = SilentComm()
+    result = asyncio.run(handler.async_send_and_wait_ack(Elevator().make_rs485_packet(Command.ON)))
+    assert result == SendResult.SENT
+    assert len(handler.comm.written) == 1
+    assert handler.retries == 0
@@ -0,0 +1,53 @@
+import asyncio
+
+import config as cfg
+from classes.aircon import Aircon
+from classes.lgac485 import LGACPacketHandler
+from consts import (MQTT_FAN_MODE, MQTT_MODE, MQTT_SWING_MODE, MQTT_TARGET_TEMP, PAYLOAD_COOL, PAYLOAD_HIGH,
+                    PAYLOAD_ON, PAYLOAD_SWING)
+
+from .helpers import make_lgac_response, measure_allocations
+
+DECODE_ALLOC_BUDGET = 256       # bytes per frame at peak
+
+
+def test_reused_decoder_allocation():
+    handler = LGACPacketHandler()
+    responses = [
+        make_lgac_response(bytes((0x80, 0x00, 0xa3, unit, 0x01, 0x00, 0x00, 0x00)))
+        for unit in range(len(cfg.SYSTEM_ROOM_AIRCON))
+    ] * 500
+    peak, _ = measure_allocations(handler.decode_response, responses)
+    assert peak <= DECODE_ALLOC_BUDGET
+
+
+def test_commands_of_unit_coalesced():
+    settings = ((MQTT_MODE, PAYLOAD_COOL), (MQTT_FAN_MODE, PAYLOAD_HIGH), (MQTT_SWING_MODE, PAYLOAD_ON),
+                (MQTT_TARGET_TEMP, '23'), (MQTT_TARGET_TEMP, '24'))
+
+    async def run() -> tuple[LGACPacketHandler, list[tuple[int, tuple]]]:
+        handler = LGACPacketHandler()
+        handler.set_event_loop(asyncio.get_running_loop())
+        handler.set_notify_function(lambda device, room, info: None)
+        sent: list[tuple[int, tuple]] = []
+
+        async def set_current_mode(aircon_no: int, aircon_cmd: Aircon.Info) -> None:
+            sent.append((aircon_no, tuple(getattr(aircon_cmd, name) for name in Aircon.Info.__slots__)))
+
+        handler.async_set_current_mode = set_current_mode
+        # HA sends every setting of one action as its own message, here to 2 units.
+        for command, payload in settings:
+            handler.handle_aircon_mqtt_message(['', '', 'livingroom', command], payload)
+        handler.handle_aircon_mqtt_message(['', '', 'bedroom', MQTT_TARGET_TEMP], '20')
+        writer = asyncio.create_task(handler.async_lgac_main_write_loop())
+        while len(sent) < 2 and not writer.done():
+            await asyncio.sleep(cfg.LGAC_COALESCE_WINDOW_SEC)
+        await asyncio.sleep(cfg.LGAC_COALESCE_WINDOW_SEC * 2)
+        writer.cancel()
+        return handler, sent
+
+    handler, sent = asyncio.run(run())
+    livingroom, bedroom = (int(handler.get_room_aircon_number(room)) for room in ('livingroom', 'bedroom'))
+    assert sent[0] == (livingroom, (PAYLOAD_ON, '', PAYLOAD_SWING, PAYLOAD_HIGH, 0, 24))
+    assert [aircon_no for aircon_no, _ in sent] == [livingroom, bedroom]
+    assert (handler.get_stats()['commands'], handler.get_stats()['transactions_saved']) == (6, 4)
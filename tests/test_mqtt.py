@@ -0,0 +1,76 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import config as cfg
+from classes.mqtt import MqttHandler
+
+from .helpers import FakeMqttServer, load_app_config, make_mqtt_handler
+
+
+@pytest.fixture
+def broker():
+    '''
+    FakeMqttServer on a loop of its own, so it outlives the loops of the tests.
+    '''
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    server = FakeMqttServer()
+    server.port = asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+    yield server
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+# paho warns about its callback API version.
+@pytest.mark.filterwarnings('ignore::DeprecationWarning')
+@pytest.mark.parametrize('in_loop', [False, True])
+def test_cleanup_sends_coalesced_states(broker, monkeypatch, in_loop):
+    monkeypatch.setattr(cfg, 'MQTT_ASYNCIO_LOOP', in_loop)
+    topic = f'{cfg.HA_PREFIX}/{cfg.HA_LIGHT}/livingroom/state'
+
+    async def main() -> None:
+        '''
+        end of hacollector.py main() with a state still held by the coalescer.
+        '''
+        app_config = load_app_config()
+        app_config.mqtt_server, app_config.mqtt_port, app_config.mqtt_anonymous = '127.0.0.1', broker.port, 'True'
+        mqtt = MqttHandler(app_config)
+        mqtt.set_event_loop(asyncio.get_running_loop())
+        mqtt.publish_coalescer.window = 10.
+        mqtt.connect_mqtt()
+        while not mqtt.online:
+            await asyncio.sleep(0.01)
+        mqtt.send_state_to_homeassistant('light', 'livingroom', {'light1': 'on'})
+        assert mqtt.publish_coalescer.pending
+        mqtt.cleanup()
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(main())
+    loop.close()
+    for _ in range(100):
+        if broker.published:
+            break
+        time.sleep(0.01)
+    assert [(name, json.loads(payload)) for name, payload in broker.published] == [(topic, {'light1': 'on'})]
+
+
+def test_stats_read_in_loop_thread():
+    mqtt, broker, loop = make_mqtt_handler()
+    calls: list[float] = []
+
+    def provider() -> dict:
+        calls.append(loop.now)
+        return {'calls': len(calls)}
+
+    mqtt.add_stats_provider('test', provider)
+    topic = f'{cfg.HA_CALLBACK_MAIN}/{cfg.HA_CALLBACK_BRIDGE}/config/{cfg.HA_CALLBACK_STATS}'
+    mqtt.on_message(broker, None, SimpleNamespace(topic=topic, payload=b'', retain=False))
+    assert not calls
+    loop.advance(0.)
+    assert json.loads(broker.last[f'{cfg.HA_CALLBACK_MAIN}/{cfg.HA_CALLBACK_STATS}']) == {'test': {'calls': 1}}
@@ -0,0 +1,55 @@
+import json
+
+from classes.offlinebuffer import OfflineBuffer
+
+from .helpers import make_mqtt_handler
+
+
+def test_oldest_dropped_at_limit():
+    buffer = OfflineBuffer(2)
+    buffer.hold('a', '1')
+    buffer.hold('b', '1')
+    buffer.hold('a', '2')
+    assert not buffer.overflowed
+    # a was updated last, so b is the oldest.
+    buffer.hold('c', '1')
+    assert buffer.overflowed
+    replayed: list[tuple[str, str | bytes]] = []
+    assert buffer.replay(lambda topic, payload: replayed.append((topic, payload))) == 2
+    assert replayed == [('a', '2'), ('c', '1')]
+    assert (buffer.get_stats()['dropped'], buffer.get_stats()['replaced']) == (1, 1)
+
+
+def test_states_held_while_disconnected_and_latest_replayed():
+    mqtt, broker, loop = make_mqtt_handler()
+    mqtt.publish_coalescer.window = 0.
+    broker.connected = False
+    mqtt.on_disconnect(broker, None, 1)
+    for value in ('on', 'off', 'on'):
+        mqtt.send_state_to_homeassistant('light', 'livingroom', {'light1': value})
+    mqtt.send_state_to_homeassistant('light', 'bedroom', {'light1': 'off'})
+    assert (broker.publishes, broker.lost) == (0, 0)
+    assert len(mqtt.offline_buffer.held) == 2
+
+    broker.connected = True
+    mqtt.on_connect(broker, None, None, 0)
+    # the replay runs in the loop thread.
+    assert broker.publishes == 0
+    loop.advance(0.)
+    assert broker.publishes == 2
+    assert [json.loads(payload) for payload in broker.last.values()] == [{'light1': 'on'}, {'light1': 'off'}]
+    assert mqtt.online and not mqtt.offline_buffer.held
+
+
+def test_publish_held_when_connection_lost_unnoticed():
+    mqtt, broker, loop = make_mqtt_handler()
+    mqtt.publish_coalescer.window = 0.
+    # on_disconnect not called yet: paho answers the publish with MQTT_ERR_NO_CONN.
+    broker.connected = False
+    mqtt.send_state_to_homeassistant('light', 'livingroom', {'light1': 'on'})
+    assert broker.lost == 1
+    assert len(mqtt.offline_buffer.held) == 1
+    broker.connected = True
+    mqtt.on_connect(broker, None, None, 0)
+    loop.advance(0.)
+    assert broker.publishes == 1
@@ -0,0 +1,48 @@
+import config as cfg
+from classes.publishcoalescer import PublishCoalescer
+
+from .helpers import SimLoop
+
+WINDOW = cfg.STATE_COALESCE_WINDOW_SEC
+
+
+def make_coalescer() -> tuple[PublishCoalescer, SimLoop, list[tuple[str, str | bytes]]]:
+    published: list[tuple[str, str | bytes]] = []
+    coalescer = PublishCoalescer(lambda topic, payload: published.append((topic, payload)), WINDOW)
+    loop = SimLoop()
+    coalescer.set_event_loop(loop)
+    return coalescer, loop, published
+
+
+def test_updates_in_window_publish_last_value():
+    coalescer, loop, published = make_coalescer()
+    for index, payload in enumerate(('{"light1": "on"}', '{"light1": "off"}', '{"light1": "on"}')):
+        loop.advance(index * WINDOW / 4)
+        coalescer.submit('light/livingroom', payload)
+    loop.advance(WINDOW * 0.99)
+    assert not published
+    loop.advance(WINDOW)
+    assert published == [('light/livingroom', '{"light1": "on"}')]
+    assert coalescer.get_stats()['coalesced'] == 2
+    # the next update starts a new window.
+    coalescer.submit('light/livingroom', '{"light1": "off"}')
+    loop.advance(WINDOW * 2)
+    assert published[1:] == [('light/livingroom', '{"light1": "off"}')]
+
+
+def test_topics_not_merged():
+    coalescer, loop, published = make_coalescer()
+    coalescer.submit('light/livingroom', 'on')
+    coalescer.submit('light/bedroom', 'off')
+    coalescer.submit('light/livingroom', 'off')
+    loop.advance(WINDOW)
+    assert published == [('light/livingroom', 'off'), ('light/bedroom', 'off')]
+    assert (coalescer.get_stats()['batches'], coalescer.get_stats()['last_batch']) == (1, 2)
+
+
+def test_no_window_publishes_at_once():
+    coalescer, _, published = make_coalescer()
+    coalescer.window = 0.
+    coalescer.submit('light/livingroom', 'on')
+    coalescer.submit('light/livingroom', 'off')
+    assert published == [('light/livingroom', 'on'), ('light/livingroom', 'off')]
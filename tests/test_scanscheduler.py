@@ -0,0 +1,59 @@
+import config as cfg
+from classes.scanscheduler import ScanScheduler
+
+
+def make_scheduler() -> ScanScheduler:
+    scheduler = ScanScheduler(
+        cfg.WALLPAD_SCAN_INTERVAL_TIME, cfg.KOCOM_SCAN_MIN_INTERVAL_SEC, cfg.KOCOM_SCAN_MAX_INTERVAL_SEC
+    )
+    scheduler.add('light/livingroom')
+    return scheduler
+
+
+def poll(scheduler: ScanScheduler, changed: bool) -> float:
+    '''
+    CHECK the device when it is due and answer it. returns the time of the answer.
+    '''
+    now = scheduler.next_due()
+    assert now is not None
+    assert scheduler.pop_due(now) == ['light/livingroom']
+    scheduler.observe('light/livingroom', changed, now)
+    return now
+
+
+def test_interval_grows_without_change():
+    scheduler = make_scheduler()
+    times = [poll(scheduler, False) for _ in range(4)]
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert gaps[0] == cfg.WALLPAD_SCAN_INTERVAL_TIME
+    assert gaps[1] == gaps[0] * ScanScheduler.GROW_FACTOR
+    assert gaps[2] == gaps[1] * ScanScheduler.GROW_FACTOR
+
+
+def test_interval_shrinks_on_change():
+    scheduler = make_scheduler()
+    for _ in range(3):
+        poll(scheduler, False)
+    grown = scheduler.interval['light/livingroom']
+    # a new state before the CHECK: the interval is halved and the CHECK is pushed back by it.
+    now = scheduler.next_due() - 1
+    scheduler.observe('light/livingroom', True, now)
+    assert scheduler.next_due() == now + grown * ScanScheduler.SHRINK_FACTOR
+    # the CHECK after a change does not grow it back.
+    poll(scheduler, False)
+    assert scheduler.interval['light/livingroom'] == grown * ScanScheduler.SHRINK_FACTOR
+    # a new state in the answer of a CHECK shrinks it too.
+    poll(scheduler, False)
+    before = scheduler.interval['light/livingroom']
+    poll(scheduler, True)
+    assert scheduler.interval['light/livingroom'] < before
+
+
+def test_interval_between_min_and_max():
+    scheduler = make_scheduler()
+    intervals = []
+    for changed in [False] * 20 + [True] * 20:
+        poll(scheduler, changed)
+        intervals.append(scheduler.interval['light/livingroom'])
+    assert max(intervals) == cfg.KOCOM_SCAN_MAX_INTERVAL_SEC
+    assert min(intervals) == cfg.KOCOM_SCAN_MIN_INTERVAL_SEC
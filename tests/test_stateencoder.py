@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from classes.stateencoder import StateEncoder, orjson
+
+STATES = [
+    {'light1': 'on', 'light2': 'off'},
+    {'mode': 'heat', 'target_temp': 23, 'current_temp': 21},
+    {'mode': 'cool', 'fan_mode': 'auto', 'swing_mode': 'on', 'target_temp': 24.5, 'current_temp': 27},
+    {'state': 'on', 'preset': 'Medium', 'note': 'say "100%"'},
+    {1: 'not a str key'},
+]
+
+
+def test_template_output_same_as_json_dumps():
+    encoder = StateEncoder(False)
+    for _ in range(2):
+        for state in STATES:
+            assert encoder.encode(state) == json.dumps(state)
+
+
+@pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+def test_orjson_payloads_decode_to_same_values():
+    template, fast = StateEncoder(False), StateEncoder(True)
+    for state in STATES[:-1]:
+        assert json.loads(fast.encode(state)) == json.loads(template.encode(state))
@@ -0,0 +1,44 @@
+import config as cfg
+from classes.statestore import StateStore
+
+
+def make_store() -> tuple[StateStore, list[tuple[str, str, dict]]]:
+    published: list[tuple[str, str, dict]] = []
+    store = StateStore(lambda device, room, value: published.append((device, room, value)),
+                       cfg.STATE_REFRESH_INTERVAL_SEC)
+    return store, published
+
+
+def test_identical_state_not_published():
+    store, published = make_store()
+    assert store.update('light', 'livingroom', {'light1': 'on'})
+    assert not store.update('light', 'livingroom', {'light1': 'on'})
+    assert published == [('light', 'livingroom', {'light1': 'on'})]
+    assert (store.get_stats()['published'], store.get_stats()['suppressed']) == (1, 1)
+
+
+def test_changed_state_published():
+    store, published = make_store()
+    store.update('light', 'livingroom', {'light1': 'on'})
+    assert store.update('light', 'livingroom', {'light1': 'off'})
+    # same value in another room is another state.
+    assert store.update('light', 'bedroom', {'light1': 'off'})
+    assert published[1:] == [('light', 'livingroom', {'light1': 'off'}), ('light', 'bedroom', {'light1': 'off'})]
+
+
+def test_refresh_after_interval():
+    store, published = make_store()
+    start = store.last_refresh
+    store.update('light', 'livingroom', {'light1': 'on'})
+    store.update('thermostat', 'bedroom', {'mode': 'heat'})
+    store.refresh_if_due(start + cfg.STATE_REFRESH_INTERVAL_SEC - 1)
+    assert len(published) == 2
+    store.refresh_if_due(start + cfg.STATE_REFRESH_INTERVAL_SEC)
+    assert published[2:] == published[:2]
+    # the next refresh is an interval after this one.
+    store.refresh_if_due(start + cfg.STATE_REFRESH_INTERVAL_SEC * 2 - 1)
+    assert len(published) == 4
+    store.request_refresh()
+    store.refresh_if_due(start + cfg.STATE_REFRESH_INTERVAL_SEC * 2 - 1)
+    assert len(published) == 6
+    assert store.get_stats()['refreshed'] == 4
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+from classes.light import Light
+from classes.mqtt import Discovery, MqttHandler
+from classes.topicrouter import CommandRoute, TopicRouter
+from consts import PAYLOAD_ON, DeviceType
+
+from .helpers import load_app_config
+
+
+def make_router() -> tuple[TopicRouter, list[tuple[CommandRoute, str]], Light]:
+    '''
+    router filled by the light discovery of a room with 2 lights. the handler keeps what it is called with.
+    '''
+    calls: list[tuple[CommandRoute, str]] = []
+    router = TopicRouter()
+    router.set_handlers({DeviceType.LIGHT: lambda route, payload: calls.append((route, payload))})
+    light = Light('livingroom')
+    light.set_initial_state(2)
+    Discovery([], [], router).discovery_light(False, [light])
+    return router, calls, light
+
+
+def test_routes_added_from_discovery():
+    router, _, light = make_router()
+    subscribed: list[tuple[str, int]] = []
+    Discovery([], subscribed, None).discovery_light(False, [light])
+    command_topics = [topic for topic, _ in subscribed if not topic.endswith('/config')]
+    assert sorted(router.routes) == sorted(command_topics)
+    assert [route.sub_device for route in router.routes.values()] == [name for name, _ in light.light_list]
+
+
+def test_dispatch_to_route():
+    router, calls, light = make_router()
+    topic = next(iter(router.routes))
+    assert router.dispatch(topic, PAYLOAD_ON)
+    [(route, payload)] = calls
+    assert (route.device, route.room, route.sub_device, route.cmd) == (light, 'livingroom', 'light0', 'set')
+    assert payload == PAYLOAD_ON
+    assert router.get_stats()['routed'] == 1
+
+
+def test_unknown_topic_falls_through():
+    router, calls, _ = make_router()
+    topic = next(iter(router.routes)).replace('livingroom', 'bedroom')
+    assert not router.dispatch(topic, PAYLOAD_ON)
+    assert not calls
+
+    mqtt = MqttHandler(load_app_config())
+    mqtt.topic_router = router
+    parsed: list[tuple[list[str], str]] = []
+    mqtt.set_kocom_mqtt_handler(lambda parts, payload: parsed.append((parts, payload)))
+    mqtt.on_message(None, None, SimpleNamespace(topic=topic, payload=PAYLOAD_ON.encode(), retain=False))
+    assert parsed == [(topic.split('/'), PAYLOAD_ON)]
+    assert router.get_stats()['unrouted'] == 1
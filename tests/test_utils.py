@@ -0,0 +1,33 @@
+import logging
+
+from classes.utils import DroppingQueueHandler, LazyHex
+
+
+def make_record(msg: str, *args) -> logging.LogRecord:
+    return logging.LogRecord('test', logging.INFO, __file__, 1, msg, args, None)
+
+
+def test_queue_formats_mutable_args_at_log_time():
+    handler = DroppingQueueHandler(10)
+    state = {'light1': 'on'}
+    handler.handle(make_record("state=%s", state))
+    state['light1'] = 'off'
+    record = handler.queue.get_nowait()
+    assert (record.getMessage(), record.args) == ("state={'light1': 'on'}", None)
+
+
+def test_queue_leaves_immutable_args_to_listener():
+    handler = DroppingQueueHandler(10)
+    body = LazyHex(b'\x01\x02')
+    handler.handle(make_record("body=[%s] no=%d", body, 3))
+    record = handler.queue.get_nowait()
+    assert record.args == (body, 3)
+    assert record.getMessage() == "body=[0102] no=3"
+
+
+def test_queue_drops_oldest_when_full():
+    handler = DroppingQueueHandler(2)
+    for i in range(3):
+        handler.handle(make_record("no=%d", i))
+    assert handler.dropped == 1
+    assert [handler.queue.get_nowait().getMessage() for _ in range(2)] == ['no=1', 'no=2']